@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''Admission control for the Requests queued in front of a JSON-RPC 2.0 service.'''
+
+from threading import Lock
+
+class Admission(object):
+    '''A bound on the number of Requests (or connections) queued by a transport in front of a
+       service, waiting for a worker.
+
+       A transport calls :meth:`admit` as a Request arrives, and queues it only if admitted;
+       otherwise it sheds the Request, rejecting it at once (see
+       :meth:`inocybe_jsonrpc.jsonrpc.Service.shed_bytes`). It calls :meth:`start` as it takes an
+       admitted Request off the queue. A transport which hands a Request straight to an idle
+       worker need not admit it.
+
+       Failing fast when the queue is full keeps the latency of admitted Requests bounded, rather
+       than serving every Request too late to be of use.
+
+       The counters are safe to update from multiple threads.
+    '''
+    def __init__(self, queue_max):
+        self.queue_max = queue_max
+        self.queued = 0
+        self.peak = 0
+        self.shed = 0
+        self._lock = Lock()
+    def admit(self):
+        '''Return True if a Request may be queued, counting it as queued, or False if the queue is
+           full, counting it as shed.
+        '''
+        with self._lock:
+            if self.queued >= self.queue_max:
+                self.shed += 1
+                return False
+            self.queued += 1
+            if self.queued > self.peak:
+                self.peak = self.queued
+            return True
+    def start(self):
+        '''Count an admitted Request as taken off the queue.'''
+        with self._lock:
+            self.queued -= 1
+    def stats(self, reset=False):
+        '''Return a dict of the number of Requests 'queued' now, the 'queue_max', the 'peak' number
+           queued and the number 'shed'. If `reset` is true, then restart the peak and shed counts.
+        '''
+        with self._lock:
+            stats = {
+                'queued': self.queued,
+                'queue_max': self.queue_max,
+                'peak': self.peak,
+                'shed': self.shed,
+            }
+            if reset:
+                self.peak = self.queued
+                self.shed = 0
+            return stats
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''An :mod:`asyncio` `JSON-RPC 2.0`_ service.
+
+   .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
+'''
+
+import asyncio
+from functools import partial
+from inspect import (isawaitable, iscoroutinefunction)
+from time import (perf_counter, time)
+from uuid import uuid4
+
+from inocybe_jsonrpc.jsonrpc import (JsonRpcError, TypeRequestObject, TypeResponseObject)
+from inocybe_jsonrpc.jsonrpc import (Service as BaseService, apply_params, params_check)
+
+class Service(BaseService):
+    '''An :mod:`asyncio` `JSON-RPC 2.0`_ service.
+
+       This service is implemented as :class:`inocybe_jsonrpc.jsonrpc.Service`, except that a
+       function implementation in :attr:`methods` or :attr:`methods_async` may also be a coroutine
+       function. A synchronous coroutine call completes when the coroutine returns. An asynchronous
+       coroutine call runs as a task, reporting with :meth:`result_async` or :meth:`error_async`
+       as usual; if the coroutine raises an :class:`Exception`, then an `Error`_ is reported.
+
+       Drive the service from an event loop by awaiting :meth:`handle_bytes_async` (or
+       :meth:`handle_request_async`, or :meth:`invoke_request_async`) for each Request. Many calls
+       may be in flight at once, and the elements of a Batch are always invoked concurrently.
+       Await :meth:`wait_async` to wait for an asynchronous call to report. As a client's 'wait'
+       does not block the event loop, :attr:`wait_max` is 30 seconds by default. The synchronous
+       :meth:`handle_bytes`, :meth:`handle_bytes_stream` and :meth:`dispatch_bytes` raise
+       :class:`TypeError`, so the service cannot be run by a synchronous transport by mistake.
+
+       To run an existing service under :mod:`asyncio`, derive from this class and the existing
+       service class, in that order. For example::
+
+           class Service(inocybe_jsonrpc.aio.Service, inocybe_jsonrpc.keyval.Service):
+               pass
+
+       .. _Error: http://www.jsonrpc.org/specification#error_object
+    '''
+    wait_max = 30.0
+    def __init__(self):
+        super().__init__()
+        ### async handle -> set of futures waiting for the call to report, on the event loop
+        self._waiters = {}
+        self._loop = None
+        self._tasks = set()
+    def handle_bytes(self, data):
+        '''Raise :class:`TypeError`: use :meth:`handle_bytes_async`.'''
+        raise TypeError(self._sync_refused('handle_bytes'))
+    def handle_bytes_stream(self, data, size=None):
+        '''Raise :class:`TypeError`: use :meth:`handle_bytes_async`.'''
+        raise TypeError(self._sync_refused('handle_bytes_stream'))
+    def dispatch_bytes(self, data):
+        '''Raise :class:`TypeError`: use :meth:`handle_bytes_async`.'''
+        raise TypeError(self._sync_refused('dispatch_bytes'))
+    def _sync_refused(self, method):
+        '''Return the message with which synchronous `method` is refused.'''
+        return '{} is an asyncio service: await handle_bytes_async(), not {}()'.format(
+            self.__class__.__name__, method
+        )
+    async def handle_request_async(self, string):
+        '''As :meth:`handle_request`, for use from a coroutine.'''
+        response = await self.handle_bytes_async(string)
+        if response is None:
+            return None
+        return response.decode('utf-8')
+    async def handle_bytes_async(self, data):
+        '''As :meth:`handle_bytes`, for use from a coroutine.'''
+        codec = self.codec
+        start = perf_counter()
+        try:
+            request = TypeRequestObject.parse(data, codec)
+        except JsonRpcError as exc:
+            (method, request) = ('rpc.invalid', None)
+            response = TypeResponseObject.error(None, exc.error, self.trusted)
+            parsed = dispatched = perf_counter()
+        else:
+            parsed = perf_counter()
+            method = request['method'] if isinstance(request, dict) else 'rpc.batch'
+            response = await self.invoke_request_async(request)
+            dispatched = perf_counter()
+            if isinstance(response, dict) and 'id' not in request:
+                response = None
+        encoded = None if response is None else self.encode_response(response)
+        self.report(method, request, response, data, encoded, (start, parsed, dispatched))
+        return encoded
+    async def invoke_request_async(self, request):
+        '''As :meth:`invoke_request`, for use from a coroutine.'''
+        response = self.invoke_request(request)
+        if isawaitable(response):
+            response = await response
+        return response
+    async def invoke_batch(self, batch):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.invoke_batch`, but invoke the elements
+           concurrently as coroutines.
+        '''
+        if not batch:
+            error = JsonRpcError.invalid_request().error
+            return TypeResponseObject.error(None, error, self.trusted)
+        responses = await asyncio.gather(*(self.invoke_element_async(_) for _ in batch))
+        responses = [_ for _ in responses if _ is not None]
+        return responses if responses else None
+    async def invoke_element_async(self, element):
+        '''As :meth:`invoke_element`, for use from a coroutine.'''
+        try:
+            request = TypeRequestObject.validate(element)
+        except JsonRpcError as exc:
+            return TypeResponseObject.error(None, exc.error, self.trusted)
+        start = perf_counter()
+        response = await self.invoke_request_async(request)
+        if self.metrics is not None:
+            self.record(request['method'], response, (start, perf_counter()))
+        if 'id' not in request:
+            return None
+        return response
+    def invoke_async(self, id_, implementation, params, async_, method=None, wait=None,
+                     deadline=None):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.invoke_async`, but if `implementation` is a
+           coroutine function, then run the call as a task (never on :attr:`async_pool`).
+        '''
+        if self.async_pool is not None and not iscoroutinefunction(implementation):
+            return BaseService.invoke_async(self, id_, implementation, params, async_, method, wait,
+                                            deadline)
+        check = params_check(implementation, 1)
+        if check is not None:
+            message = check(params)
+            if message is not None:
+                error = JsonRpcError.invalid_params(message).error
+                return TypeResponseObject.error(id_, error, self.trusted)
+        if async_ is True:
+            async_ = str(uuid4())
+        self.add_async(async_, deadline)
+        try:
+            outcome = apply_params(implementation, params, async_)
+        except Exception as exc: # pylint: disable=broad-except
+            error = JsonRpcError.from_exception(exc, check is not None).error
+            self.error_async(async_, error=error)
+        else:
+            if isawaitable(outcome):
+                task = asyncio.ensure_future(self._run_async(async_, outcome, check is not None))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return self.collect_async(id_, async_, wait)
+    def add_async(self, async_, deadline=None):
+        '''Add the asynchronous call handle `async_`, which must report by `deadline` (if not None),
+           completing :meth:`wait_async` futures when the call reports.
+        '''
+        self._active.add(async_, partial(self._reported, async_), deadline)
+    def drained(self):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.drained`, but also wait for asynchronous
+           coroutine calls, which run as tasks.
+        '''
+        return not self._tasks and BaseService.drained(self)
+    async def _run_async(self, async_, outcome, checked):
+        '''Await `outcome` of the asynchronous call with handle `async_`, the params of which were
+           `checked`, reporting any error.
+        '''
+        try:
+            await outcome
+        except Exception as exc: # pylint: disable=broad-except
+            self.error_async(async_, error=JsonRpcError.from_exception(exc, checked).error)
+    def collect_async(self, id_, async_, wait=None, deadline=None):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.collect_async`, but if `wait` is set, then
+           return a coroutine which waits without blocking the event loop.
+        '''
+        expiry = self.collect_deadline(async_, deadline)
+        if wait and expiry is not None:
+            wait = min(wait, expiry - time())
+        if not wait or wait <= 0:
+            return self.collected(id_, async_, expiry)
+        return self._collect_wait(id_, async_, wait, expiry)
+    async def _collect_wait(self, id_, async_, wait, expiry):
+        '''Wait up to `wait` seconds for the asynchronous call with handle `async_` to report, then
+           collect it, given its deadline `expiry`.
+        '''
+        await self.wait_async(async_, min(wait, self.wait_max))
+        return self.collected(id_, async_, expiry)
+    async def invoke_notification(self, method, params):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.invoke_notification`, but if the implementation
+           is a coroutine function, then await the call.
+        '''
+        if method in self._reserved or self.draining:
+            return None
+        implementation = self.resolve_sync(method)
+        if implementation is None:
+            return None
+        deadline = self.deadline(method)
+        if deadline is None:
+            await self.apply_notification(implementation, params)
+            return None
+        try:
+            await asyncio.wait_for(self.apply_notification(implementation, params),
+                                   deadline - time())
+        except asyncio.TimeoutError:
+            pass
+        return None
+    @staticmethod
+    async def apply_notification(implementation, params):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.apply_notification`, but if `implementation`
+           is a coroutine function, then await the call.
+        '''
+        check = params_check(implementation)
+        if check is not None and check(params) is not None:
+            return
+        try:
+            outcome = apply_params(implementation, params)
+            if isawaitable(outcome):
+                await outcome
+        except Exception: # pylint: disable=broad-except
+            pass
+    async def invoke_sync(self, id_, implementation, params):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.invoke_sync`, but if `implementation` is a
+           coroutine function, then await the call.
+        '''
+        check = params_check(implementation)
+        if check is not None:
+            message = check(params)
+            if message is not None:
+                error = JsonRpcError.invalid_params(message).error
+                return TypeResponseObject.error(id_, error, self.trusted)
+        try:
+            result = apply_params(implementation, params)
+            if isawaitable(result):
+                result = await result
+        except Exception as exc: # pylint: disable=broad-except
+            error = JsonRpcError.from_exception(exc, check is not None).error
+            return TypeResponseObject.error(id_, error, self.trusted)
+        return TypeResponseObject.result(id_, result, self.trusted)
+    async def invoke_bounded(self, id_, implementation, params, deadline):
+        '''As :meth:`inocybe_jsonrpc.jsonrpc.Service.invoke_bounded`, but await the call (see
+           :meth:`invoke_sync`) until `deadline`, then cancel it. A call of a function which is not a
+           coroutine function blocks the event loop, so cannot be cut short.
+        '''
+        try:
+            return await asyncio.wait_for(self.invoke_sync(id_, implementation, params),
+                                          deadline - time())
+        except asyncio.TimeoutError:
+            return TypeResponseObject.error(id_, JsonRpcError.timeout().error, self.trusted)
+    async def wait_async(self, async_, timeout=None):
+        '''Wait until the asynchronous call with handle `async_` has reported a result or error,
+           or for `timeout` seconds, if not None. Return True if the call has reported, False
+           otherwise (including when there is no such call).
+        '''
+        if async_ not in self._active:
+            return False
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        self._waiters.setdefault(async_, set()).add(future)
+        try:
+            if not self._active.reported(async_):
+                await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(async_)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[async_]
+    def _reported(self, async_, key, value): ### pylint: disable=unused-argument
+        '''Wake the coroutines waiting for the asynchronous call with handle `async_`. This may be
+           called from any thread: the waiters are only touched on the event loop.
+        '''
+        loop = self._loop
+        if loop is None:
+            ### nothing has ever waited
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake(async_)
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, async_)
+        except RuntimeError:
+            ### the loop is closed, so nothing is waiting
+            pass
+    def _wake(self, async_):
+        '''Complete the futures waiting for the asynchronous call with handle `async_`, on the event
+           loop.
+        '''
+        for future in self._waiters.get(async_, ()):
+            if not future.done():
+                future.set_result(None)
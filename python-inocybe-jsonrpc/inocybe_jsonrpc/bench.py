@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A command line tool for measuring the per-call overhead of JSON-RPC 2.0 message handling.
+
+   Each case is timed with and without skipping Response validation (see
+   :attr:`inocybe_jsonrpc.jsonrpc.Service.trusted`) and reported in microseconds per call, as a
+   JSON object on stdout.
+'''
+
+import json
+from argparse import ArgumentParser
+from timeit import repeat
+
+from inocybe_jsonrpc.jsonrpc import (TypeRequestObject, TypeResponseObject)
+from inocybe_jsonrpc.echo import Service
+
+REQUEST = json.dumps({
+    'jsonrpc': '2.0',
+    'id': 1,
+    'method': 'read',
+    'params': {'store': 'config', 'entity': 'foo', 'path': {'if:interfaces': {}}},
+    'metadata': {'async': False},
+})
+
+def cases(trusted):
+    '''Return a list of (name, callable) pairs, each timing a single call, with Responses
+       validated unless `trusted`.
+    '''
+    service = Service()
+    service.trusted = trusted
+    request = TypeRequestObject.parse(REQUEST)
+    error = {'code': -32601, 'message': 'Method not found'}
+    return [
+        ('parse', lambda: TypeRequestObject.parse(REQUEST)),
+        ('result', lambda: TypeResponseObject.result(1, request, trusted)),
+        ('error', lambda: TypeResponseObject.error(1, error, trusted)),
+        ('invoke_request', lambda: service.invoke_request(request)),
+        ('handle_request', lambda: service.handle_request(REQUEST)),
+    ]
+
+def measure(number, repeats, trusted):
+    '''Return a dict mapping case names to the best time per call, in microseconds.'''
+    return dict(
+        (name, round(min(repeat(func, number=number, repeat=repeats)) * 1e6 / number, 3))
+        for (name, func) in cases(trusted)
+    )
+
+def main():
+    '''Measure the per-call overhead of JSON-RPC 2.0 message handling.'''
+    aparser = ArgumentParser(description=main.__doc__)
+    aparser.add_argument('-n', '--number', default=20000, type=int, help='calls per timing')
+    aparser.add_argument('-r', '--repeat', default=5, type=int, help='timings per case')
+    args = vars(aparser.parse_args())
+    report = {}
+    for trusted in (False, True):
+        report['trusted' if trusted else 'validated'] = measure(args['number'], args['repeat'],
+                                                                 trusted)
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''JSON codecs for `JSON-RPC 2.0`_ messages.
+
+   A codec decodes a message from UTF-8 encoded bytes (or a string) and encodes a message as UTF-8
+   encoded bytes, so that a transport can pass its frames straight through. The codec using the
+   standard library :mod:`json` module is always available. Codecs using faster third party
+   encoders are available when the encoder is installed.
+
+   .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
+'''
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None ### pylint: disable=invalid-name
+
+try:
+    import ujson
+except ImportError:
+    ujson = None ### pylint: disable=invalid-name
+
+### the default size, in bytes, of the chunks generated by :meth:`Codec.iterencode`
+CHUNK_SIZE = 64 << 10
+
+### the depth to which :meth:`Codec.iterencode` looks for a large list or dict to encode an item at
+### a time, and the number of items from which a list or dict is large
+CHUNK_DEPTH = 4
+CHUNK_ITEMS = 32
+
+### the exceptions a codec raises for a value it cannot encode, such as an object of an unknown
+### type or, for some encoders, an int wider than 64 bits
+ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+
+class Codec(object):
+    '''A JSON codec using the standard library :mod:`json` module.
+
+       To implement a codec, derive from this class and override :meth:`decode` and :meth:`encode`,
+       and :attr:`separators` if the encoder separates items differently. A codec must raise
+       :class:`ValueError` (or :class:`TypeError`) if data cannot be decoded, and one of
+       :data:`ENCODE_ERRORS` if a value cannot be encoded.
+    '''
+    name = 'json'
+    ### the item and key separators with which :meth:`encode` separates list and dict items
+    separators = (b', ', b': ')
+    @staticmethod
+    def decode(data):
+        '''Return the value decoded from JSON-encoded `data`, either bytes or a string.'''
+        return json.loads(data)
+    @staticmethod
+    def encode(value):
+        '''Return `value` JSON-encoded as UTF-8 bytes.'''
+        return json.dumps(value).encode('utf-8')
+    @classmethod
+    def iterencode(cls, value, size=CHUNK_SIZE):
+        '''Generate `value` JSON-encoded as UTF-8 bytes, in chunks of about `size` bytes, encoded
+           as the chunks are consumed, so the whole encoding is never held in memory at once.
+
+           A large list or dict (of at least :data:`CHUNK_ITEMS` items, nested up to
+           :data:`CHUNK_DEPTH` deep in small ones) is encoded with :meth:`encode` an item at a
+           time, so a chunk may be larger than `size` if a single item is. Each item is encoded
+           whole, so a table of many small entries costs little more than :meth:`encode`.
+        '''
+        ### copy each part into a buffer, rather than keep it, as an encoder may over-allocate
+        buffered = bytearray()
+        for part in cls._iterencode(value, CHUNK_DEPTH):
+            buffered += part
+            if len(buffered) >= size:
+                yield bytes(buffered)
+                del buffered[:]
+        if buffered:
+            yield bytes(buffered)
+    @classmethod
+    def _iterencode(cls, value, depth):
+        '''Generate the parts of `value` JSON-encoded, looking up to `depth` deep for a large
+           list or dict to encode an item at a time.
+        '''
+        (item, key) = cls.separators
+        if not depth or not isinstance(value, (list, tuple, dict)) or not value:
+            yield cls.encode(value)
+            return
+        ### encode the items of a large list or dict whole, and look inside those of a small one
+        large = len(value) >= CHUNK_ITEMS
+        if isinstance(value, dict):
+            if not all(isinstance(_, str) for _ in value):
+                yield cls.encode(value)
+                return
+            yield b'{'
+            for (index, name) in enumerate(value):
+                head = cls.encode(name) + key
+                yield head if not index else item + head
+                if large:
+                    yield cls.encode(value[name])
+                else:
+                    for part in cls._iterencode(value[name], depth - 1):
+                        yield part
+            yield b'}'
+        else:
+            yield b'['
+            for (index, element) in enumerate(value):
+                if index:
+                    yield item
+                if large:
+                    yield cls.encode(element)
+                else:
+                    for part in cls._iterencode(element, depth - 1):
+                        yield part
+            yield b']'
+
+class OrjsonCodec(Codec):
+    '''A JSON codec using the :mod:`orjson` module.'''
+    name = 'orjson'
+    separators = (b',', b':')
+    @staticmethod
+    def decode(data):
+        return orjson.loads(data)
+    @staticmethod
+    def encode(value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+class UjsonCodec(Codec):
+    '''A JSON codec using the :mod:`ujson` module.'''
+    name = 'ujson'
+    separators = (b',', b':')
+    @staticmethod
+    def decode(data):
+        return ujson.loads(data)
+    @staticmethod
+    def encode(value):
+        return ujson.dumps(value, escape_forward_slashes=False).encode('utf-8')
+
+CODECS = dict((_.name, _) for (_, module) in (
+    (Codec, json),
+    (OrjsonCodec, orjson),
+    (UjsonCodec, ujson),
+) if module is not None)
+
+def codec(name):
+    '''Return the available codec called `name`. Raise :class:`ValueError` if there is no such
+       codec, or if its encoder is not installed.
+    '''
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError('codec not available: {}'.format(name))
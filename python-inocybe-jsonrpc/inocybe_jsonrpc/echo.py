@@ -21,6 +21,10 @@
 
 from inocybe_jsonrpc.jsonrpc import Service as BaseService
 
+def echo(*args, **kwargs):
+    '''An echo method implementation.'''
+    return kwargs if kwargs else args
+
 class Service(BaseService):
     '''A `JSON-RPC 2.0`_ echo service.
 
@@ -28,7 +32,4 @@ class Service(BaseService):
     '''
     def resolve_sync(self, method):
         '''Return an echo method for all `method` calls.'''
-        def echo(*args, **kwargs):
-            '''An echo method implementation.'''
-            return kwargs if kwargs else args
         return echo
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''HTTP content codings (compression) for `JSON-RPC 2.0`_ messages.
+
+   The 'gzip' and 'deflate' content codings are supported, using the standard library :mod:`zlib`
+   module. A transport negotiates the coding of a Response from the client's Accept-Encoding
+   header with :func:`negotiate`, and decodes a Request with a Content-Encoding header with
+   :func:`decode`.
+
+   .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
+'''
+
+import zlib
+
+### the window bits with which to select the zlib container of each content coding
+ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+### the order in which to prefer content codings accepted equally by a client
+PREFERENCE = ('gzip', 'deflate')
+
+def negotiate(accept):
+    '''Return the content coding with which to encode a Response, given the value of an HTTP
+       Accept-Encoding header `accept` (or None if there is none), or None if the Response should
+       not be encoded.
+    '''
+    if not accept:
+        return None
+    quality = {}
+    for item in accept.split(','):
+        (coding, _, params) = item.partition(';')
+        coding = coding.strip().lower()
+        value = 1.0
+        for param in params.split(';'):
+            (name, _, param) = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    value = float(param)
+                except ValueError:
+                    value = 0.0
+        quality[coding] = value
+    best = None
+    for coding in PREFERENCE:
+        value = quality.get(coding, quality.get('*', 0.0))
+        if value > 0.0 and (best is None or value > best[1]):
+            best = (coding, value)
+    return None if best is None else best[0]
+
+def compressor(coding, level=6):
+    '''Return a :mod:`zlib` compression object for content coding `coding`, compressing at `level`.
+       Raise :exc:`KeyError` if `coding` is not supported.
+    '''
+    return zlib.compressobj(level, zlib.DEFLATED, ENCODINGS[coding])
+
+def encode(data, coding, level=6):
+    '''Return bytes `data` encoded with content coding `coding`, compressing at `level`.'''
+    compress = compressor(coding, level)
+    return compress.compress(data) + compress.flush()
+
+def decode(data, coding, limit=0):
+    '''Return bytes `data` decoded from content coding `coding`. If `limit` is greater than 0,
+       decode at most `limit` bytes. Raise :exc:`KeyError` if `coding` is not supported, or
+       :exc:`ValueError` if `data` cannot be decoded or decodes to more than `limit` bytes.
+    '''
+    wbits = ENCODINGS[coding]
+    if coding == 'deflate' and not is_zlib(data):
+        ### some clients send a raw deflate stream, without the zlib header
+        wbits = -zlib.MAX_WBITS
+    decompress = zlib.decompressobj(wbits)
+    try:
+        decoded = decompress.decompress(data, limit)
+        if decompress.unconsumed_tail:
+            raise ValueError('decoded data exceeds {} bytes'.format(limit))
+        decoded += decompress.flush()
+    except zlib.error as exc:
+        raise ValueError(str(exc))
+    if not decompress.eof:
+        raise ValueError('truncated {} data'.format(coding))
+    if limit > 0 and len(decoded) > limit:
+        raise ValueError('decoded data exceeds {} bytes'.format(limit))
+    return decoded
+
+def is_zlib(data):
+    '''Return True if bytes `data` start with a zlib header.'''
+    header = bytearray(data[:2])
+    return len(header) == 2 and header[0] & 0x0f == 8 and (header[0] << 8 | header[1]) % 31 == 0
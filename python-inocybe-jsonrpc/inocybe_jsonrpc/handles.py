@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A bounded table of asynchronous call handles.'''
+
+from collections import OrderedDict
+from threading import (Condition, Lock)
+from time import monotonic
+
+class HandleTable(object):
+    '''A table of asynchronous call handles, each recording the result or error reported for the
+       call until a client collects it.
+
+       A handle which a client abandons is evicted: if `ttl` is not None, then a handle which has
+       not been created or polled in the last `ttl` seconds is evicted; if `maxlen` is not None,
+       then the least recently created or polled handle is evicted whenever there would otherwise
+       be more than `maxlen` handles. Either may be changed at any time. If `on_evict` is not None,
+       then it is called with each handle evicted, so that the owner of the table may release
+       anything it holds for the call. It is called without holding the table's lock, so may use
+       the table.
+
+       A handle may be added with a callback, which is called with the key and value whenever a
+       result or error is reported for the call (perhaps from another thread), and with a deadline,
+       which the table keeps for the owner (see :meth:`deadline`) and a handle which the owner
+       gives up on may be discarded (see :meth:`discard`).
+
+       The table is safe to use from multiple threads.
+    '''
+    def __init__(self, ttl=None, maxlen=None, clock=monotonic, on_evict=None):
+        self.ttl = ttl
+        self.maxlen = maxlen
+        self.on_evict = on_evict
+        self._clock = clock
+        ### handle -> [time created or last polled, {'result': ..., 'error': ...}, callback,
+        ###            deadline]
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._reports = Condition(self._lock)
+        self._created = 0
+        self._collected = 0
+        self._evicted = 0
+    def __len__(self):
+        return len(self._entries)
+    def __contains__(self, handle):
+        try:
+            return handle in self._entries
+        except TypeError:
+            return False
+    def add(self, handle, callback=None, deadline=None):
+        '''Add a new `handle`, with optional report `callback` and `deadline`, evicting abandoned
+           handles to make room.
+        '''
+        now = self._clock()
+        with self._lock:
+            self._entries[handle] = [now, {}, callback, deadline]
+            self._entries.move_to_end(handle)
+            self._created += 1
+            evicted = self._evict(now)
+        self._evicted_all(evicted)
+    def report(self, handle, key, value):
+        '''Record `value` as the 'result' or 'error' `key` of the call with `handle`. Return False if
+           there is no such handle (for instance, it has been evicted), True otherwise.
+        '''
+        with self._lock:
+            try:
+                entry = self._entries[handle]
+            except (KeyError, TypeError):
+                return False
+            entry[1][key] = value
+            callback = entry[2]
+            self._reports.notify_all()
+        if callback is not None:
+            callback(key, value)
+        return True
+    def reported(self, handle):
+        '''Return True if a result or error has been reported for the call with `handle`.'''
+        with self._lock:
+            try:
+                return bool(self._entries[handle][1])
+            except (KeyError, TypeError):
+                return False
+    def wait(self, handle, timeout):
+        '''Wait for up to `timeout` seconds for a result or error to be reported for the call with
+           `handle`. Return True if the call has reported, False otherwise (including when there is
+           no such handle). The handle counts as polled while waiting.
+        '''
+        deadline = monotonic() + timeout
+        with self._lock:
+            try:
+                entry = self._entries[handle]
+            except (KeyError, TypeError):
+                return False
+            entry[0] = self._clock()
+            self._entries.move_to_end(handle)
+            while not entry[1]:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or handle not in self._entries:
+                    return False
+                self._reports.wait(remaining)
+        return True
+    def collect(self, handle):
+        '''If the call with `handle` has reported an error or a result, then remove the handle and
+           return a 2-tuple ('error', error) or ('result', result). Otherwise mark the handle as
+           polled and return None.
+        '''
+        now = self._clock()
+        with self._lock:
+            try:
+                entry = self._entries[handle]
+            except (KeyError, TypeError):
+                return None
+            for key in ('error', 'result'):
+                if key in entry[1]:
+                    del self._entries[handle]
+                    self._collected += 1
+                    return (key, entry[1][key])
+            entry[0] = now
+            self._entries.move_to_end(handle)
+            evicted = self._evict(now)
+        self._evicted_all(evicted)
+        return None
+    def deadline(self, handle):
+        '''Return the deadline with which the call with `handle` was added, or None if it has none
+           (or there is no such handle).
+        '''
+        with self._lock:
+            try:
+                return self._entries[handle][3]
+            except (KeyError, TypeError):
+                return None
+    def discard(self, handle):
+        '''Evict `handle` now, whether or not the call has reported. Return False if there is no
+           such handle, True otherwise.
+        '''
+        with self._lock:
+            try:
+                del self._entries[handle]
+            except (KeyError, TypeError):
+                return False
+            self._evicted += 1
+        self._evicted_all([handle])
+        return True
+    def evict(self):
+        '''Evict any abandoned handles now.'''
+        with self._lock:
+            evicted = self._evict(self._clock())
+        self._evicted_all(evicted)
+    def _evict(self, now):
+        '''Evict abandoned handles, the least recently created or polled first, and return a list
+           of them. The caller must hold the lock.
+        '''
+        (entries, evicted) = (self._entries, [])
+        if self.maxlen is not None:
+            while len(entries) > self.maxlen:
+                evicted.append(entries.popitem(last=False)[0])
+        if self.ttl is not None:
+            expired = now - self.ttl
+            while entries:
+                handle = next(iter(entries))
+                if entries[handle][0] > expired:
+                    break
+                del entries[handle]
+                evicted.append(handle)
+        self._evicted += len(evicted)
+        return evicted
+    def _evicted_all(self, evicted):
+        '''Call :attr:`on_evict` with each handle in list `evicted`. The caller must not hold the
+           lock.
+        '''
+        if self.on_evict is not None:
+            for handle in evicted:
+                self.on_evict(handle)
+    def stats(self):
+        '''Return a dict of counters: the number of 'live' handles and the total number of handles
+           'created', 'collected' by clients and 'evicted' as abandoned.
+        '''
+        with self._lock:
+            return {
+                'live': len(self._entries),
+                'created': self._created,
+                'collected': self._collected,
+                'evicted': self._evicted,
+            }
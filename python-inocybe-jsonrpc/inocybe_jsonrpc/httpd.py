@@ -14,22 +14,50 @@
 # permissions and limitations under the License.
 
 
-'''A command line tool for running JSON-RPC 2.0 services under a minimal HTTPd.'''
+'''A command line tool for running JSON-RPC 2.0 services under a minimal HTTPd.
 
-from argparse import (ArgumentParser, ArgumentTypeError)
+   By default, HTTP Requests are handled one at a time, one per connection. With the --threads
+   option, HTTP Requests are handled on a pool of threads, with HTTP/1.1 persistent connections
+   (keep-alive), so a client may send many HTTP Requests on one connection, pipelined if it
+   wishes. Each connection occupies a thread until it is closed or idle for --keep-alive seconds.
+   The service must then be thread safe.
+
+   With the --stream option (and --threads), a Response larger than one chunk is encoded as it is
+   written, with HTTP/1.1 chunked transfer coding, so that a large Response is never held in
+   memory whole.
+
+   With the --queue-max option (and --threads), at most that many connections wait for a thread.
+   Beyond that, a connection is shed: its HTTP Request is answered at once with 503 and a server
+   busy Error, and the connection is closed. The queue depth and the number shed are reported by
+   'rpc.stats'.
+
+   Many services may be presented at once, each at its own URL path, listed in a JSON file given
+   with the --config option (see :func:`inocybe_jsonrpc.options.read_services`).
+
+   On SIGTERM, the HTTPd drains (see :func:`drain`): it stops accepting connections, answers the
+   HTTP Requests in progress, closing each connection after its Response, and waits for the
+   asynchronous calls running on a pool to complete, for up to --drain-timeout seconds, then
+   exits. With the
+   --reuse-port option, the port is bound with SO_REUSEPORT, so that a new HTTPd may bind it while
+   the old one is still running, and take over new connections once the old one drains.
+'''
+
+import logging
+import signal
+import socket
 
-try:
-    # Python 3
-    from urllib.parse import urlparse
-    from http.server import (HTTPServer, BaseHTTPRequestHandler)
-except ImportError:
-    # Python 2
-    # pylint: disable=wrong-import-order,import-error
-    from urlparse import urlparse
-    from SimpleHTTPServer import SimpleHTTPRequestHandler as BaseHTTPRequestHandler
-    from SocketServer import TCPServer as HTTPServer
+from argparse import (ArgumentParser, ArgumentTypeError)
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from threading import Thread
+from http.server import (HTTPServer, BaseHTTPRequestHandler)
+from time import (monotonic, sleep)
+from urllib.parse import urlparse
 
 from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc import (encoding, options)
+from inocybe_jsonrpc.admission import Admission
+from inocybe_jsonrpc.codec import CHUNK_SIZE
 
 def url_path(string):
     '''Return a URL path from `string`. The URL path must not specify a scheme, authority, query or
@@ -41,29 +69,69 @@ def url_path(string):
     return parsed.path
 
 class JsonRpcHandler(BaseHTTPRequestHandler):
-    '''A HTTP Request handler for JSON-RPC 2.0 method invocation.'''
-    def __init__(self, request, client_address, server, services):
-        ### for some reason, derived class attributes have to be initialised first...
-        self._services = dict((k.rstrip('/'), v) for (k, v) in services)
-        self._media_type = 'application/json'
-        BaseHTTPRequestHandler.__init__(self, request, client_address, server)
+    '''A HTTP Request handler for JSON-RPC 2.0 method invocation.
+
+       The handler routes an HTTP Request to a service by URL path, using the :attr:`services`
+       table. Use :meth:`routing` to derive a handler class with a table built once.
+    '''
+    services = {}
+    media_type = 'application/json'
+    ### the smallest Response to compress, if the client accepts it, or None to never compress
+    compress_min = None
+    compress_level = 6
+    ### the largest Request to accept, once decompressed
+    decompressed_max = 64 << 20
+    ### whether to stream Responses of more than one chunk with chunked transfer coding
+    stream = False
+    chunk_size = CHUNK_SIZE
+    ### whether to shed the Request, answering 503 with a server busy Error, then close
+    shed = False
+    ### send the headers and body of a Response without waiting for an ACK
+    disable_nagle_algorithm = True
+    @classmethod
+    def routing(cls, services, keep_alive=None, compress_min=None, stream=False):
+        '''Return a handler class derived from this class, routing HTTP Requests by path to
+           services, from the list of (path, service) pairs `services`. If `keep_alive` is not
+           None, then the handler keeps HTTP/1.1 connections open until idle for `keep_alive`
+           seconds. If `compress_min` is not None, then the handler compresses Responses of at
+           least `compress_min` bytes with a content coding the client accepts. If `stream` is
+           True (which requires `keep_alive`, for HTTP/1.1), then the handler streams Responses
+           of more than one chunk.
+        '''
+        attrs = {
+            'services': dict((k.rstrip('/'), v) for (k, v) in services),
+            'compress_min': compress_min,
+            'stream': stream,
+        }
+        if keep_alive is not None:
+            attrs.update({'protocol_version': 'HTTP/1.1', 'timeout': keep_alive})
+        return type(cls.__name__, (cls,), attrs)
     def do_POST(self): ### pylint: disable=invalid-name
         '''Invoke a JSON-RPC 2.0 Request and return the Response:
 
            - if the HTTP Request URL path does not map to a service, return 404;
            - if the HTTP Request Content-Type header is not application/json, return 415;
            - if the HTTP Request is missing a Content-Length header, return 411;
-           - otherwise, decode a UTF-8 string from the Request Content and invoke it against the
-             corresponding service, return 200 with the service Response.
+           - if the HTTP Request Content-Encoding header is not gzip, deflate or identity, return
+             415, or if the Request Content cannot be decoded, return 400;
+           - if :attr:`shed` is True, return 503 with a server busy Error for the Request (see
+             :meth:`inocybe_jsonrpc.jsonrpc.Service.shed_bytes`) and close the connection;
+           - otherwise, invoke the UTF-8 encoded Request Content against the corresponding service,
+             return 200 with the service Response, or 204 if the service has no Response (a
+             notification, or a batch of notifications).
+
+           The Response is compressed if it is at least :attr:`compress_min` bytes and the HTTP
+           Request Accept-Encoding header accepts gzip or deflate. If :attr:`stream` is True and
+           the HTTP Request is HTTP/1.1, a Response of more than one chunk is streamed (see
+           :meth:`write_chunked`).
         '''
-        self.protocol_version = self.request_version
         try:
-            service = self._services[self.path.rstrip('/')]
+            service = self.services[self.path.rstrip('/')]
         except KeyError:
             self.send_error(404)
             return
         try:
-            if self.headers['Content-Type'] != self._media_type:
+            if self.headers['Content-Type'] != self.media_type:
                 self.send_error(415)
                 return
         except KeyError:
@@ -73,24 +141,237 @@ class JsonRpcHandler(BaseHTTPRequestHandler):
         except (KeyError, TypeError):
             self.send_error(411)
             return
-        request = self.rfile.read(length).decode('utf-8')
-        self.log_message('> ' + request)
-        response = service.handle_request(request)
-        self.log_message('< ' + response)
-        response = response.encode('utf-8')
+        request = self.rfile.read(length)
+        coding = (self.headers.get('Content-Encoding') or 'identity').strip().lower()
+        if coding != 'identity':
+            try:
+                request = encoding.decode(request, coding, self.decompressed_max)
+            except KeyError:
+                self.send_error(415)
+                return
+            except ValueError:
+                self.send_error(400)
+                return
+        if self.shed:
+            self.send_busy(service.shed_bytes(request))
+            return
+        if self.stream and self.request_version == 'HTTP/1.1' == self.protocol_version:
+            chunks = service.handle_bytes_stream(request, self.chunk_size)
+            response = None if chunks is None else next(chunks)
+            following = None if chunks is None else next(chunks, None)
+            if following is not None:
+                try:
+                    self.write_chunked(chain((response, following), chunks))
+                finally:
+                    chunks.close()
+                return
+        else:
+            response = service.handle_bytes(request)
+        if response is None:
+            self.send_response(204)
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+            return
         self.send_response(200)
-        self.send_header('Content-Type', self._media_type)
+        self.send_header('Content-Type', self.media_type)
+        if self.compress_min is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+            if len(response) >= self.compress_min:
+                coding = encoding.negotiate(self.headers.get('Accept-Encoding'))
+                if coding is not None:
+                    response = encoding.encode(response, coding, self.compress_level)
+                    self.send_header('Content-Encoding', coding)
+        self.send_header('Content-Length', len(response))
+        self.end_headers()
+        self.wfile.write(response)
+    def send_busy(self, response):
+        '''Send a 503 Response with the encoded JSON-RPC 2.0 `response`, if not None, and close the
+           connection.
+        '''
+        self.send_response(503)
+        self.send_header('Connection', 'close')
+        if response is None:
+            self.send_header('Content-Length', 0)
+            self.end_headers()
+            return
+        self.send_header('Content-Type', self.media_type)
         self.send_header('Content-Length', len(response))
         self.end_headers()
         self.wfile.write(response)
+    def end_headers(self):
+        '''Close the connection after this Response if the server is draining (see
+           :func:`drain`), telling the client so.
+        '''
+        if getattr(self.server, 'draining', False):
+            self.send_header('Connection', 'close')
+        BaseHTTPRequestHandler.end_headers(self)
+    def write_chunked(self, chunks):
+        '''Send a 200 Response with the encoded JSON-RPC 2.0 Response from iterator `chunks`,
+           writing each chunk as it is produced with chunked transfer coding, compressed if
+           :attr:`compress_min` is not None and the client accepts it.
+        '''
+        self.send_response(200)
+        self.send_header('Content-Type', self.media_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        compress = None
+        if self.compress_min is not None:
+            self.send_header('Vary', 'Accept-Encoding')
+            coding = encoding.negotiate(self.headers.get('Accept-Encoding'))
+            if coding is not None:
+                compress = encoding.compressor(coding, self.compress_level)
+                self.send_header('Content-Encoding', coding)
+        self.end_headers()
+        for chunk in chunks:
+            if compress is not None:
+                chunk = compress.compress(chunk)
+            if chunk:
+                self.wfile.write(b'%X\r\n%s\r\n' % (len(chunk), chunk))
+        if compress is not None:
+            chunk = compress.flush()
+            self.wfile.write(b'%X\r\n%s\r\n' % (len(chunk), chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+class PooledHTTPServer(HTTPServer):
+    '''A HTTP server handling each connection on a pool of `threads` threads.
+
+       If `admission`, an :class:`inocybe_jsonrpc.admission.Admission`, is given, then a connection
+       which would wait for a thread behind a full queue is shed instead: one HTTP Request is read
+       from it on a separate thread, and answered with a server busy Error (see
+       :attr:`JsonRpcHandler.shed`), allowing each read only :attr:`shed_timeout` seconds. If that
+       thread cannot keep up either, then the connection is closed at once.
+    '''
+    daemon_threads = True
+    shed_timeout = 1.0
+    def __init__(self, address, handler, threads, admission=None):
+        HTTPServer.__init__(self, address, handler)
+        self.executor = ThreadPoolExecutor(threads)
+        self.admission = admission
+        if admission is not None:
+            self.shedder = ThreadPoolExecutor(1)
+            self.shedding = Admission(admission.queue_max)
+            self.shed_handler = type(handler.__name__, (handler,), {
+                'shed': True, 'timeout': self.shed_timeout,
+            })
+    def process_request(self, request, client_address):
+        '''Handle the connection `request` from `client_address` on the pool, or shed it.'''
+        if self.admission is None:
+            self.executor.submit(self.process_request_thread, request, client_address)
+        elif self.admission.admit():
+            self.executor.submit(self.process_admitted, self.admission, request, client_address)
+        elif self.shedding.admit():
+            self.shedder.submit(self.process_admitted, self.shedding, request, client_address,
+                                self.shed_handler)
+        else:
+            self.shutdown_request(request)
+    def process_admitted(self, admission, request, client_address, handler=None):
+        '''Take the connection `request` from `client_address` off the queue of `admission`, then
+           handle it (see :meth:`process_request_thread`).
+        '''
+        admission.start()
+        self.process_request_thread(request, client_address, handler)
+    def process_request_thread(self, request, client_address, handler=None):
+        '''Handle the connection `request` from `client_address` with `handler` (by default, the
+           server's handler class), then close it.
+        '''
+        try:
+            if handler is None:
+                self.finish_request(request, client_address)
+            else:
+                handler(request, client_address, self)
+        except Exception: # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.executor.shutdown(wait=False)
+        if self.admission is not None:
+            self.shedder.shutdown(wait=False)
+
+def reuse_port(server):
+    '''Return a server class derived from `server`, binding its port with SO_REUSEPORT, so that
+       another process may bind it too. (Unlike :attr:`socketserver.TCPServer.allow_reuse_port`,
+       this does not depend on the version of Python.)
+    '''
+    def server_bind(self):
+        '''Bind the socket with SO_REUSEPORT.'''
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.server_bind(self)
+    return type(server.__name__, (server,), {'server_bind': server_bind})
+
+def drain(httpd, services, timeout):
+    '''Drain `httpd`, which has stopped serving, presenting the list of (path, service) pairs
+       `services`: mark each service as draining, so that new calls are shed (see
+       :attr:`inocybe_jsonrpc.jsonrpc.Service.draining`); accept the connections already queued,
+       then stop listening; wait for the connections being handled to close, each after its
+       current HTTP Request (or once idle for the keep-alive time); then wait for `services` to be
+       drained (see :meth:`inocybe_jsonrpc.jsonrpc.Service.drained`). Stop waiting after `timeout`
+       seconds in all.
+    '''
+    deadline = monotonic() + timeout
+    httpd.draining = True
+    for (_, service) in services:
+        service.draining = True
+    httpd.socket.setblocking(False)
+    while True:
+        try:
+            (request, client_address) = httpd.get_request()
+        except OSError:
+            break
+        request.setblocking(True)
+        httpd.process_request(request, client_address)
+    httpd.socket.close()
+    if isinstance(httpd, PooledHTTPServer):
+        waiter = Thread(target=httpd.executor.shutdown)
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(max(deadline - monotonic(), 0))
+    while not all(service.drained() for (_, service) in services):
+        if monotonic() >= deadline:
+            logging.warning('drain timed out after %.1fs', timeout)
+            return
+        sleep(0.1)
 
 def main():
     '''Run JSON-RPC 2.0 services under a minimal HTTPd.'''
+    logging.basicConfig(level=logging.INFO)
     aparser = ArgumentParser(description=main.__doc__)
     aparser.add_argument('-b', '--bind', default='')
     aparser.add_argument('-p', '--port', default=8080, type=int)
-    aparser.add_argument('path', type=url_path, help='the URL path at which to present `service`')
-    aparser.add_argument('service', type=ArgModuleAttribute('Service'), help=', '.join((
+    aparser.add_argument('-t', '--threads', default=0, type=int, help=' '.join((
+        'the number of threads on which to handle connections, with HTTP/1.1 keep-alive',
+        '(by default HTTP Requests are handled one at a time, one per connection)',
+    )))
+    aparser.add_argument('--keep-alive', default=15.0, type=float, help=' '.join((
+        'the number of seconds after which to close an idle connection, with --threads',
+    )))
+    aparser.add_argument('--compress-min', default=1024, type=int, help=' '.join((
+        'the smallest Response, in bytes, to compress with gzip or deflate',
+        'if the client accepts it (a negative value disables compression)',
+    )))
+    aparser.add_argument('--stream', action='store_true', help=' '.join((
+        'stream Responses larger than one chunk with HTTP/1.1 chunked transfer coding,',
+        'encoding them as they are written (requires --threads)',
+    )))
+    aparser.add_argument('--queue-max', type=int, help=' '.join((
+        'the maximum number of connections to queue waiting for a thread, beyond which each',
+        'connection is answered at once with a server busy error (requires --threads)',
+    )))
+    aparser.add_argument('--drain-timeout', default=5.0, type=float, help=' '.join((
+        'the most seconds for which to drain on SIGTERM, before exiting',
+    )))
+    aparser.add_argument('--reuse-port', action='store_true', help=' '.join((
+        'bind the port with SO_REUSEPORT, so that a new HTTPd may take it over',
+    )))
+    aparser.add_argument('-c', '--config', help=' '.join((
+        'a JSON file listing the services to present, each with a "path", a "service" and',
+        'optional "args", instead of `path`, `service` and `args`',
+    )))
+    options.add_arguments(aparser)
+    aparser.add_argument('path', nargs='?', type=url_path, help=' '.join((
+        'the URL path at which to present `service`',
+    )))
+    aparser.add_argument('service', nargs='?', type=ArgModuleAttribute('Service'), help=', '.join((
         'the service to invoke for any POST request to `path` (with optional trailing "/")',
         'specified as a Python class implementing inocybe_jsonrpc.jsonrpc.Service',
         'or a Python module with a Service attribute',
@@ -98,16 +379,42 @@ def main():
     aparser.add_argument('args', nargs='*', help='string args to create `service` instance with')
     args = vars(aparser.parse_args())
     address = (args['bind'], args['port'])
-    path = args['path']
-    try:
-        service = args['service'](*args['args'])
-    except TypeError as exc:
-        aparser.error('failed to create service instance, ' + str(exc))
-    httpd = HTTPServer(address, lambda r, c, s: JsonRpcHandler(r, c, s, [(path, service)]))
+    if args['stream'] and args['threads'] < 1:
+        aparser.error('--stream requires --threads')
+    if args['queue_max'] is not None and args['threads'] < 1:
+        aparser.error('--queue-max requires --threads')
+    if args['queue_max'] is not None and args['queue_max'] < 0:
+        aparser.error('--queue-max must not be negative')
+    services = options.create_services(aparser, args, 'path', url_path, asyncio=False)
+    compress_min = args['compress_min'] if args['compress_min'] >= 0 else None
+    server = PooledHTTPServer if args['threads'] > 0 else HTTPServer
+    if args['reuse_port']:
+        server = reuse_port(server)
+    if args['threads'] > 0:
+        handler = JsonRpcHandler.routing(services, args['keep_alive'], compress_min,
+                                         args['stream'])
+        admission = None
+        if args['queue_max'] is not None:
+            admission = Admission(args['queue_max'])
+            for (_, service) in services:
+                service.admission = admission
+        httpd = server(address, handler, args['threads'], admission)
+    else:
+        httpd = server(address, JsonRpcHandler.routing(services, compress_min=compress_min))
+    stopped = []
+    def stop(signum, frame): ### pylint: disable=unused-argument
+        '''Stop serving, to drain.'''
+        stopped.append(signum)
+        ### shutdown() waits for serve_forever() to return, so must not be called from it
+        Thread(target=httpd.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
     try:
         httpd.serve_forever()
+        if stopped:
+            drain(httpd, services, args['drain_timeout'])
     except KeyboardInterrupt:
-        httpd.shutdown()
+        pass
+    httpd.server_close()
 
 if __name__ == '__main__':
     main()
@@ -38,14 +38,61 @@
    If the call has not completed, then a Response is again sent with the 'metadata' object from the
    first Response.
 
+   Rather than poll repeatedly, a client may include a 'wait' property in the 'metadata' object, a
+   number of seconds for which the server may wait for the call to complete before responding. A
+   server may respond sooner than requested, and by default does not wait at all (see
+   :attr:`Service.wait_max`). A 'wait' may also be included when first invoking a call.
+
+   A service may run asynchronous calls on a worker pool (see :attr:`Service.async_pool`), in which
+   case a Response including the 'metadata' extension is always returned at once, and the call
+   runs while the server handles other Requests.
+
+   A client may include a 'deadline' property in the 'metadata' object, the time (in seconds since
+   the epoch) after which it no longer wants a Response, so the clocks of client and server must
+   agree. A service may also bound the time taken by each method (see :attr:`Service.timeouts`).
+   A Request whose deadline has passed before the method is invoked is not invoked at all, and a
+   timeout Error is returned at once. A synchronous call still running at its deadline is answered
+   with a timeout Error, if the service runs such calls where it can abandon them (see
+   :attr:`Service.timeout_executor`). A 'wait' is cut short at the deadline. The deadline of an
+   asynchronous call is set when it is invoked, and polls do not extend it: a call which has not
+   reported by then is abandoned, and a poll is answered with a timeout Error, after which the
+   handle is no longer valid. A notification is bounded by the timeout of its method.
+
+   A Request without an 'id' is a notification: the method is invoked, but no Response is built
+   or returned, even if the call fails.
+
+   A client may send a `Batch`_, an array of Requests, in place of a single Request. Each element of
+   a Batch is handled as if it were received alone and the Responses are returned as an array, in
+   the order of the elements. No Response is included for a notification (a Request without an
+   'id'), and if a Batch contains only notifications then nothing at all is returned. A service may
+   invoke the elements of a Batch concurrently (see :attr:`Service.batch_executor`), so a client
+   must only batch Requests which are independent of each other.
+
+   A transport may bound the number of Requests queued in front of a service, and shed the rest
+   (see :class:`inocybe_jsonrpc.admission.Admission`): a shed Request is not invoked, and a server
+   busy Error is returned at once.
+
+   Every service supports the reserved introspection method 'rpc.stats', which returns per-method
+   call and error counts, Request and Response sizes and latency percentiles (see
+   :meth:`Service.rpc_stats`).
+
    .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
    .. _Request: http://www.jsonrpc.org/specification#request_object
    .. _Response: http://www.jsonrpc.org/specification#response_object
    .. _Error: http://www.jsonrpc.org/specification#error_object
+   .. _Batch: http://www.jsonrpc.org/specification#batch
 '''
 
-import json
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import partial
+from inspect import (Parameter, signature)
+from time import (perf_counter, time)
 from uuid import uuid4
+from weakref import WeakKeyDictionary
+
+from inocybe_jsonrpc.codec import (CHUNK_SIZE, ENCODE_ERRORS, Codec)
+from inocybe_jsonrpc.handles import HandleTable
+from inocybe_jsonrpc.metrics import Metrics
 
 class JsonRpcError(Exception):
     '''An exception specifying an `Error`_ to include in a `Response`_.'''
@@ -54,6 +101,10 @@ class JsonRpcError(Exception):
         self._error = {'code': code, 'message': message}
         if data is not None:
             self._error['data'] = data
+    def __reduce__(self):
+        ### so that an error raised on a worker process reaches the service intact
+        error = self._error
+        return (self.__class__, (error['code'], error['message'], error.get('data')))
     @property
     def error(self):
         '''Return the `Error`_ for this exception.'''
@@ -78,6 +129,120 @@ class JsonRpcError(Exception):
     def internal_error(cls, message, data=None):
         '''Return a :class:`JsonRpcError` for an Internal `Error`_.'''
         return cls(-32603, 'Internal error: {}'.format(message), data)
+    @classmethod
+    def timeout(cls, data=None):
+        '''Return a :class:`JsonRpcError` for a server `Error`_ reporting that a call did not
+           complete by its deadline.
+        '''
+        return cls(-32000, 'Timeout', data)
+    @classmethod
+    def server_busy(cls, data=None):
+        '''Return a :class:`JsonRpcError` for a server `Error`_ reporting that a Request was shed,
+           without being invoked, because the server was too busy to queue it.
+        '''
+        return cls(-32001, 'Server busy', data)
+    @classmethod
+    def from_exception(cls, exc, checked=False):
+        '''Return a :class:`JsonRpcError` for `exc`, raised by a method implementation. A
+           :class:`TypeError` is taken to mean Invalid params, unless the params were `checked`
+           against the signature of the implementation before the call (see :func:`params_check`),
+           in which case it was raised by the implementation itself.
+        '''
+        if isinstance(exc, JsonRpcError):
+            return exc
+        if isinstance(exc, TypeError) and not checked:
+            return cls.invalid_params(data=str(exc))
+        if isinstance(exc, NotImplementedError):
+            return cls.internal_error('method not supported in this service')
+        return cls.internal_error(str(exc))
+
+def apply_params(implementation, params, *args):
+    '''Call `implementation` with leading positional `args` followed by `params`: by position, if
+       `params` is a list, or by name, if `params` is a dict. Return the return value.
+    '''
+    if params is None:
+        return implementation(*args)
+    elif isinstance(params, list):
+        return implementation(*(args + tuple(params)))
+    return implementation(*args, **params)
+
+def apply_before(deadline, implementation, params, *args):
+    '''As :func:`apply_params`, unless the time is already past `deadline`, in seconds since the
+       epoch, in which case raise a timeout :class:`JsonRpcError` without calling `implementation`.
+    '''
+    if time() >= deadline:
+        raise JsonRpcError.timeout()
+    return apply_params(implementation, params, *args)
+
+### implementation -> params check, for each number of leading args (see params_check())
+_CHECKS = (WeakKeyDictionary(), WeakKeyDictionary())
+
+def params_check(implementation, leading=0):
+    '''Return a function which checks that `params` can be applied to `implementation` after
+       `leading` args, either 0 (for a synchronous call) or 1 (for an asynchronous call, after the
+       handle), without calling it (see :func:`apply_params`). The function returns None if so, or
+       a message describing the mismatch if not. If the signature of `implementation` cannot be
+       determined (for instance, for some builtins), then return None.
+
+       The check is compiled from the signature of `implementation` once, and cached for as long
+       as `implementation` exists.
+    '''
+    cache = _CHECKS[leading]
+    try:
+        return cache[implementation]
+    except KeyError:
+        pass
+    except TypeError:
+        ### not weakly referenceable, so compile it every time
+        return _compile_check(implementation, leading)
+    check = cache[implementation] = _compile_check(implementation, leading)
+    return check
+
+def _compile_check(implementation, leading):
+    '''Compile the params check for :func:`params_check`.'''
+    try:
+        sig = signature(implementation)
+    except (TypeError, ValueError):
+        return None
+    positional = [_ for _ in sig.parameters.values()
+                  if _.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)]
+    kinds = frozenset(_.kind for _ in sig.parameters.values())
+    least = len([_ for _ in positional if _.default is Parameter.empty])
+    most = None if Parameter.VAR_POSITIONAL in kinds else len(positional)
+    keyword_only = [_ for _ in sig.parameters.values() if _.kind == Parameter.KEYWORD_ONLY]
+    ### positional params after the leading args may also be passed by name
+    named = [_ for _ in positional[leading:] if _.kind == Parameter.POSITIONAL_OR_KEYWORD]
+    accepted = frozenset(_.name for _ in named + keyword_only)
+    ### ...but those taken by the leading args may not
+    taken = frozenset(_.name for _ in positional[:leading]
+                      if _.kind == Parameter.POSITIONAL_OR_KEYWORD)
+    required = frozenset(_.name for _ in named + keyword_only if _.default is Parameter.empty)
+    by_position = not any(_.default is Parameter.empty for _ in keyword_only)
+    by_name = (
+        (most is None or leading <= most)
+        and all(_.default is not Parameter.empty
+                for _ in positional[leading:] if _.kind == Parameter.POSITIONAL_ONLY)
+    )
+    var_keyword = Parameter.VAR_KEYWORD in kinds
+    def check(params):
+        '''Return None if `params` match the signature, or a message if not.'''
+        if params is None or isinstance(params, list):
+            count = leading + (len(params) if params else 0)
+            if by_position and count >= least and (most is None or count <= most):
+                return None
+            (args, kwargs) = ((None,) * leading + tuple(params or ()), {})
+        else:
+            keys = params.keys()
+            if (by_name and keys >= required and (var_keyword or keys <= accepted)
+                    and taken.isdisjoint(keys)):
+                return None
+            (args, kwargs) = ((None,) * leading, params)
+        try:
+            sig.bind(*args, **kwargs)
+        except TypeError as exc:
+            return str(exc)
+        return None
+    return check
 
 # pylint: disable=too-few-public-methods
 class ValueType(object):
@@ -115,21 +280,34 @@ class TypeVersion(ValueType):
     '''A value type for validating `JSON-RPC 2.0`_ version.'''
     @staticmethod
     def form(value):
-        if value in ('2.0', 2.0, '2', 2):
+        if value == '2.0' and isinstance(value, str):
+            return value
+        if value in (2.0, '2', 2):
             return '2.0'
         raise ValueError(value)
 
 class TypeMethod(ValueType):
-    '''A value type for validating `JSON-RPC 2.0`_ method.'''
+    '''A value type for validating `JSON-RPC 2.0`_ method. A method name beginning 'rpc.' is only
+       valid if it is one of the :attr:`reserved` introspection methods which a service implements.
+    '''
+    reserved = frozenset(('rpc.stats',))
     @staticmethod
     def form(value):
         try:
-            if not value.startswith('rpc.'):
+            if not value.startswith('rpc.') or value in TypeMethod.reserved:
                 return value
         except AttributeError:
             pass
         raise ValueError(value)
 
+class TypeSeconds(ValueType):
+    '''A value type accepting a non-negative number of seconds.'''
+    @staticmethod
+    def form(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+            return value
+        raise ValueError(value)
+
 class TypeParams(ValueType):
     '''A value type for validating `JSON-RPC 2.0`_ params.'''
     @staticmethod
@@ -142,34 +320,64 @@ class TypeStructuredDict(ValueType):
     '''A value type for validating a dict's `mandatory` pairs and `optional` pairs, where
        `mandatory` and `optional` map pair keys to a :class:`ValueType` instance which forms a
        pair value.
+
+       The validator is compiled once, on construction, into a :meth:`form` function specialised
+       for the pairs. A value which is already in canonical form is returned as is, rather than
+       copied. Use :meth:`instance` to share a single compiled instance of a derived type.
     '''
     def __init__(self, mandatory=(), optional=()):
         ValueType.__init__(self)
         self._mandatory = dict(mandatory)
         self._optional = dict(optional)
-    def form(self, value):
-        if not isinstance(value, dict):
-            raise ValueError(value)
-        formed = {}
-        for key in value:
-            if key in self._mandatory:
-                value_type = self._mandatory[key]
-            elif key in self._optional:
-                value_type = self._optional[key]
-            else:
+        self.form = self.compile() ### pylint: disable=method-hidden
+    def compile(self):
+        '''Return a function which forms a value of this type.'''
+        value_types = dict(self._optional)
+        value_types.update(self._mandatory)
+        keys = frozenset(value_types)
+        mandatory = frozenset(self._mandatory)
+        ### pairs with values of TypeAny are never checked, the rest are checked in a fixed order
+        checks = tuple(
+            (k, v.form) for (k, v) in sorted(value_types.items())
+            if not (v is TypeAny or isinstance(v, TypeAny))
+        )
+        def form(value):
+            '''Return `value` in canonical form, or raise :class:`ValueError`.'''
+            if not isinstance(value, dict):
                 raise ValueError(value)
-            try:
-                formed[key] = value_type.form(value[key])
-            except ValueError:
+            if not value.keys() <= keys or not value.keys() >= mandatory:
                 raise ValueError(value)
-        if frozenset(self._mandatory) - frozenset(formed):
-            raise ValueError(value)
-        return formed
+            formed = value
+            for (key, form_) in checks:
+                if key in value:
+                    item = value[key]
+                    try:
+                        canonical = form_(item)
+                    except ValueError:
+                        raise ValueError(value)
+                    if canonical is not item:
+                        if formed is value:
+                            formed = dict(value)
+                        formed[key] = canonical
+            return formed
+        return form
+    @classmethod
+    def instance(cls):
+        '''Return an instance of this type which is shared by all callers.'''
+        try:
+            return cls.__dict__['_instance']
+        except KeyError:
+            cls._instance = cls()
+            return cls._instance
 
 class TypeMetadata(TypeStructuredDict):
     '''A value type for validating metadata extension.'''
     def __init__(self):
-        TypeStructuredDict.__init__(self, optional={'async': TypeAny})
+        TypeStructuredDict.__init__(self, optional={
+            'async': TypeAny,
+            'wait': TypeSeconds,
+            'deadline': TypeSeconds,
+        })
 
 class TypeRequestObject(TypeStructuredDict):
     '''A function for validating a `Request`_.'''
@@ -183,20 +391,35 @@ class TypeRequestObject(TypeStructuredDict):
             'metadata': TypeMetadata(),
         })
     @classmethod
-    def parse(cls, string):
-        '''Parse and return a `Request`_ from JSON-encoded `string`. Otherwise raise
-           :class:`JsonRpcError`.'''
+    def parse(cls, string, codec=Codec):
+        '''Parse and return a `Request`_ from JSON-encoded `string`, either bytes or a string,
+           using `codec`. If `string` encodes a `Batch`_, return the list of Batch elements, each to
+           be validated with :meth:`validate`. Otherwise raise :class:`JsonRpcError`.'''
         try:
-            request = json.loads(string)
+            request = codec.decode(string)
         except (TypeError, ValueError):
             raise JsonRpcError.parse_error()
+        if isinstance(request, list):
+            if not request:
+                raise JsonRpcError.invalid_request()
+            return request
+        return cls.validate(request)
+    @classmethod
+    def validate(cls, value):
+        '''Return a `Request`_ formed from decoded `value`. Otherwise raise :class:`JsonRpcError`.'''
         try:
-            return cls().form(request)
+            return cls.instance().form(value)
         except ValueError:
             raise JsonRpcError.invalid_request()
 
 class TypeResponseObject(TypeStructuredDict):
-    '''A function for validating a `Response`_.'''
+    '''A function for validating a `Response`_.
+
+       A Response constructed by :meth:`result`, :meth:`error` or :meth:`async_` is validated,
+       unless `trusted` is set: a service which trusts its method implementations to report well
+       formed errors may set it to skip validation of the Responses it constructs itself (see
+       :attr:`Service.trusted`).
+    '''
     def __init__(self):
         TypeStructuredDict.__init__(self, mandatory={
             'jsonrpc': TypeVersion,
@@ -207,33 +430,36 @@ class TypeResponseObject(TypeStructuredDict):
             'metadata': TypeMetadata(),
         })
     @classmethod
-    def result(cls, id_, result):
-        '''Return a result `Response`_ for `id_` and `result`.'''
-        return cls().form({
+    def result(cls, id_, result, trusted=False):
+        '''Return a result `Response`_ for `id_` and `result`, validated unless `trusted`.'''
+        response = {
             'jsonrpc': '2.0',
             'id': id_,
             'result': result,
-        })
+        }
+        return response if trusted else cls.instance().form(response)
     @classmethod
-    def error(cls, id_, error):
-        '''Return an error `Response`_ for `id_` and `error`.'''
-        return cls().form({
+    def error(cls, id_, error, trusted=False):
+        '''Return an error `Response`_ for `id_` and `error`, validated unless `trusted`.'''
+        response = {
             'jsonrpc': '2.0',
             'id': id_,
             'error': error,
-        })
+        }
+        return response if trusted else cls.instance().form(response)
     @classmethod
-    def async_(cls, id_, async_):
+    def async_(cls, id_, async_, trusted=False):
         '''Return a `Response`_ for `id_` indicating that the `Request`_ has been invoked and the
-           result can be collected with `async_` handle.
+           result can be collected with `async_` handle, validated unless `trusted`.
         '''
-        return cls().form({
+        response = {
             'jsonrpc': '2.0',
             'id': id_,
             'metadata': {
                 'async': async_,
             },
-        })
+        }
+        return response if trusted else cls.instance().form(response)
 
 class TypeErrorObject(TypeStructuredDict):
     '''A function for validating a `Error`_.'''
@@ -265,11 +491,77 @@ class Service(object):
        list, or called by name, if the params were supplied as a dict. The return value of the
        function is ignored. If the function raises an :class:`Exception` then an `Error`_ will be
        returned.
+
+       Set a :attr:`codec` attribute, a :class:`inocybe_jsonrpc.codec.Codec`, to use a JSON encoder
+       other than the standard library :mod:`json` module.
+
+       Set a :attr:`trusted` attribute to skip validation of the Responses the service constructs,
+       if its method implementations are trusted to report well formed errors.
+
+       Set :attr:`handle_ttl` and :attr:`handle_max` attributes to bound the table of asynchronous
+       call handles (see :class:`inocybe_jsonrpc.handles.HandleTable`), so that handles which
+       clients never collect are evicted. The table is available as :attr:`handles`.
+
+       Set an :attr:`async_pool` attribute, an :class:`inocybe_jsonrpc.pool.Pool`, to run
+       asynchronous calls on a thread or process pool. The handle is then returned at once, while
+       the call runs on the pool. A call on a pool may report its result by returning it, rather
+       than by calling :meth:`result_async`, and must do so if run in another process (where the
+       function implementation and params must also be picklable).
+
+       Set a :attr:`wait_max` attribute to limit the number of seconds for which a client may wait
+       for an asynchronous call to complete (see :meth:`collect_async`). It is 0 by default, so a
+       client never waits: a wait blocks the thread handling the Request, so only set it where the
+       transport handles other Requests meanwhile, or the calls run on :attr:`async_pool`.
+
+       Set a :attr:`timeouts` attribute, mapping method names to the number of seconds within which
+       a call of that method must complete, and a :attr:`timeout_default` attribute for any other
+       method. A client may set an earlier deadline in a Request. A call is not invoked if its
+       deadline has passed by the time it would start. Set a :attr:`timeout_executor` attribute, a
+       :class:`concurrent.futures.Executor`, to run synchronous calls with a deadline on it, so that
+       a call still running at its deadline is abandoned and answered with a timeout `Error`_
+       (see :meth:`invoke_bounded`).
+
+       Set a :attr:`batch_executor` attribute, a :class:`concurrent.futures.Executor`, to invoke the
+       elements of a `Batch`_ concurrently. Otherwise the elements are invoked one after another.
+
+       The service records per-method metrics in :attr:`metrics`, an
+       :class:`inocybe_jsonrpc.metrics.Metrics`, which clients may query with 'rpc.stats'. Set
+       :attr:`metrics` to None to stop recording.
+
+       Set a :attr:`request_log` attribute, an :class:`inocybe_jsonrpc.requestlog.RequestLog`, to
+       log each call handled by :meth:`handle_bytes`.
+
+       A transport which sheds Requests when its queue is full sets an :attr:`admission` attribute,
+       an :class:`inocybe_jsonrpc.admission.Admission`, so that clients may query the queue depth
+       and the number of Requests shed with 'rpc.stats'.
+
+       A transport which is about to stop sets :attr:`draining`, after which every new call is
+       shed with a server busy `Error`_ (and every new notification dropped), while clients may
+       still collect asynchronous calls; it stops once :meth:`drained`.
     '''
     methods = {}
     methods_async = {}
+    codec = Codec
+    trusted = False
+    handle_ttl = None
+    handle_max = None
+    async_pool = None
+    wait_max = 0.0
+    timeouts = {}
+    timeout_default = None
+    timeout_executor = None
+    batch_executor = None
+    request_log = None
+    admission = None
+    draining = False
     def __init__(self):
-        self._active = {}
+        self._active = HandleTable(self.handle_ttl, self.handle_max)
+        self._reserved = {'rpc.stats': self.rpc_stats}
+        self.metrics = Metrics()
+    @property
+    def handles(self):
+        '''Return the :class:`inocybe_jsonrpc.handles.HandleTable` of asynchronous call handles.'''
+        return self._active
     def resolve_sync(self, method):
         '''Return a function implementing `method` as a synchronous call. If `method` is not
            supported with synchronous execution, return None.
@@ -288,120 +580,456 @@ class Service(object):
             return None
     def handle_request(self, string):
         '''Handle a JSON-encoded `Request`_ in `string`, calling the method implementation and
-           return a JSON-encoded `Response`_.
+           return a JSON-encoded `Response`_. If `string` encodes a `Batch`_, return a JSON-encoded
+           array of Responses, or None if there are no Responses to return.
+        '''
+        response = self.handle_bytes(string)
+        if response is None:
+            return None
+        return response.decode('utf-8')
+    def handle_bytes(self, data):
+        '''As :meth:`handle_request`, but return the `Response`_ as UTF-8 encoded bytes. A transport
+           should pass the frames it receives in `data` (bytes or a string) straight to this.
+        '''
+        (method, request, response, times) = self.dispatch_bytes(data)
+        encoded = None if response is None else self.encode_response(response)
+        self.report(method, request, response, data, encoded, times)
+        return encoded
+    def encode_response(self, response):
+        '''Return decoded `Response`_ `response` encoded with :attr:`codec`. If it cannot be
+           encoded (for instance, if a result holds a value which the codec does not support),
+           return an Internal `Error`_ for it instead, or for each element of a `Batch`_ which
+           cannot be encoded.
+        '''
+        try:
+            return self.codec.encode(response)
+        except ENCODE_ERRORS as exc:
+            if not isinstance(response, list):
+                return self.codec.encode(self.unencodable(response, exc))
+        return self.codec.encode([self._encodable(_) for _ in response])
+    def _encodable(self, response):
+        '''Return decoded `Response`_ `response` if it can be encoded, or an Internal `Error`_ for it
+           if not.
+        '''
+        try:
+            self.codec.encode(response)
+        except ENCODE_ERRORS as exc:
+            return self.unencodable(response, exc)
+        return response
+    def unencodable(self, response, exc):
+        '''Return an Internal `Error`_ in place of decoded `Response`_ `response`, which could not be
+           encoded, failing with `exc`.
+        '''
+        error = JsonRpcError.internal_error('failed to encode response, {}'.format(exc)).error
+        return TypeResponseObject.error(response.get('id'), error, self.trusted)
+    def handle_bytes_stream(self, data, size=CHUNK_SIZE):
+        '''As :meth:`handle_bytes`, but return an iterator over the `Response`_ as UTF-8 encoded
+           chunks of about `size` bytes, encoded as they are consumed (see
+           :meth:`inocybe_jsonrpc.codec.Codec.iterencode`), or None if there is no Response. A
+           transport may write each chunk as it is produced, so that the whole encoded Response is
+           never held in memory at once. If part of the Response cannot be encoded, then the
+           iterator generates an Internal `Error`_ in its place if no chunk has been generated yet,
+           or raises the codec's exception (see :data:`inocybe_jsonrpc.codec.ENCODE_ERRORS`).
+        '''
+        (method, request, response, times) = self.dispatch_bytes(data)
+        if response is None:
+            self.report(method, request, response, data, None, times)
+            return None
+        return self._stream(method, request, response, data, times, size)
+    def _stream(self, method, request, response, data, times, size):
+        '''Generate the chunks of encoded `response` for :meth:`handle_bytes_stream`, reporting the
+           call once all have been consumed (or the iterator is closed).
         '''
+        (first, total) = (None, 0)
         try:
-            request = TypeRequestObject.parse(string)
+            try:
+                for chunk in self.codec.iterencode(response, size):
+                    if first is None:
+                        first = chunk
+                    total += len(chunk)
+                    yield chunk
+            except ENCODE_ERRORS:
+                ### only an Error in place of the whole Response can be sent, if none of it has been
+                if first is not None:
+                    raise
+                first = self.encode_response(response)
+                total = len(first)
+                yield first
+        finally:
+            self.report(method, request, response, data, first, times, total)
+    def shed_bytes(self, data):
+        '''Return the encoded server busy `Error`_ for encoded `Request`_ `data` (bytes or a string),
+           without invoking it, as for :meth:`handle_bytes`. If `data` encodes a `Batch`_, return an
+           array with an Error for each element, or None if there are no Responses to return.
+        '''
+        error = JsonRpcError.server_busy().error
+        try:
+            request = TypeRequestObject.parse(data, self.codec)
         except JsonRpcError as exc:
-            response = TypeResponseObject.error(None, exc.error)
+            return self.codec.encode(TypeResponseObject.error(None, exc.error, self.trusted))
+        if isinstance(request, dict):
+            if 'id' not in request:
+                return None
+            return self.codec.encode(TypeResponseObject.error(request['id'], error, self.trusted))
+        responses = [
+            TypeResponseObject.error(_['id'] if isinstance(_, dict) else None, error, self.trusted)
+            for _ in request if not isinstance(_, dict) or 'id' in _
+        ]
+        return self.codec.encode(responses) if responses else None
+    def dispatch_bytes(self, data):
+        '''Parse and invoke encoded `Request`_ `data` (bytes or a string). Return a 4-tuple of the
+           method name under which to record the call (see :class:`inocybe_jsonrpc.metrics.Metrics`),
+           the decoded Request (None if it could not be decoded), the decoded `Response`_ (None if
+           there is none) and a 3-tuple of :func:`time.perf_counter` values taken at the start,
+           after parsing and after dispatch.
+        '''
+        start = perf_counter()
+        try:
+            request = TypeRequestObject.parse(data, self.codec)
+        except JsonRpcError as exc:
+            (method, request) = ('rpc.invalid', None)
+            response = TypeResponseObject.error(None, exc.error, self.trusted)
+            parsed = dispatched = perf_counter()
         else:
+            parsed = perf_counter()
+            method = request['method'] if isinstance(request, dict) else 'rpc.batch'
             response = self.invoke_request(request)
-        return json.dumps(response)
+            dispatched = perf_counter()
+            if isinstance(response, dict) and 'id' not in request:
+                ### a notification which was invoked as an asynchronous call
+                response = None
+        return (method, request, response, (start, parsed, dispatched))
+    def report(self, method, request, response, data, encoded, times, size=None):
+        '''Record in :attr:`metrics` and log to :attr:`request_log` a call of `method`, with decoded
+           `request` and `response`, encoded Request `data` and encoded Response `encoded` (None if
+           there is none), given the 3-tuple `times` from :meth:`dispatch_bytes`. If `encoded` is
+           only the first part of a Response, then `size` is the size of the whole.
+        '''
+        if size is None:
+            size = 0 if encoded is None else len(encoded)
+        if self.metrics is not None:
+            self.record(method, response, times + (perf_counter(),), (len(data), size))
+        if self.request_log is not None:
+            self.request_log.log(method, request, data, encoded, perf_counter() - times[0], size)
+    def record(self, method, response, times, sizes=None):
+        '''Record in :attr:`metrics` a call of `method` which returned decoded `Response`_
+           `response`. `times` is a 4-tuple of :func:`time.perf_counter` values taken at the start,
+           after parsing, after dispatch and after serializing, or a 2-tuple taken before and after
+           dispatch; `sizes` is a 2-tuple of the encoded Request and Response sizes.
+        '''
+        error = isinstance(response, dict) and 'error' in response
+        method = self.metrics_method(method)
+        if len(times) == 2:
+            self.metrics.record(method, times[1] - times[0], error)
+            return
+        (start, parsed, dispatched, serialized) = times
+        self.metrics.record(method, dispatched - parsed, error, parsed - start,
+                            serialized - dispatched, sizes)
+    def metrics_method(self, method):
+        '''Return the name under which to record a call of `method` in :attr:`metrics`: `method`
+           itself if the service implements it (see :meth:`resolve_sync` and
+           :meth:`resolve_async`) or it is reserved, otherwise 'rpc.unknown', so that a client
+           cannot grow the metrics without bound by calling made-up methods.
+        '''
+        if (method in self._reserved or method in ('rpc.batch', 'rpc.invalid') or
+                self.resolve_sync(method) is not None or self.resolve_async(method) is not None):
+            return method
+        return 'rpc.unknown'
     def invoke_request(self, request):
-        '''Invoke decoded `Request`_ in `request` and return a decoded `Response`_.'''
-        try:
-            id_ = request['id']
-        except KeyError:
-            id_ = None
+        '''Invoke decoded `Request`_ in `request` and return a decoded `Response`_. If `request` is a
+           list, then invoke it as a `Batch`_ (see :meth:`invoke_batch`). If `request` is a
+           notification without 'metadata', then invoke it with :meth:`invoke_notification` and
+           return None.
+        '''
+        if isinstance(request, list):
+            return self.invoke_batch(request)
         method = request['method']
         try:
             params = request['params']
         except KeyError:
             params = None
         try:
-            async_ = request['metadata']['async']
+            id_ = request['id']
+        except KeyError:
+            if 'metadata' not in request:
+                return self.invoke_notification(method, params)
+            id_ = None
+        try:
+            metadata = request['metadata']
         except KeyError:
-            async_ = False
+            (async_, wait, deadline) = (False, None, None)
+        else:
+            async_ = metadata.get('async', False)
+            wait = metadata.get('wait')
+            deadline = metadata.get('deadline')
         if async_ in self._active:
-            return self.collect_async(id_, async_)
+            return self.collect_async(id_, async_, wait, deadline)
+        deadline = self.deadline(method, deadline)
+        if deadline is not None:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return TypeResponseObject.error(id_, JsonRpcError.timeout().error, self.trusted)
+            if wait:
+                wait = min(wait, remaining)
+        if self.draining and method not in self._reserved:
+            return TypeResponseObject.error(id_, JsonRpcError.server_busy().error, self.trusted)
         elif async_:
             implementation = self.resolve_async(method)
             if implementation:
-                return self.invoke_async(id_, implementation, params, async_)
+                return self.invoke_async(id_, implementation, params, async_, method, wait,
+                                         deadline)
+        if method in self._reserved:
+            return self.invoke_sync(id_, self._reserved[method], params)
         implementation = self.resolve_sync(method)
         if implementation:
+            if deadline is not None:
+                return self.invoke_bounded(id_, implementation, params, deadline)
             return self.invoke_sync(id_, implementation, params)
         error = JsonRpcError.method_not_found().error
-        return TypeResponseObject.error(id_, error)
-    def invoke_async(self, id_, implementation, params, async_):
+        return TypeResponseObject.error(id_, error, self.trusted)
+    def deadline(self, method, deadline=None):
+        '''Return the time, in seconds since the epoch, by which a call of `method` must complete:
+           the earlier of the client's `deadline`, if not None, and the end of the timeout for
+           `method` (see :attr:`timeouts`) from now. If neither is set, return None.
+        '''
+        timeout = self.timeouts.get(method, self.timeout_default)
+        if timeout is not None:
+            expiry = time() + timeout
+            if deadline is None or expiry < deadline:
+                return expiry
+        return deadline
+    def invoke_bounded(self, id_, implementation, params, deadline):
+        '''Invoke synchronous method `implementation` with `params` for request `id_` (see
+           :meth:`invoke_sync`), on :attr:`timeout_executor` if set. If the call has not completed
+           by `deadline`, return a timeout `Error`_ and discard the call's Response: a call which
+           has not started is cancelled, but a running call runs on, occupying its worker, so
+           :attr:`timeout_executor` should have enough workers to spare for calls which hang.
+        '''
+        if self.timeout_executor is None:
+            return self.invoke_sync(id_, implementation, params)
+        future = self.timeout_executor.submit(self.invoke_sync, id_, implementation, params)
+        try:
+            return future.result(deadline - time())
+        except FutureTimeoutError:
+            future.cancel()
+            return TypeResponseObject.error(id_, JsonRpcError.timeout().error, self.trusted)
+    def invoke_batch(self, batch):
+        '''Invoke each element of decoded `Batch`_ in `batch` and return a list of decoded
+           `Response`_ values, in element order. A notification element is invoked but no Response
+           is included for it. If there are no Responses to return, return None. If
+           :attr:`batch_executor` is set, then invoke the elements concurrently.
+        '''
+        if not batch:
+            error = JsonRpcError.invalid_request().error
+            return TypeResponseObject.error(None, error, self.trusted)
+        if self.batch_executor is None:
+            responses = [self.invoke_element(_) for _ in batch]
+        else:
+            responses = list(self.batch_executor.map(self.invoke_element, batch))
+        responses = [_ for _ in responses if _ is not None]
+        return responses if responses else None
+    def invoke_element(self, element):
+        '''Validate and invoke a decoded `Batch`_ element in `element`. Return a decoded
+           `Response`_, or None if `element` is a notification.
+        '''
+        try:
+            request = TypeRequestObject.validate(element)
+        except JsonRpcError as exc:
+            return TypeResponseObject.error(None, exc.error, self.trusted)
+        if self.metrics is None:
+            response = self.invoke_request(request)
+        else:
+            start = perf_counter()
+            response = self.invoke_request(request)
+            self.record(request['method'], response, (start, perf_counter()))
+        if 'id' not in request:
+            return None
+        return response
+    def invoke_notification(self, method, params):
+        '''Invoke synchronous `method` with `params` for a notification. Return None: no
+           `Response`_ is built, and errors (including an unknown `method`) are discarded. While
+           :attr:`draining`, the notification is dropped without being invoked. If `method` has a
+           timeout (see :attr:`timeouts`), then the call is abandoned at its deadline as a
+           Request's would be (see :meth:`invoke_bounded`).
+        '''
+        if method in self._reserved or self.draining:
+            return None
+        implementation = self.resolve_sync(method)
+        if implementation is None:
+            return None
+        deadline = self.deadline(method)
+        if deadline is None or self.timeout_executor is None:
+            self.apply_notification(implementation, params)
+            return None
+        future = self.timeout_executor.submit(self.apply_notification, implementation, params)
+        try:
+            future.result(deadline - time())
+        except FutureTimeoutError:
+            future.cancel()
+        return None
+    @staticmethod
+    def apply_notification(implementation, params):
+        '''Call `implementation` with `params` for a notification, discarding any error.'''
+        check = params_check(implementation)
+        if check is not None and check(params) is not None:
+            return
+        try:
+            apply_params(implementation, params)
+        except Exception: # pylint: disable=broad-except
+            pass
+    def drained(self):
+        '''Return True if no asynchronous call is still running on :attr:`async_pool`. A draining
+           transport does not wait for anything else: not for calls which report when some later
+           call is made (which will not be, while draining), nor for clients to collect their
+           calls, which may have been abandoned.
+        '''
+        return self.async_pool is None or self.async_pool.idle()
+    def rpc_stats(self, reset=False):
+        '''Implement the 'rpc.stats' introspection method. Return a dict of the per-method
+           'methods' metrics (see :class:`inocybe_jsonrpc.metrics.Metrics`), the asynchronous call
+           'handles' counters, if :attr:`async_pool` is set, the per-method 'pool' counters and, if
+           :attr:`admission` is set, the 'admission' counters. If `reset` is true, then discard the
+           per-method metrics (and restart the admission counts) once returned.
+        '''
+        stats = {
+            'methods': {} if self.metrics is None else self.metrics.stats(),
+            'handles': self._active.stats(),
+        }
+        if self.async_pool is not None:
+            stats['pool'] = self.async_pool.stats()
+        if self.admission is not None:
+            stats['admission'] = self.admission.stats(reset)
+        if reset and self.metrics is not None:
+            self.metrics.reset()
+        return stats
+    def invoke_async(self, id_, implementation, params, async_, method=None, wait=None,
+                     deadline=None):
         '''Invoke asynchronous method `implementation` with `params` for request `id_`. Use `async_`
            as the asynchronous call handle, unless it is True, in which case allocate a new unique
            asynchronous call handle. Return a `Response`_ which includes the unique call handle in
            the metadata; the call handle is either `async_`, or a UUID4, if `async_` is True. If
-           the call immediately fails, return an `Error`_.
+           the call immediately fails, return an `Error`_. If :attr:`async_pool` is set, then
+           submit the call to the pool as a call of `method`, and return at once, unless `wait`
+           is set (see :meth:`collect_async`); if the call has not started on the pool by
+           `deadline`, then it reports a timeout Error instead. The handle keeps `deadline`, after
+           which the call is abandoned if it has not reported.
         '''
+        check = params_check(implementation, 1)
+        if check is not None:
+            message = check(params)
+            if message is not None:
+                error = JsonRpcError.invalid_params(message).error
+                return TypeResponseObject.error(id_, error, self.trusted)
         if async_ is True:
             async_ = str(uuid4())
-        self._active[async_] = {}
-        try:
-            if params is None:
-                implementation(async_)
-            elif isinstance(params, list):
-                implementation(async_, *params)
+        self.add_async(async_, deadline)
+        if self.async_pool is not None:
+            callback = partial(self._complete_pooled, async_, check is not None)
+            if deadline is None:
+                self.async_pool.submit(method, callback, apply_params, implementation, params,
+                                       async_)
             else:
-                implementation(async_, **params)
-        except TypeError as exc:
-            error = JsonRpcError.invalid_params(data=str(exc)).error
+                self.async_pool.submit(method, callback, apply_before, deadline, implementation,
+                                       params, async_)
+            if not wait:
+                return TypeResponseObject.async_(id_, async_, self.trusted)
+            return self.collect_async(id_, async_, wait)
+        try:
+            apply_params(implementation, params, async_)
+        except Exception as exc: # pylint: disable=broad-except
+            error = JsonRpcError.from_exception(exc, check is not None).error
             self.error_async(async_, error=error)
+        return self.collect_async(id_, async_, wait)
+    def add_async(self, async_, deadline=None):
+        '''Add the asynchronous call handle `async_`, which must report by `deadline` (if not None),
+           to the table of active calls.
+        '''
+        self._active.add(async_, deadline=deadline)
+    def _complete_pooled(self, async_, checked, future):
+        '''Report the outcome, in `future`, of the asynchronous call with handle `async_` run on
+           :attr:`async_pool`, the params of which were `checked` before the call.
+        '''
+        try:
+            result = future.result()
         except Exception as exc: # pylint: disable=broad-except
-            self.error_async(async_, message=str(exc))
-        return self.collect_async(id_, async_)
+            self.error_async(async_, error=JsonRpcError.from_exception(exc, checked).error)
+        else:
+            if result is not None and not self._active.reported(async_):
+                self.result_async(async_, result)
     def result_async(self, async_, result):
-        '''The asynchronous call with handle `async_` is reporting `result`.'''
-        self._active[async_]['result'] = result
+        '''The asynchronous call with handle `async_` is reporting `result`. If the handle has been
+           evicted, `result` is discarded.
+        '''
+        self._active.report(async_, 'result', result)
     def error_async(self, async_, error=None, message=None, data=None):
         '''The asynchronous call with handle `async_` is reporting an error either as `error`, or as
-           `message` with optional `data`.
+           `message` with optional `data`. If the handle has been evicted, the error is discarded.
         '''
         if not error:
             error = JsonRpcError.internal_error(message, data).error
-        self._active[async_]['error'] = error
-    def collect_async(self, id_, async_):
+        self._active.report(async_, 'error', error)
+    def collect_async(self, id_, async_, wait=None, deadline=None):
         '''If the asynchronous call with handle `async_` has reported a result, then complete the
            call by returning a `Response`_. If the asynchronous call has reported an error, then
            complete the call by returning an `Error`_. Otherwise, return a `Response`_ which
            includes `async_` as the unique call handle in the metadata, indicating that the call
-           is still running.
+           is still running. If `wait` is set, first wait up to `wait` seconds (but no more than
+           :attr:`wait_max`) for the call to report.
+
+           If the call has not reported by its deadline (see :meth:`collect_deadline`, given the
+           client's `deadline` for this Request), then the handle is discarded and a timeout
+           `Error`_ returned: the call is abandoned, and any report it makes later is discarded.
+
+           Note that waiting blocks the caller: a call can only report while its caller waits if
+           it runs on :attr:`async_pool`, or is reported by another thread. A transport handling
+           one Request at a time can do nothing else while it waits, so cannot handle the Request
+           which would report the call.
         '''
-        ### if error, report error
-        try:
-            error_ = self._active[async_]['error']
-        except KeyError:
-            pass
-        else:
-            del self._active[async_]
-            return TypeResponseObject.error(id_, error_)
-        ### if result, report result
-        try:
-            result = self._active[async_]['result']
-        except KeyError:
-            pass
-        else:
-            del self._active[async_]
-            return TypeResponseObject.result(id_, result)
-        ### no error or result
-        return TypeResponseObject.async_(id_, async_)
-    @staticmethod
-    def invoke_sync(id_, implementation, params):
+        expiry = self.collect_deadline(async_, deadline)
+        if wait and expiry is not None:
+            wait = min(wait, expiry - time())
+        if wait and wait > 0:
+            self._active.wait(async_, min(wait, self.wait_max))
+        return self.collected(id_, async_, expiry)
+    def collect_deadline(self, async_, deadline=None):
+        '''Return the time, in seconds since the epoch, by which the asynchronous call with handle
+           `async_` must report: the earlier of the deadline set when it was invoked (see
+           :meth:`deadline`) and the client's `deadline`, if not None. If neither is set, return
+           None.
+        '''
+        expiry = self._active.deadline(async_)
+        if deadline is not None and (expiry is None or deadline < expiry):
+            return deadline
+        return expiry
+    def collected(self, id_, async_, expiry):
+        '''Collect the asynchronous call with handle `async_` for request `id_` without waiting, as
+           :meth:`collect_async` does, given its deadline `expiry` (see :meth:`collect_deadline`).
+        '''
+        collected = self._active.collect(async_)
+        if collected is None:
+            if expiry is not None and expiry <= time():
+                self._active.discard(async_)
+                return TypeResponseObject.error(id_, JsonRpcError.timeout().error, self.trusted)
+            return TypeResponseObject.async_(id_, async_, self.trusted)
+        (key, value) = collected
+        if key == 'error':
+            return TypeResponseObject.error(id_, value, self.trusted)
+        return TypeResponseObject.result(id_, value, self.trusted)
+    def invoke_sync(self, id_, implementation, params):
         '''Invoke synchronous method `implementation` with `params` for request `id_`. Return a
            decoded `Response`_ communicating the return result of `implementation`. If the call
-           fails, return an `Error`_.
+           fails, return an `Error`_. The `params` are checked against the signature of
+           `implementation` before the call (see :func:`params_check`).
         '''
+        check = params_check(implementation)
+        if check is not None:
+            message = check(params)
+            if message is not None:
+                error = JsonRpcError.invalid_params(message).error
+                return TypeResponseObject.error(id_, error, self.trusted)
         try:
-            if params is None:
-                result = implementation()
-            elif isinstance(params, list):
-                result = implementation(*params)
-            else:
-                result = implementation(**params)
-        except TypeError as exc:
-            error = JsonRpcError.invalid_params(data=str(exc)).error
-            return TypeResponseObject.error(id_, error)
-        except NotImplementedError:
-            error = JsonRpcError.internal_error('method not supported in this service').error
-            return TypeResponseObject.error(id_, error)
+            result = apply_params(implementation, params)
         except Exception as exc: # pylint: disable=broad-except
-            error = JsonRpcError.internal_error(str(exc)).error
-            return TypeResponseObject.error(id_, error)
-        else:
-            return TypeResponseObject.result(id_, result)
+            error = JsonRpcError.from_exception(exc, check is not None).error
+            return TypeResponseObject.error(id_, error, self.trusted)
+        return TypeResponseObject.result(id_, result, self.trusted)
@@ -22,7 +22,11 @@
 from inocybe_jsonrpc.jsonrpc import Service as BaseService
 
 class Service(BaseService):
-    '''A `JSON-RPC 2.0`_ asynchronous key/value store service.'''
+    '''A `JSON-RPC 2.0`_ asynchronous key/value store service.
+
+       A 'get' of a key with no value watches the key until it is set, unless its handle is evicted
+       first (see :class:`inocybe_jsonrpc.handles.HandleTable`), in which case the watch is dropped.
+    '''
     def __init__(self):
         super().__init__()
         self.methods = {
@@ -33,17 +37,20 @@ class Service(BaseService):
             'get': self.async_get,
         }
         self._store = {}
+        ### key -> list of handles watching it, and handle -> key watched
         self._watch = {}
+        self._watching = {}
+        self.handles.on_evict = self._unwatch
     def sync_set(self, key, val):
         '''Set `val` at `key`.'''
         self._store[key] = val
         try:
-            handles = self._watch[key]
-            del self._watch[key]
+            handles = self._watch.pop(key)
         except KeyError:
             pass
         else:
             for async_ in handles:
+                del self._watching[async_]
                 self.result_async(async_, val)
     def sync_del(self, key):
         '''Delete any value at `key`.'''
@@ -56,9 +63,17 @@ class Service(BaseService):
         try:
             val = self._store[key]
         except KeyError:
-            try:
-                self._watch[key].append(async_)
-            except KeyError:
-                self._watch[key] = [async_]
+            self._watch.setdefault(key, []).append(async_)
+            self._watching[async_] = key
         else:
             self.result_async(async_, val)
+    def _unwatch(self, async_):
+        '''Drop the watch, if any, of the evicted handle `async_`.'''
+        try:
+            key = self._watching.pop(async_)
+        except KeyError:
+            return
+        handles = self._watch[key]
+        handles.remove(async_)
+        if not handles:
+            del self._watch[key]
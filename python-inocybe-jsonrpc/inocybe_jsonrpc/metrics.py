@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''Per-method counters and latency histograms for a JSON-RPC 2.0 service.'''
+
+from math import (frexp, ldexp)
+from threading import Lock
+
+class Histogram(object):
+    '''A histogram of latencies, in log-linear buckets of microseconds.
+
+       Each power of two is split into :attr:`SUB` buckets, so a quantile is accurate to within
+       100 / :attr:`SUB` percent, and adding a latency costs a few arithmetic operations. Latencies
+       below a microsecond share the first bucket, and those above :attr:`MAX_EXPONENT` powers of
+       two share the last. The histogram is not safe to use from multiple threads without a lock.
+    '''
+    SUB = 16
+    MAX_EXPONENT = 40
+    def __init__(self):
+        self._buckets = [0] * ((self.MAX_EXPONENT + 1) * self.SUB)
+        self.total = 0.0
+        self.max = 0.0
+    def add(self, seconds):
+        '''Add a latency of `seconds`.'''
+        micros = seconds * 1e6
+        (mantissa, exponent) = frexp(micros)
+        if exponent < 1:
+            index = 0
+        elif exponent > self.MAX_EXPONENT:
+            index = -1
+        else:
+            index = exponent * self.SUB + int(mantissa * 2 * self.SUB) - self.SUB
+        self._buckets[index] += 1
+        self.total += micros
+        if micros > self.max:
+            self.max = micros
+    @property
+    def count(self):
+        '''The number of latencies added.'''
+        return sum(self._buckets)
+    def quantile(self, fraction):
+        '''Return the latency, in microseconds, below which `fraction` of latencies fall.'''
+        rank = fraction * self.count
+        seen = 0
+        for (index, count) in enumerate(self._buckets):
+            seen += count
+            if count and seen >= rank:
+                (exponent, sub) = divmod(index, self.SUB)
+                return min(ldexp(0.5 + (sub + 1) / (2.0 * self.SUB), exponent), self.max)
+        return self.max
+    def stats(self):
+        '''Return a dict of the 'count', 'mean', 'max', 'p50', 'p99' and 'p999' latencies, in
+           microseconds.
+        '''
+        count = self.count
+        if not count:
+            return {'count': 0}
+        return {
+            'count': count,
+            'mean': round(self.total / count, 1),
+            'max': round(self.max, 1),
+            'p50': round(self.quantile(0.5), 1),
+            'p99': round(self.quantile(0.99), 1),
+            'p999': round(self.quantile(0.999), 1),
+        }
+
+class MethodMetrics(object): ### pylint: disable=too-few-public-methods
+    '''The counters and latency histograms for one method.'''
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.parse = Histogram()
+        self.dispatch = Histogram()
+        self.serialize = Histogram()
+    def stats(self):
+        '''Return a dict of the counters and the latency statistics of each stage.'''
+        stats = {
+            'calls': self.calls,
+            'errors': self.errors,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+        }
+        for stage in ('parse', 'dispatch', 'serialize'):
+            histogram = getattr(self, stage)
+            if histogram.total:
+                stats[stage] = histogram.stats()
+        return stats
+
+class Metrics(object):
+    '''Per-method counters and latency histograms.
+
+       For each method, count the calls and the calls which returned an `Error`_, total the sizes
+       of the encoded Requests and Responses, and keep a :class:`Histogram` of the latency of each
+       stage of handling a call: 'parse' (decoding and validating the Request), 'dispatch'
+       (invoking the method) and 'serialize' (encoding the Response).
+
+       Calls are recorded under the method named in the Request. A `Batch`_ is recorded as a whole
+       under 'rpc.batch' (and each element under its own method, without parse or serialize
+       latencies), and a Request which cannot be parsed is recorded under 'rpc.invalid'. A service
+       records a call of a method it does not implement under 'rpc.unknown' (see
+       :meth:`inocybe_jsonrpc.jsonrpc.Service.metrics_method`). These names are reserved by
+       JSON-RPC 2.0, so never clash with a method.
+
+       The metrics are safe to update from multiple threads.
+
+       .. _Error: http://www.jsonrpc.org/specification#error_object
+       .. _Batch: http://www.jsonrpc.org/specification#batch
+    '''
+    def __init__(self):
+        self._methods = {}
+        self._lock = Lock()
+    def record(self, method, dispatch, error, parse=None, serialize=None, sizes=None):
+        '''Record a call of `method`, with the latency in seconds of each stage, whether or not it
+           returned an `Error`_ and the 2-tuple `sizes` of its encoded Request and Response.
+        '''
+        with self._lock:
+            try:
+                metrics = self._methods[method]
+            except KeyError:
+                metrics = self._methods[method] = MethodMetrics()
+            metrics.calls += 1
+            if error:
+                metrics.errors += 1
+            metrics.dispatch.add(dispatch)
+            if parse is not None:
+                metrics.parse.add(parse)
+            if serialize is not None:
+                metrics.serialize.add(serialize)
+            if sizes is not None:
+                metrics.request_bytes += sizes[0]
+                metrics.response_bytes += sizes[1]
+    def reset(self):
+        '''Discard all the metrics recorded so far.'''
+        with self._lock:
+            self._methods = {}
+    def stats(self):
+        '''Return a dict mapping each method called to a dict of its metrics.'''
+        with self._lock:
+            return dict((method, _.stats()) for (method, _) in self._methods.items())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''Command line options for tuning a JSON-RPC 2.0 service, shared by the transport tools.
+
+   Where many services are hosted in one process, the worker pools sized by the options are shared
+   by all of them (see :func:`create_executors`).
+'''
+
+import json
+import logging
+from argparse import ArgumentTypeError
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
+
+from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc.aio import Service as AsyncService
+from inocybe_jsonrpc.codec import (CODECS, codec)
+from inocybe_jsonrpc.pool import Pool
+from inocybe_jsonrpc.requestlog import RequestLog
+
+def add_arguments(aparser):
+    '''Add the service tuning options to :class:`argparse.ArgumentParser` `aparser`.'''
+    group = aparser.add_argument_group('service options')
+    group.add_argument('-j', '--codec', default='json', choices=sorted(CODECS), help=' '.join((
+        'the JSON codec with which to decode requests and encode responses',
+    )))
+    group.add_argument('--trusted', action='store_true', help=' '.join((
+        'skip validation of the responses constructed by the service',
+        '(the service method implementations must report well formed errors)',
+    )))
+    group.add_argument('-w', '--batch-workers', default=0, type=int, help=' '.join((
+        'the number of threads with which to invoke the elements of a batch concurrently,',
+        'shared by all the services in the process',
+        '(by default elements are invoked one after another)',
+    )))
+    group.add_argument('--async-workers', default=0, type=int, help=' '.join((
+        'the number of workers on which to run asynchronous calls,',
+        'shared by all the services in the process',
+        '(by default asynchronous calls run to completion before the handle is returned)',
+    )))
+    group.add_argument('--async-processes', action='store_true', help=' '.join((
+        'run asynchronous calls on a pool of worker processes, rather than threads',
+    )))
+    group.add_argument('--async-limit', action='append', default=[], type=Pool.limit_arg,
+                       metavar='METHOD=N', help=' '.join((
+                           'the maximum number of asynchronous calls of METHOD to run at once,',
+                           'across all the services in the process (may be repeated)',
+                       )))
+    group.add_argument('--handle-ttl', type=float, help=' '.join((
+        'the number of seconds after which an asynchronous call handle which a client has not',
+        'polled is evicted',
+    )))
+    group.add_argument('--handle-max', type=int, help=' '.join((
+        'the maximum number of asynchronous call handles to keep,',
+        'evicting the least recently polled first',
+    )))
+    group.add_argument('--no-metrics', action='store_true', help=' '.join((
+        'do not record per-method metrics (reported by the rpc.stats method)',
+    )))
+    group.add_argument('--wait-max', type=float, help=' '.join((
+        'the maximum number of seconds for which a client may wait for an asynchronous call',
+        'to complete before a response is sent (by default 30 for an asyncio service, otherwise',
+        '0: a wait blocks the thread handling the request, so only allow it where other',
+        'requests are handled meanwhile, or with --async-workers)',
+    )))
+    group.add_argument('--timeout', action='append', default=[], type=timeout_arg,
+                       metavar='METHOD=SECONDS', help=' '.join((
+                           'the number of seconds within which a call of METHOD must complete',
+                           '(may be repeated)',
+                       )))
+    group.add_argument('--timeout-default', type=float, metavar='SECONDS', help=' '.join((
+        'the number of seconds within which a call of any other method must complete',
+    )))
+    group.add_argument('--timeout-workers', default=0, type=int, help=' '.join((
+        'the number of threads on which to run synchronous calls with a deadline, so that a call',
+        'still running at its deadline is abandoned, shared by all the services in the process',
+        '(by default such a call runs to completion, and only calls whose deadline has passed',
+        'before they start are dropped)',
+    )))
+    group.add_argument('--log-level', default='info', choices=('debug', 'info', 'warning'),
+                       help=' '.join((
+                           'the level at which to log requests: info logs the method, id, sizes',
+                           'and duration of each request, debug also logs the payloads',
+                       )))
+    group.add_argument('--log-payload-max', default=1024, type=int, help=' '.join((
+        'the number of bytes of each payload to log at debug level',
+    )))
+    group.add_argument('--log-sample', default=1, type=int, metavar='N', help=' '.join((
+        'log only one in every N requests',
+    )))
+
+def timeout_arg(string):
+    '''Return a 2-tuple (method, seconds) from command line arg `string` of the form
+       METHOD=SECONDS. If `string` is not of this form, raise :class:`ArgumentTypeError`.
+    '''
+    (method, _, seconds) = string.rpartition('=')
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        seconds = 0.0
+    if not method or not seconds > 0:
+        raise ArgumentTypeError('bad timeout (expected METHOD=SECONDS, SECONDS > 0): ' + string)
+    return (method, seconds)
+
+def create_executors(args):
+    '''Return a dict of the worker pools sized by the dict of parsed command line `args`, to be
+       shared by all the services configured from them (see :func:`configure`): the
+       'batch_executor', 'async_pool' and 'timeout_executor' of a service, each None if not
+       wanted.
+    '''
+    executors = {'batch_executor': None, 'async_pool': None, 'timeout_executor': None}
+    if args['batch_workers'] > 0:
+        executors['batch_executor'] = ThreadPoolExecutor(args['batch_workers'])
+    if args['async_workers'] > 0:
+        executor = ProcessPoolExecutor if args['async_processes'] else ThreadPoolExecutor
+        executors['async_pool'] = Pool(executor(args['async_workers']), args['async_limit'])
+    if args['timeout_workers'] > 0:
+        executors['timeout_executor'] = ThreadPoolExecutor(args['timeout_workers'])
+    return executors
+
+def configure(service, args, executors=None):
+    '''Configure `service` from the dict of parsed command line `args`, with the worker pools in
+       dict `executors` (see :func:`create_executors`), or pools of its own if None.
+    '''
+    if executors is None:
+        executors = create_executors(args)
+    service.codec = codec(args['codec'])
+    service.trusted = args['trusted']
+    for (name, executor) in executors.items():
+        if executor is not None:
+            setattr(service, name, executor)
+    service.handles.ttl = args['handle_ttl']
+    service.handles.maxlen = args['handle_max']
+    if args['wait_max'] is not None:
+        service.wait_max = args['wait_max']
+    service.timeouts = dict(args['timeout'])
+    service.timeout_default = args['timeout_default']
+    if args['no_metrics']:
+        service.metrics = None
+    RequestLog.logger.setLevel(args['log_level'].upper())
+    service.request_log = RequestLog(args['log_payload_max'], args['log_sample'])
+
+def read_services(filename, location):
+    '''Return the services to host, read from JSON config file `filename`, as a list of
+       (location, service, args) tuples.
+
+       The file holds a list of objects, one per service, each with a `location` member (the
+       address at which to present the service, such as 'path' or 'uri'), a 'service' member
+       naming the service as on the command line (a Python class implementing
+       :class:`inocybe_jsonrpc.jsonrpc.Service`, or a Python module with a Service attribute) and
+       an optional 'args' member, a list of string args to create the service instance with. For
+       example::
+
+           [
+               {"uri": "zmq://0.0.0.0:4569/", "service": "inocybe_openswitch.openswitch_data"},
+               {"uri": "zmq://0.0.0.0:4568/", "service": "inocybe_yang.library", "args": ["models"]}
+           ]
+
+       Raise :exc:`ValueError` if the file is malformed.
+    '''
+    try:
+        with open(filename) as config:
+            entries = json.load(config)
+    except (IOError, ValueError) as exc:
+        raise ValueError('failed to read {}, {}'.format(filename, exc))
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('{} must hold a non-empty list of services'.format(filename))
+    services = []
+    for (index, entry) in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise TypeError('a service must be an object')
+            args = entry.get('args', [])
+            if not isinstance(args, list):
+                raise TypeError('args must be a list')
+            services.append((
+                entry[location],
+                ArgModuleAttribute('Service')(entry['service']),
+                [str(arg) for arg in args],
+            ))
+        except KeyError as exc:
+            raise ValueError('bad service {} in {}, missing {}'.format(index, filename, exc))
+        except (TypeError, ArgumentTypeError) as exc:
+            raise ValueError('bad service {} in {}, {}'.format(index, filename, exc))
+    return services
+
+def create_services(aparser, args, location, convert, asyncio=True):
+    '''Return a list of (location, service) pairs, each service created and configured from the
+       dict of parsed command line `args`: those read from the 'config' file, if given, otherwise
+       the one given by the `location`, 'service' and 'args' args, all sharing one set of worker
+       pools. Each location read from the file is checked with `convert`, as the `location` arg
+       is. Unless `asyncio` is true, refuse an :class:`inocybe_jsonrpc.aio.Service`, which a
+       synchronous transport cannot drive. Report any error with
+       :class:`argparse.ArgumentParser` `aparser`.
+    '''
+    if args['config'] is not None:
+        if args[location] is not None:
+            aparser.error('specify either --config or {} and service, not both'.format(location))
+        try:
+            services = [(convert(at), factory, factory_args)
+                        for (at, factory, factory_args) in read_services(args['config'], location)]
+        except (ValueError, ArgumentTypeError) as exc:
+            aparser.error(str(exc))
+    elif args[location] is None or args['service'] is None:
+        aparser.error('specify either --config or {} and service'.format(location))
+    else:
+        services = [(args[location], args['service'], args['args'])]
+    (created, executors) = ([], create_executors(args))
+    for (at, factory, factory_args) in services:
+        try:
+            service = factory(*factory_args)
+        except TypeError as exc:
+            aparser.error('failed to create service instance at {}, {}'.format(at, exc))
+        if not asyncio and isinstance(service, AsyncService):
+            aparser.error('{} at {} is an asyncio service, which this transport cannot run'.format(
+                service.__class__.__name__, at
+            ))
+        configure(service, args, executors)
+        created.append((at, service))
+    return created
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A worker pool for running asynchronous method calls.'''
+
+from argparse import ArgumentTypeError
+from collections import deque
+from functools import partial
+from threading import Lock
+
+class Pool(object):
+    '''Run method calls on a :class:`concurrent.futures.Executor`, either a thread pool or a
+       process pool, limiting the number of calls of each method which run at once.
+
+       `limits` maps method names to the maximum number of calls of that method to run at once.
+       A call beyond the limit waits, in order, for a running call of the same method to complete.
+       Calls of a method without a limit are only limited by the executor.
+    '''
+    def __init__(self, executor, limits=None):
+        self.executor = executor
+        self.limits = dict(limits or {})
+        self._running = {}
+        self._pending = {}
+        self._lock = Lock()
+    def submit(self, method, callback, function, *args):
+        '''Call `function` with `args` on the executor, as a call of `method`. When the call
+           completes, call `callback` with its :class:`concurrent.futures.Future`.
+        '''
+        limit = self.limits.get(method)
+        with self._lock:
+            running = self._running.get(method, 0)
+            if limit is not None and running >= limit:
+                self._pending.setdefault(method, deque()).append((callback, function, args))
+                return
+            self._running[method] = running + 1
+        self._start(method, callback, function, args)
+    def _start(self, method, callback, function, args):
+        '''Start a call of `method` on the executor.'''
+        future = self.executor.submit(function, *args)
+        future.add_done_callback(partial(self._done, method, callback))
+    def _done(self, method, callback, future):
+        '''Complete a call of `method` and start the next pending call of `method`, if any.'''
+        try:
+            callback(future)
+        finally:
+            with self._lock:
+                pending = self._pending.get(method)
+                if pending:
+                    next_ = pending.popleft()
+                    if not pending:
+                        del self._pending[method]
+                else:
+                    next_ = None
+                    self._running[method] -= 1
+                    if not self._running[method]:
+                        del self._running[method]
+            if next_ is not None:
+                self._start(method, *next_)
+    def idle(self):
+        '''Return True if no call is running or pending.'''
+        with self._lock:
+            return not self._running and not self._pending
+    def stats(self):
+        '''Return a dict mapping each method with calls 'running' or 'pending' to the count of
+           each.
+        '''
+        with self._lock:
+            return dict((method, {
+                'running': self._running.get(method, 0),
+                'pending': len(self._pending.get(method, ())),
+            }) for method in frozenset(self._running) | frozenset(self._pending))
+    @staticmethod
+    def limit_arg(string):
+        '''Return a 2-tuple (method, limit) from command line arg `string` of the form METHOD=N.
+           If `string` is not of this form, raise :class:`ArgumentTypeError`.
+        '''
+        (method, _, limit) = string.rpartition('=')
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if not method or limit < 1:
+            raise ArgumentTypeError('bad limit (expected METHOD=N, N > 0): ' + string)
+        return (method, limit)
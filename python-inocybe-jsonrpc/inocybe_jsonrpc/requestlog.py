@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''Per-request logging for a JSON-RPC 2.0 service.'''
+
+import logging
+from itertools import count
+
+class RequestLog(object):
+    '''Log a record of each call handled by a service to :attr:`logger`.
+
+       At INFO, one record is logged per call, with the method, id, Request and Response sizes in
+       bytes and the duration in milliseconds, both in the message and as the 'method', 'id',
+       'request_bytes', 'response_bytes' and 'duration_ms' attributes of the record. At DEBUG, the
+       Request and Response payloads are also logged, each truncated to `payload_max` bytes.
+
+       If `sample` is greater than 1, then only one in every `sample` calls is logged.
+
+       Nothing is formatted unless the record is to be logged, so leaving a :class:`RequestLog`
+       in place costs little when :attr:`logger` is set above INFO.
+    '''
+    logger = logging.getLogger('inocybe_jsonrpc.requests')
+    def __init__(self, payload_max=1024, sample=1):
+        self.payload_max = payload_max
+        self.sample = sample
+        self._count = count()
+    def log(self, method, request, data, encoded, duration, size=None):
+        '''Log a call of `method`, from decoded `request` (None if it could not be decoded) and
+           encoded Request `data`, with encoded Response `encoded` (None if there is none), which
+           took `duration` seconds. If `encoded` is only the first part of a streamed Response,
+           then `size` is the size of the whole.
+        '''
+        logger = self.logger
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        if self.sample > 1 and next(self._count) % self.sample:
+            return
+        id_ = request.get('id') if isinstance(request, dict) else None
+        if size is None:
+            size = 0 if encoded is None else len(encoded)
+        duration = round(duration * 1e3, 3)
+        logger.info('%s id=%s in=%d out=%d %.3fms', method, id_, len(data), size, duration, extra={
+            'method': method,
+            'id': id_,
+            'request_bytes': len(data),
+            'response_bytes': size,
+            'duration_ms': duration,
+        })
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('> %s', self.truncate(data))
+            if encoded is not None:
+                logger.debug('< %s', self.truncate(encoded))
+    def truncate(self, payload):
+        '''Return `payload`, bytes or a string, as a string of at most :attr:`payload_max` bytes,
+           noting the total size if truncated.
+        '''
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if len(payload) <= self.payload_max:
+            return payload.decode('utf-8', 'replace')
+        return '{}... ({} bytes)'.format(
+            payload[:self.payload_max].decode('utf-8', 'replace'), len(payload)
+        )
@@ -0,0 +1,41 @@
+'''Test cases for inocybe_jsonrpc.admission.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_true
+
+from inocybe_jsonrpc.admission import Admission
+from inocybe_jsonrpc.math import Service
+
+def test_admit():
+    '''Test inocybe_jsonrpc.admission.Admission sheds beyond the queue bound'''
+    admission = Admission(2)
+    assert_true(admission.admit())
+    assert_true(admission.admit())
+    assert_false(admission.admit())
+    admission.start()
+    assert_true(admission.admit())
+    assert_false(admission.admit())
+    assert_equal(admission.stats(), {'queued': 2, 'queue_max': 2, 'peak': 2, 'shed': 2})
+
+def test_rpc_stats():
+    '''Test inocybe_jsonrpc.jsonrpc.Service reports admission counters with 'rpc.stats\''''
+    service = Service()
+    service.admission = Admission(0)
+    assert_false(service.admission.admit())
+    stats = service.rpc_stats(reset=True)['admission']
+    assert_equal(stats, {'queued': 0, 'queue_max': 0, 'peak': 0, 'shed': 1})
+    assert_equal(service.rpc_stats()['admission']['shed'], 0)
@@ -0,0 +1,195 @@
+'''Test cases for inocybe_jsonrpc.aio.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import asyncio
+from time import monotonic
+
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_less
+from nose.tools import assert_true
+from nose.tools import raises
+
+from inocybe_jsonrpc import aio
+from inocybe_jsonrpc import keyval
+
+class SleepService(aio.Service):
+    '''A service with coroutine method implementations.'''
+    def __init__(self):
+        aio.Service.__init__(self)
+        self.methods = {'sleep': self.sleep, 'fail': self.fail}
+        self.methods_async = {'sleep': self.sleep_async}
+    @staticmethod
+    async def sleep(seconds):
+        '''Sleep for `seconds`, then return them.'''
+        await asyncio.sleep(seconds)
+        return seconds
+    @staticmethod
+    async def fail():
+        '''Fail.'''
+        await asyncio.sleep(0)
+        raise RuntimeError('failed')
+    async def sleep_async(self, async_, seconds):
+        '''Sleep for `seconds`, then report them.'''
+        await asyncio.sleep(seconds)
+        self.result_async(async_, seconds)
+
+class KeyvalService(aio.Service, keyval.Service):
+    '''The key/value store service, under asyncio.'''
+
+def request(id_, method, params=None, async_=None):
+    '''Return a decoded Request.'''
+    req = {'jsonrpc': '2.0', 'id': id_, 'method': method}
+    if params is not None:
+        req['params'] = params
+    if async_ is not None:
+        req['metadata'] = {'async': async_}
+    return req
+
+def test_concurrent():
+    '''Test inocybe_jsonrpc.aio.Service overlaps coroutine calls'''
+    service = SleepService()
+    async def run():
+        '''Make many concurrent calls.'''
+        return await asyncio.gather(*(
+            service.invoke_request_async(request(_, 'sleep', [0.2])) for _ in range(20)
+        ))
+    start = monotonic()
+    responses = asyncio.run(run())
+    assert_less(monotonic() - start, 1.0)
+    assert_equal(responses, [{'jsonrpc': '2.0', 'id': _, 'result': 0.2} for _ in range(20)])
+
+def test_error():
+    '''Test inocybe_jsonrpc.aio.Service reports a coroutine exception as an Error'''
+    response = asyncio.run(SleepService().handle_request_async(
+        '{"jsonrpc": "2.0", "id": 1, "method": "fail"}'
+    ))
+    assert_equal(response, (
+        '{"jsonrpc": "2.0", "id": 1, "error": {"code": -32603, "message": "Internal error: failed"}}'
+    ))
+
+def test_batch():
+    '''Test inocybe_jsonrpc.aio.Service invokes a Batch concurrently, omitting notifications'''
+    service = SleepService()
+    batch = [request(_, 'sleep', [0.2]) for _ in range(10)]
+    batch.append({'jsonrpc': '2.0', 'method': 'sleep', 'params': [0.2]})
+    start = monotonic()
+    responses = asyncio.run(service.invoke_request_async(batch))
+    assert_less(monotonic() - start, 1.0)
+    assert_equal(responses, [{'jsonrpc': '2.0', 'id': _, 'result': 0.2} for _ in range(10)])
+
+def test_async_coroutine():
+    '''Test inocybe_jsonrpc.aio.Service runs an asynchronous coroutine call as a task'''
+    service = SleepService()
+    async def run():
+        '''Invoke, wait for and collect an asynchronous call.'''
+        response = await service.invoke_request_async(request(1, 'sleep', [0.1], 'foo'))
+        assert_equal(response['metadata'], {'async': 'foo'})
+        assert_false(await service.wait_async('foo', 0.01))
+        assert_true(await service.wait_async('foo', 1))
+        return await service.invoke_request_async(request(2, 'sleep', [0.1], 'foo'))
+    assert_equal(asyncio.run(run()), {'jsonrpc': '2.0', 'id': 2, 'result': 0.1})
+
+def test_keyval():
+    '''Test inocybe_jsonrpc.aio.Service completes a wait from a synchronous method'''
+    service = KeyvalService()
+    async def run():
+        '''Watch a key, then set it.'''
+        await service.invoke_request_async(request(1, 'get', ['key'], 'foo'))
+        waiter = asyncio.ensure_future(service.wait_async('foo'))
+        await asyncio.sleep(0.01)
+        assert_false(waiter.done())
+        await service.invoke_request_async(request(2, 'set', ['key', 'val']))
+        assert_true(await waiter)
+        return await service.invoke_request_async(request(3, 'get', ['key'], 'foo'))
+    assert_equal(asyncio.run(run()), {'jsonrpc': '2.0', 'id': 3, 'result': 'val'})
+
+def test_wait():
+    '''Test inocybe_jsonrpc.aio.Service long-polls without blocking the event loop'''
+    service = KeyvalService()
+    async def run():
+        '''Watch a key, long-poll it, then set it.'''
+        await service.invoke_request_async(request(1, 'get', ['key'], 'foo'))
+        poll = request(2, 'get', ['key'], 'foo')
+        poll['metadata']['wait'] = 5
+        poller = asyncio.ensure_future(service.invoke_request_async(poll))
+        await asyncio.sleep(0.01)
+        assert_false(poller.done())
+        await service.invoke_request_async(request(3, 'set', ['key', 'val']))
+        return await poller
+    assert_equal(asyncio.run(run()), {'jsonrpc': '2.0', 'id': 2, 'result': 'val'})
+
+def test_notification():
+    '''Test inocybe_jsonrpc.aio.Service awaits a coroutine notification without a Response'''
+    service = SleepService()
+    start = monotonic()
+    response = asyncio.run(service.handle_request_async(
+        '{"jsonrpc": "2.0", "method": "sleep", "params": [0.1]}'
+    ))
+    assert_equal(response, None)
+    assert_less(0.1, monotonic() - start)
+
+def test_timeout():
+    '''Test inocybe_jsonrpc.aio.Service cancels a coroutine call at its deadline'''
+    service = SleepService()
+    service.timeouts = {'sleep': 0.1}
+    start = monotonic()
+    response = asyncio.run(service.invoke_request_async(request(1, 'sleep', [5])))
+    assert_less(monotonic() - start, 1.0)
+    assert_equal(response, {
+        'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'Timeout'},
+    })
+
+def test_notification_timeout():
+    '''Test inocybe_jsonrpc.aio.Service cancels a coroutine notification at its deadline'''
+    service = SleepService()
+    service.timeouts = {'sleep': 0.1}
+    start = monotonic()
+    response = asyncio.run(service.handle_request_async(
+        '[{"jsonrpc": "2.0", "method": "sleep", "params": [5]}]'
+    ))
+    assert_less(monotonic() - start, 1.0)
+    assert_equal(response, None)
+    stats = service.metrics.stats()['sleep']
+    assert_equal((stats['calls'], stats['errors']), (1, 0))
+
+def test_sync_refused():
+    '''Test inocybe_jsonrpc.aio.Service refuses the synchronous entry points'''
+    service = SleepService()
+    data = b'{"jsonrpc": "2.0", "id": 1, "method": "sleep", "params": [0]}'
+    for method in (service.handle_bytes, service.handle_bytes_stream, service.dispatch_bytes,
+                   service.handle_request):
+        raises(TypeError)(lambda m=method: m(data))()
+
+def test_report_threadsafe():
+    '''Test inocybe_jsonrpc.aio.Service wakes a waiter for a call reported from another thread'''
+    service = KeyvalService()
+    async def run():
+        '''Watch a key, long-poll it, then report the watch from an executor thread.'''
+        await service.invoke_request_async(request(1, 'get', ['key'], 'foo'))
+        poll = request(2, 'get', ['key'], 'foo')
+        poll['metadata']['wait'] = 5
+        poller = asyncio.ensure_future(service.invoke_request_async(poll))
+        await asyncio.sleep(0.01)
+        start = monotonic()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, service.result_async, 'foo', 'val')
+        response = await poller
+        return (response, monotonic() - start)
+    (response, elapsed) = asyncio.run(run())
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 2, 'result': 'val'})
+    assert_less(elapsed, 1.0)
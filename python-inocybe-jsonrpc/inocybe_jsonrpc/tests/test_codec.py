@@ -0,0 +1,120 @@
+'''Test cases for inocybe_jsonrpc.codec.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+
+from nose.tools import assert_equal
+from nose.tools import assert_is_instance
+from nose.tools import raises
+
+from inocybe_jsonrpc.codec import (CODECS, Codec, codec)
+from inocybe_jsonrpc.echo import Service
+from inocybe_jsonrpc.jsonrpc import Service as BaseService
+
+VALUE = {'foo': ['bar', 1, 2.5, None, True], 'baz': {'qux': u'é/☃'}}
+
+def test_default():
+    '''Test inocybe_jsonrpc.codec.codec() returns the standard library codec for "json"'''
+    assert_equal(codec('json'), Codec)
+
+@raises(ValueError)
+def test_unknown():
+    '''Test inocybe_jsonrpc.codec.codec() rejects an unknown codec'''
+    codec('not a codec')
+
+def test_round_trip():
+    '''Test every available inocybe_jsonrpc.codec codec round trips bytes and strings'''
+    for impl in CODECS.values():
+        encoded = impl.encode(VALUE)
+        assert_is_instance(encoded, bytes)
+        assert_equal(json.loads(encoded.decode('utf-8')), VALUE)
+        assert_equal(impl.decode(encoded), VALUE)
+        assert_equal(impl.decode(encoded.decode('utf-8')), VALUE)
+
+def test_decode_error():
+    '''Test every available inocybe_jsonrpc.codec codec raises ValueError for bad data'''
+    for impl in CODECS.values():
+        for bad in (b'{"foo', b'\xff\xfe', b''):
+            raises(ValueError)(lambda i=impl, b=bad: i.decode(b))()
+
+def test_handle_bytes():
+    '''Test inocybe_jsonrpc.jsonrpc.Service.handle_bytes() with every available codec'''
+    service = Service()
+    request = b'{"jsonrpc": "2.0", "id": 1, "method": "echo", "params": {"foo": "bar"}}'
+    for impl in CODECS.values():
+        service.codec = impl
+        response = service.handle_bytes(request)
+        assert_is_instance(response, bytes)
+        assert_equal(json.loads(response.decode('utf-8')), {
+            'jsonrpc': '2.0', 'id': 1, 'result': {'foo': 'bar'},
+        })
+        response = service.handle_bytes(b'{"jsonrpc": "2.0", "id": 1, "method": "echo')
+        assert_equal(json.loads(response.decode('utf-8'))['error']['code'], -32700)
+
+def test_encode_error():
+    '''Test inocybe_jsonrpc.jsonrpc.Service.handle_bytes() returns an Internal error for a result
+       the codec cannot encode, with every available codec
+    '''
+    service = BaseService()
+    service.methods = {'opaque': object, 'wide': lambda: 1 << 70, 'echo': lambda *args: args}
+    batch = json.dumps([
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'opaque'},
+        {'jsonrpc': '2.0', 'id': 2, 'method': 'echo', 'params': ['foo']},
+    ]).encode()
+    for impl in CODECS.values():
+        service.codec = impl
+        for method in ('opaque', 'wide'):
+            request = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method}).encode()
+            response = json.loads(service.handle_bytes(request).decode('utf-8'))
+            if method == 'wide' and impl is Codec:
+                assert_equal(response['result'], 1 << 70)
+            else:
+                assert_equal((response['id'], response['error']['code']), (1, -32603))
+            assert_equal(json.loads(b''.join(service.handle_bytes_stream(request))), response)
+        (first, second) = json.loads(service.handle_bytes(batch).decode('utf-8'))
+        assert_equal((first['id'], first['error']['code']), (1, -32603))
+        assert_equal(second, {'jsonrpc': '2.0', 'id': 2, 'result': ['foo']})
+
+def test_iterencode():
+    '''Test every available inocybe_jsonrpc.codec codec iterencode() matches encode()'''
+    table = {'jsonrpc': '2.0', 'id': 1, 'result': {
+        'entries': [{'name': u'é/☃ {}'.format(i), 'seq': i, 'match': [i, None]} for i in range(500)],
+        'empty': [[], {}], 'keys': {1: 'one'}, 'tuple': (1, 2.5),
+    }}
+    for impl in CODECS.values():
+        chunks = list(impl.iterencode(table, 1024))
+        assert len(chunks) > 1
+        for chunk in chunks[:-1]:
+            assert 1024 <= len(chunk) < 1024 + 128
+        assert_equal(b''.join(chunks), impl.encode(table))
+        assert_equal(b''.join(impl.iterencode(VALUE)), impl.encode(VALUE))
+        assert_equal(list(impl.iterencode(None)), [b'null'])
+
+def test_handle_bytes_stream():
+    '''Test inocybe_jsonrpc.jsonrpc.Service.handle_bytes_stream() with every available codec'''
+    service = Service()
+    request = b'{"jsonrpc": "2.0", "id": 1, "method": "echo", "params": {"foo": "bar"}}'
+    for impl in CODECS.values():
+        service.codec = impl
+        assert_equal(b''.join(service.handle_bytes_stream(request)), service.handle_bytes(request))
+        assert_equal(service.handle_bytes_stream(b'{"jsonrpc": "2.0", "method": "echo"}'), None)
+    stats = service.metrics.stats()['echo']
+    assert_equal(stats['calls'], 3 * len(CODECS))
+    assert_equal(stats['response_bytes'], sum(
+        2 * len(impl.encode({'jsonrpc': '2.0', 'id': 1, 'result': {'foo': 'bar'}}))
+        for impl in CODECS.values()
+    ))
@@ -0,0 +1,75 @@
+'''Test cases for inocybe_jsonrpc.encoding.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+
+import zlib
+
+from nose.tools import assert_equal
+from nose.tools import assert_is_none
+from nose.tools import raises
+
+from inocybe_jsonrpc.encoding import (ENCODINGS, decode, encode, negotiate)
+
+DATA = b'{"jsonrpc": "2.0", "id": 1, "result": ' + b'[0, 1, 2, 3]' * 1000 + b'}'
+
+def test_negotiate():
+    '''Test inocybe_jsonrpc.encoding.negotiate() picks the best content coding accepted'''
+    assert_equal(negotiate('gzip, deflate'), 'gzip')
+    assert_equal(negotiate('deflate'), 'deflate')
+    assert_equal(negotiate('gzip;q=0.5, deflate;q=1.0'), 'deflate')
+    assert_equal(negotiate('*'), 'gzip')
+    assert_equal(negotiate('br, *;q=0.1, gzip;q=0'), 'deflate')
+
+def test_negotiate_none():
+    '''Test inocybe_jsonrpc.encoding.negotiate() declines to encode if nothing is accepted'''
+    assert_is_none(negotiate(None))
+    assert_is_none(negotiate(''))
+    assert_is_none(negotiate('identity'))
+    assert_is_none(negotiate('gzip;q=0, deflate;q=0'))
+    assert_is_none(negotiate('*;q=0'))
+
+def test_round_trip():
+    '''Test inocybe_jsonrpc.encoding round trips every content coding'''
+    for coding in ENCODINGS:
+        encoded = encode(DATA, coding)
+        assert len(encoded) < len(DATA) // 10
+        assert_equal(decode(encoded, coding), DATA)
+
+def test_raw_deflate():
+    '''Test inocybe_jsonrpc.encoding.decode() accepts deflate data without a zlib header'''
+    compress = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    assert_equal(decode(compress.compress(DATA) + compress.flush(), 'deflate'), DATA)
+
+@raises(KeyError)
+def test_unknown():
+    '''Test inocybe_jsonrpc.encoding.decode() rejects an unknown content coding'''
+    decode(DATA, 'br')
+
+@raises(ValueError)
+def test_corrupt():
+    '''Test inocybe_jsonrpc.encoding.decode() rejects corrupt data'''
+    decode(b'not gzip', 'gzip')
+
+@raises(ValueError)
+def test_truncated():
+    '''Test inocybe_jsonrpc.encoding.decode() rejects truncated data'''
+    decode(encode(DATA, 'gzip')[:-10], 'gzip')
+
+@raises(ValueError)
+def test_limit():
+    '''Test inocybe_jsonrpc.encoding.decode() rejects data decoding to more than the limit'''
+    decode(encode(DATA, 'gzip'), 'gzip', len(DATA) - 1)
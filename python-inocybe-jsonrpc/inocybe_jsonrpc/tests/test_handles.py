@@ -0,0 +1,178 @@
+'''Test cases for inocybe_jsonrpc.handles.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+from threading import Timer
+from time import monotonic
+
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_is_none
+from nose.tools import assert_less
+from nose.tools import assert_true
+
+from inocybe_jsonrpc.handles import HandleTable
+from inocybe_jsonrpc.keyval import Service
+
+class Clock(object): ### pylint: disable=too-few-public-methods
+    '''A clock which only moves when told to.'''
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_collect():
+    '''Test inocybe_jsonrpc.handles.HandleTable collects a reported result once'''
+    table = HandleTable()
+    table.add('foo')
+    assert_is_none(table.collect('foo'))
+    assert_true(table.report('foo', 'result', 7))
+    assert_equal(table.collect('foo'), ('result', 7))
+    assert_false('foo' in table)
+    assert_equal(table.stats(), {'live': 0, 'created': 1, 'collected': 1, 'evicted': 0})
+
+def test_error_first():
+    '''Test inocybe_jsonrpc.handles.HandleTable collects an error in preference to a result'''
+    table = HandleTable()
+    table.add('foo')
+    table.report('foo', 'result', 7)
+    table.report('foo', 'error', {'code': 1, 'message': 'bar'})
+    assert_equal(table.collect('foo'), ('error', {'code': 1, 'message': 'bar'}))
+
+def test_unknown():
+    '''Test inocybe_jsonrpc.handles.HandleTable ignores unknown and unhashable handles'''
+    table = HandleTable()
+    assert_false('foo' in table)
+    assert_false({} in table)
+    assert_false(table.report('foo', 'result', 7))
+    assert_is_none(table.collect('foo'))
+
+def test_maxlen():
+    '''Test inocybe_jsonrpc.handles.HandleTable evicts the least recently polled handle'''
+    table = HandleTable(maxlen=2)
+    table.add('foo')
+    table.add('bar')
+    table.collect('foo')
+    table.add('baz')
+    assert_true('foo' in table)
+    assert_false('bar' in table)
+    assert_true('baz' in table)
+    assert_equal(table.stats(), {'live': 2, 'created': 3, 'collected': 0, 'evicted': 1})
+
+def test_ttl():
+    '''Test inocybe_jsonrpc.handles.HandleTable evicts handles not polled within the TTL'''
+    clock = Clock()
+    table = HandleTable(ttl=10, clock=clock)
+    table.add('foo')
+    table.add('bar')
+    clock.now = 6
+    table.collect('foo')
+    clock.now = 12
+    table.evict()
+    assert_true('foo' in table)
+    assert_false('bar' in table)
+    clock.now = 17
+    table.evict()
+    assert_equal(len(table), 0)
+    assert_equal(table.stats()['evicted'], 2)
+
+def test_on_evict():
+    '''Test inocybe_jsonrpc.handles.HandleTable calls on_evict with each handle evicted'''
+    (clock, evicted) = (Clock(), [])
+    table = HandleTable(ttl=10, maxlen=2, clock=clock, on_evict=evicted.append)
+    for handle in ('foo', 'bar', 'baz'):
+        table.add(handle)
+    assert_equal(evicted, ['foo'])
+    table.report('bar', 'result', 7)
+    table.collect('bar')
+    clock.now = 11
+    table.evict()
+    assert_equal(evicted, ['foo', 'baz'])
+
+def test_service_unwatch():
+    '''Test inocybe_jsonrpc.keyval.Service drops the watches of evicted handles'''
+    service = Service()
+    service.handles.maxlen = 2
+    for (handle, key) in (('foo', 'never'), ('bar', 'never'), ('baz', 'key'), ('qux', 'key')):
+        service.invoke_request({
+            'jsonrpc': '2.0', 'id': 1, 'method': 'get', 'params': [key],
+            'metadata': {'async': handle},
+        })
+    assert_equal(service._watch, {'key': ['baz', 'qux']}) ### pylint: disable=protected-access
+    service.invoke_request({'jsonrpc': '2.0', 'id': 2, 'method': 'set', 'params': ['key', 'val']})
+    service.handles.maxlen = 0
+    service.handles.evict()
+    assert_equal(service._watch, {}) ### pylint: disable=protected-access
+    assert_equal(service._watching, {}) ### pylint: disable=protected-access
+
+def test_service_evicted():
+    '''Test inocybe_jsonrpc.jsonrpc.Service discards results for evicted handles'''
+    service = Service()
+    service.handles.maxlen = 1
+    for handle in ('foo', 'bar'):
+        response = service.invoke_request({
+            'jsonrpc': '2.0', 'id': 1, 'method': 'get', 'params': ['key'],
+            'metadata': {'async': handle},
+        })
+        assert_equal(response['metadata'], {'async': handle})
+    service.invoke_request({'jsonrpc': '2.0', 'id': 2, 'method': 'set', 'params': ['key', 'val']})
+    assert_equal(service.handles.stats(), {'live': 1, 'created': 2, 'collected': 0, 'evicted': 1})
+    response = service.invoke_request({
+        'jsonrpc': '2.0', 'id': 3, 'method': 'get', 'params': ['key'],
+        'metadata': {'async': 'bar'},
+    })
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 3, 'result': 'val'})
+
+def test_wait():
+    '''Test inocybe_jsonrpc.handles.HandleTable waits for a report from another thread'''
+    table = HandleTable()
+    assert_false(table.wait('foo', 0))
+    table.add('foo')
+    assert_false(table.wait('foo', 0.01))
+    Timer(0.05, table.report, ('foo', 'result', 7)).start()
+    assert_true(table.wait('foo', 5))
+    assert_equal(table.collect('foo'), ('result', 7))
+
+def test_service_wait():
+    '''Test inocybe_jsonrpc.jsonrpc.Service long-polls a key/value watch, only if allowed'''
+    service = Service()
+    request = {
+        'jsonrpc': '2.0', 'id': 1, 'method': 'get', 'params': ['key'],
+        'metadata': {'async': 'foo'},
+    }
+    assert_equal(service.invoke_request(request)['metadata'], {'async': 'foo'})
+    request['metadata']['wait'] = 5
+    start = monotonic()
+    assert_equal(service.invoke_request(request)['metadata'], {'async': 'foo'})
+    assert_less(monotonic() - start, 1.0)
+    service.wait_max = 30.0
+    Timer(0.05, service.invoke_request, ({
+        'jsonrpc': '2.0', 'id': 2, 'method': 'set', 'params': ['key', 'val'],
+    },)).start()
+    assert_equal(service.invoke_request(request), {'jsonrpc': '2.0', 'id': 1, 'result': 'val'})
+
+def test_service_drained():
+    '''Test inocybe_jsonrpc.jsonrpc.Service lets clients collect asynchronous calls while draining'''
+    service = Service()
+    request = {
+        'jsonrpc': '2.0', 'id': 1, 'method': 'get', 'params': ['key'],
+        'metadata': {'async': 'foo'},
+    }
+    service.invoke_request(request)
+    service.draining = True
+    assert_true(service.drained())
+    service.result_async('foo', 'val')
+    assert_equal(service.invoke_request(request), {'jsonrpc': '2.0', 'id': 1, 'result': 'val'})
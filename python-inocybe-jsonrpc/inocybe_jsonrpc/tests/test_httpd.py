@@ -0,0 +1,221 @@
+'''Test cases for inocybe_jsonrpc.httpd.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import gzip
+import json
+from http.client import HTTPConnection
+from http.server import HTTPServer
+from threading import (Event, Thread)
+from time import sleep
+
+from nose.tools import assert_equal
+from nose.tools import assert_is
+from nose.tools import assert_false
+from nose.tools import assert_is_none
+
+from inocybe_jsonrpc.admission import Admission
+from inocybe_jsonrpc.httpd import (JsonRpcHandler, PooledHTTPServer, drain, reuse_port)
+from inocybe_jsonrpc.jsonrpc import Service as BaseService
+
+class Service(BaseService):
+    '''A service with a method returning a Response of any size, and one which blocks.'''
+    def __init__(self):
+        BaseService.__init__(self)
+        self.methods = {'fill': self.fill, 'block': self.block}
+        self.release = Event()
+    @staticmethod
+    def fill(size):
+        '''Return a list of `size` integers.'''
+        return list(range(size))
+    def block(self):
+        '''Block until released.'''
+        return self.release.wait(5)
+
+def start(service, threads=2, admission=None, **kwargs):
+    '''Start a :class:`PooledHTTPServer` on an ephemeral port, presenting `service` at /rpc with a
+       handler routed with `kwargs`, and return it.
+    '''
+    handler = JsonRpcHandler.routing([('/rpc', service)], keep_alive=5, **kwargs)
+    handler.chunk_size = 64
+    httpd = PooledHTTPServer(('127.0.0.1', 0), handler, threads, admission)
+    thread = Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05})
+    thread.daemon = True
+    thread.start()
+    return httpd
+
+def stop(httpd):
+    '''Stop `httpd`.'''
+    httpd.shutdown()
+    httpd.server_close()
+
+def post(conn, id_, method, params=None, headers=None):
+    '''POST a Request on `conn` and return the HTTP Response, with its body read.'''
+    body = {'jsonrpc': '2.0', 'id': id_, 'method': method}
+    if params is not None:
+        body['params'] = params
+    headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+    conn.request('POST', '/rpc', json.dumps(body).encode(), headers)
+    response = conn.getresponse()
+    response.body = response.read()
+    return response
+
+def test_keep_alive():
+    '''Test inocybe_jsonrpc.httpd.PooledHTTPServer handles many HTTP Requests on one connection'''
+    httpd = start(Service())
+    conn = HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=5)
+    try:
+        response = post(conn, 1, 'fill', [3])
+        sock = conn.sock
+        for id_ in range(2, 5):
+            response = post(conn, id_, 'fill', [id_])
+            assert_equal(response.status, 200)
+            assert_equal(json.loads(response.body.decode()), {
+                'jsonrpc': '2.0', 'id': id_, 'result': list(range(id_)),
+            })
+            assert_is(conn.sock, sock)
+        conn.request('POST', '/nope', b'{}', {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        assert_equal(response.status, 404)
+    finally:
+        conn.close()
+        stop(httpd)
+
+def test_stream():
+    '''Test inocybe_jsonrpc.httpd.JsonRpcHandler streams a large Response in chunks'''
+    httpd = start(Service(), stream=True)
+    conn = HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=5)
+    try:
+        response = post(conn, 1, 'fill', [100])
+        assert_equal(response.getheader('Transfer-Encoding'), 'chunked')
+        assert_is_none(response.getheader('Content-Length'))
+        assert_equal(json.loads(response.body.decode())['result'], list(range(100)))
+        ### a Response of one chunk is sent whole, on the same connection
+        response = post(conn, 2, 'fill', [1])
+        assert_equal(response.getheader('Content-Length'), str(len(response.body)))
+        assert_equal(json.loads(response.body.decode())['result'], [0])
+    finally:
+        conn.close()
+        stop(httpd)
+
+def test_gzip():
+    '''Test inocybe_jsonrpc.httpd.JsonRpcHandler compresses a large Response if accepted'''
+    for stream in (False, True):
+        httpd = start(Service(), compress_min=100, stream=stream)
+        conn = HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=5)
+        try:
+            response = post(conn, 1, 'fill', [100], {'Accept-Encoding': 'gzip'})
+            assert_equal(response.getheader('Content-Encoding'), 'gzip')
+            assert_equal(response.getheader('Vary'), 'Accept-Encoding')
+            body = json.loads(gzip.decompress(response.body).decode())
+            assert_equal(body['result'], list(range(100)))
+            response = post(conn, 2, 'fill', [100])
+            assert_is_none(response.getheader('Content-Encoding'))
+            assert_equal(json.loads(response.body.decode())['result'], list(range(100)))
+            if not stream:
+                response = post(conn, 3, 'fill', [1], {'Accept-Encoding': 'gzip'})
+                assert_is_none(response.getheader('Content-Encoding'))
+        finally:
+            conn.close()
+            stop(httpd)
+
+def test_shed():
+    '''Test inocybe_jsonrpc.httpd.PooledHTTPServer sheds a connection while the queue is full'''
+    service = Service()
+    httpd = start(service, threads=1, admission=Admission(1))
+    port = httpd.server_address[1]
+    conns = [HTTPConnection('127.0.0.1', port, timeout=5) for _ in range(3)]
+    try:
+        ### the first connection occupies the thread, the second waits in the queue
+        for (id_, conn) in enumerate(conns[:2]):
+            conn.request('POST', '/rpc', json.dumps({
+                'jsonrpc': '2.0', 'id': id_, 'method': 'block',
+            }).encode(), {'Content-Type': 'application/json'})
+            sleep(0.1)
+        response = post(conns[2], 2, 'fill', [1])
+        assert_equal(response.status, 503)
+        assert_equal(response.getheader('Connection'), 'close')
+        assert_equal(json.loads(response.body.decode()), {
+            'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32001, 'message': 'Server busy'},
+        })
+        service.release.set()
+        ### the queued connection is handled once the first is closed
+        for (id_, conn) in enumerate(conns[:2]):
+            assert_equal(json.loads(conn.getresponse().read().decode()), {
+                'jsonrpc': '2.0', 'id': id_, 'result': True,
+            })
+            conn.close()
+    finally:
+        for conn in conns:
+            conn.close()
+        stop(httpd)
+
+def test_drain():
+    '''Test inocybe_jsonrpc.httpd.drain() completes the HTTP Request in progress, and sheds the
+       calls on connections queued after
+    '''
+    service = Service()
+    httpd = start(service)
+    port = httpd.server_address[1]
+    conns = [HTTPConnection('127.0.0.1', port, timeout=5) for _ in range(2)]
+    try:
+        conns[0].request('POST', '/rpc', json.dumps({
+            'jsonrpc': '2.0', 'id': 1, 'method': 'block',
+        }).encode(), {'Content-Type': 'application/json'})
+        sleep(0.1)
+        httpd.shutdown()
+        ### no longer served, the connection waits in the listen queue
+        conns[1].request('POST', '/rpc', json.dumps({
+            'jsonrpc': '2.0', 'id': 2, 'method': 'fill', 'params': [1],
+        }).encode(), {'Content-Type': 'application/json'})
+        draining = Thread(target=drain, args=(httpd, [('/rpc', service)], 5))
+        draining.start()
+        sleep(0.1)
+        service.release.set()
+        response = conns[0].getresponse()
+        assert_equal(response.getheader('Connection'), 'close')
+        assert_equal(json.loads(response.read().decode()), {
+            'jsonrpc': '2.0', 'id': 1, 'result': True,
+        })
+        assert_equal(json.loads(conns[1].getresponse().read().decode()), {
+            'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32001, 'message': 'Server busy'},
+        })
+        draining.join(5)
+        assert_false(draining.is_alive())
+    finally:
+        for conn in conns:
+            conn.close()
+        httpd.server_close()
+
+def test_reuse_port():
+    '''Test inocybe_jsonrpc.httpd.reuse_port() derives a server binding its port with
+       SO_REUSEPORT
+    '''
+    server = reuse_port(HTTPServer)
+    first = server(('127.0.0.1', 0), JsonRpcHandler)
+    address = first.server_address
+    try:
+        second = server(address, JsonRpcHandler)
+        second.server_close()
+        try:
+            HTTPServer(address, JsonRpcHandler).server_close()
+        except OSError:
+            pass
+        else:
+            raise AssertionError('bound without SO_REUSEPORT')
+    finally:
+        first.server_close()
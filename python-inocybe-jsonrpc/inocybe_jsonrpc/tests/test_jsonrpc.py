@@ -0,0 +1,275 @@
+'''Test cases for inocybe_jsonrpc.jsonrpc.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import (monotonic, time)
+
+from nose.tools import assert_equal
+from nose.tools import assert_is
+from nose.tools import assert_is_none
+from nose.tools import assert_less
+from nose.tools import assert_true
+from nose.tools import raises
+
+from inocybe_jsonrpc.jsonrpc import (JsonRpcError, TypeRequestObject, TypeResponseObject)
+from inocybe_jsonrpc.jsonrpc import params_check
+from inocybe_jsonrpc.math import Service
+
+def handle(request, service=None):
+    '''Return the decoded Response from a fresh math service for decoded `request`.'''
+    response = (service or Service()).handle_request(json.dumps(request))
+    return None if response is None else json.loads(response)
+
+def test_request_canonical():
+    '''Test inocybe_jsonrpc.jsonrpc.TypeRequestObject returns a canonical Request as is'''
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1], 'metadata': {}}
+    assert_is(TypeRequestObject.validate(request), request)
+
+def test_request_version():
+    '''Test inocybe_jsonrpc.jsonrpc.TypeRequestObject forms the canonical version'''
+    for version in (2, 2.0, '2'):
+        request = {'jsonrpc': version, 'method': 'add'}
+        assert_equal(TypeRequestObject.validate(request), {'jsonrpc': '2.0', 'method': 'add'})
+        assert_equal(request['jsonrpc'], version)
+
+def test_request_invalid():
+    '''Test inocybe_jsonrpc.jsonrpc.TypeRequestObject rejects invalid Requests'''
+    for bad in (None, 7, 'foo', {}, {'jsonrpc': '2.0'}, {'method': 'add'},
+                {'jsonrpc': '1.0', 'method': 'add'}, {'jsonrpc': '2.0', 'method': 'rpc.add'},
+                {'jsonrpc': '2.0', 'method': 'add', 'params': 7},
+                {'jsonrpc': '2.0', 'method': 'add', 'foo': 'bar'},
+                {'jsonrpc': '2.0', 'method': 'add', 'metadata': {'foo': 'bar'}},
+                {'jsonrpc': '2.0', 'method': 'add', 'metadata': {'wait': -1}},
+                {'jsonrpc': '2.0', 'method': 'add', 'metadata': {'wait': True}},
+                {'jsonrpc': '2.0', 'method': 'add', 'metadata': {'wait': '5'}},
+                {'jsonrpc': '2.0', 'method': 'add', 'metadata': {'deadline': -1}}):
+        func = raises(JsonRpcError)(lambda b=bad: TypeRequestObject.validate(b))
+        func()
+
+@raises(ValueError)
+def test_response_validated():
+    '''Test inocybe_jsonrpc.jsonrpc.TypeResponseObject validates a Response by default'''
+    TypeResponseObject.error(1, {'code': 'not an int', 'message': 'foo'})
+
+def test_response_trusted():
+    '''Test inocybe_jsonrpc.jsonrpc.TypeResponseObject skips validation when trusted'''
+    assert_equal(TypeResponseObject.error(1, {'code': 'foo'}, True), {
+        'jsonrpc': '2.0', 'id': 1, 'error': {'code': 'foo'},
+    })
+
+def test_service_trusted():
+    '''Test inocybe_jsonrpc.jsonrpc.Service.trusted skips validation for that service only'''
+    def malformed():
+        '''Report a malformed error.'''
+        raise JsonRpcError('not an int', 'malformed')
+    (trusted, validated) = (Service(), Service())
+    trusted.trusted = True
+    for service in (trusted, validated):
+        service.methods = {'malformed': malformed}
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'malformed'}
+    assert_equal(trusted.invoke_request(request)['error']['code'], 'not an int')
+    raises(ValueError)(lambda: validated.invoke_request(request))()
+
+def test_single():
+    '''Test inocybe_jsonrpc.jsonrpc.Service handles a single Request'''
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]}), {
+        'jsonrpc': '2.0', 'id': 1, 'result': 3,
+    })
+
+def test_batch():
+    '''Test inocybe_jsonrpc.jsonrpc.Service handles a Batch in element order'''
+    assert_equal(handle([
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]},
+        {'jsonrpc': '2.0', 'id': 2, 'method': 'subtract', 'params': {'a': 5, 'b': 3}},
+        {'jsonrpc': '2.0', 'id': 3, 'method': 'nope'},
+    ]), [
+        {'jsonrpc': '2.0', 'id': 1, 'result': 3},
+        {'jsonrpc': '2.0', 'id': 2, 'result': 2},
+        {'jsonrpc': '2.0', 'id': 3, 'error': {'code': -32601, 'message': 'Method not found'}},
+    ])
+
+def test_batch_notifications():
+    '''Test inocybe_jsonrpc.jsonrpc.Service omits notifications from a Batch Response'''
+    assert_equal(handle([
+        {'jsonrpc': '2.0', 'method': 'add', 'params': [1, 2]},
+        {'jsonrpc': '2.0', 'id': 'x', 'method': 'max', 'params': [1, 2]},
+    ]), [
+        {'jsonrpc': '2.0', 'id': 'x', 'result': 2},
+    ])
+    assert_is_none(handle([
+        {'jsonrpc': '2.0', 'method': 'add', 'params': [1, 2]},
+        {'jsonrpc': '2.0', 'method': 'min', 'params': [1, 2]},
+    ]))
+
+def test_batch_invalid():
+    '''Test inocybe_jsonrpc.jsonrpc.Service reports invalid Batches and Batch elements'''
+    invalid = {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid Request'}}
+    assert_equal(handle([]), invalid)
+    assert_equal(handle([1, [], {'jsonrpc': '2.0'}]), [invalid, invalid, invalid])
+
+def test_batch_executor():
+    '''Test inocybe_jsonrpc.jsonrpc.Service invokes a Batch on an executor in element order'''
+    service = Service()
+    service.batch_executor = ThreadPoolExecutor(4)
+    batch = [{'jsonrpc': '2.0', 'id': i, 'method': 'add', 'params': [i, i]} for i in range(32)]
+    assert_equal(handle(batch, service), [
+        {'jsonrpc': '2.0', 'id': i, 'result': i + i} for i in range(32)
+    ])
+    service.batch_executor.shutdown()
+
+def test_params_check():
+    '''Test inocybe_jsonrpc.jsonrpc.params_check() matches params to a signature'''
+    def func(a, b=2, *, c=3): ### pylint: disable=unused-argument
+        '''A function with positional and keyword params.'''
+    def func_async(async_, a, **kwargs): ### pylint: disable=unused-argument
+        '''An asynchronous function accepting any keyword params.'''
+    check = params_check(func)
+    assert_is(params_check(func), check)
+    for good in ([1], [1, 2], {'a': 1}, {'a': 1, 'b': 2, 'c': 3}):
+        assert_is_none(check(good))
+    for bad in (None, [], [1, 2, 3], {}, {'b': 2}, {'a': 1, 'd': 4}):
+        assert_true(check(bad))
+    check = params_check(func_async, 1)
+    for good in ([1], {'a': 1}, {'a': 1, 'z': 26}):
+        assert_is_none(check(good))
+    for bad in ([], [1, 2], {'async_': 1, 'a': 1}):
+        assert_true(check(bad))
+    assert_is_none(params_check(min))
+
+def test_type_error_inside():
+    '''Test inocybe_jsonrpc.jsonrpc.Service reports a TypeError inside a method as Internal error'''
+    service = Service()
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 'a']}, service), {
+        'jsonrpc': '2.0', 'id': 1, 'error': {
+            'code': -32603,
+            'message': "Internal error: unsupported operand type(s) for +: 'int' and 'str'",
+        },
+    })
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1]}, service), {
+        'jsonrpc': '2.0', 'id': 1, 'error': {
+            'code': -32602, 'message': 'Invalid params', 'data': "missing a required argument: 'b'",
+        },
+    })
+
+def test_notification():
+    '''Test inocybe_jsonrpc.jsonrpc.Service invokes a notification without a Response'''
+    calls = []
+    service = Service()
+    service.methods = {'note': calls.append, 'fail': lambda: 1 / 0}
+    for request in ({'jsonrpc': '2.0', 'method': 'note', 'params': [1]},
+                    {'jsonrpc': '2.0', 'method': 'note', 'params': [1, 2]},
+                    {'jsonrpc': '2.0', 'method': 'fail'},
+                    {'jsonrpc': '2.0', 'method': 'nope'}):
+        assert_is_none(service.handle_request(json.dumps(request)))
+    assert_equal(calls, [1])
+    assert_is_none(service.invoke_request({'jsonrpc': '2.0', 'method': 'note', 'params': [2]}))
+    assert_equal(calls, [1, 2])
+
+TIMEOUT = {'code': -32000, 'message': 'Timeout'}
+
+def test_deadline_passed():
+    '''Test inocybe_jsonrpc.jsonrpc.Service drops a call whose deadline has passed'''
+    calls = []
+    service = Service()
+    service.methods = {'note': calls.append}
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'note', 'params': [1]}
+    request['metadata'] = {'deadline': time() - 1}
+    assert_equal(handle(request, service), {'jsonrpc': '2.0', 'id': 1, 'error': TIMEOUT})
+    request['metadata'] = {'deadline': time() + 60}
+    assert_equal(handle(request, service), {'jsonrpc': '2.0', 'id': 1, 'result': None})
+    assert_equal(calls, [1])
+
+def test_timeout():
+    '''Test inocybe_jsonrpc.jsonrpc.Service abandons a call still running at its timeout'''
+    release = Event()
+    service = Service()
+    service.methods = {'hang': release.wait, 'add': lambda a, b: a + b}
+    service.timeouts = {'hang': 0.1}
+    service.timeout_executor = ThreadPoolExecutor(2)
+    start = monotonic()
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 1, 'method': 'hang'}, service), {
+        'jsonrpc': '2.0', 'id': 1, 'error': TIMEOUT,
+    })
+    assert_less(monotonic() - start, 1.0)
+    service.timeout_default = 5
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 2, 'method': 'add', 'params': [1, 2]}, service), {
+        'jsonrpc': '2.0', 'id': 2, 'result': 3,
+    })
+    release.set()
+    service.timeout_executor.shutdown()
+
+def test_notification_timeout():
+    '''Test inocybe_jsonrpc.jsonrpc.Service abandons a notification still running at its timeout'''
+    release = Event()
+    service = Service()
+    service.methods = {'hang': release.wait}
+    service.timeouts = {'hang': 0.1}
+    service.timeout_executor = ThreadPoolExecutor(2)
+    start = monotonic()
+    assert_is_none(handle({'jsonrpc': '2.0', 'method': 'hang'}, service))
+    assert_is_none(handle([{'jsonrpc': '2.0', 'method': 'hang'}], service))
+    assert_less(monotonic() - start, 1.0)
+    ### an abandoned notification is not an error: there is no Response to report one in
+    stats = handle({'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats'}, service)['result']
+    assert_equal((stats['methods']['hang']['calls'], stats['methods']['hang']['errors']), (2, 0))
+    release.set()
+    service.timeout_executor.shutdown()
+
+def test_error_pickle():
+    '''Test inocybe_jsonrpc.jsonrpc.JsonRpcError survives pickling'''
+    error = pickle.loads(pickle.dumps(JsonRpcError.invalid_params('bad')))
+    assert_equal(error.error, {'code': -32602, 'message': 'Invalid params', 'data': 'bad'})
+
+def test_shed():
+    '''Test inocybe_jsonrpc.jsonrpc.Service sheds Requests without invoking them'''
+    calls = []
+    service = Service()
+    service.methods = {'note': calls.append}
+    busy = {'code': -32001, 'message': 'Server busy'}
+    def shed(request):
+        '''Return the decoded Response for shedding decoded `request`.'''
+        response = service.shed_bytes(json.dumps(request))
+        return None if response is None else json.loads(response)
+    assert_equal(shed({'jsonrpc': '2.0', 'id': 1, 'method': 'note', 'params': [1]}), {
+        'jsonrpc': '2.0', 'id': 1, 'error': busy,
+    })
+    assert_is_none(shed({'jsonrpc': '2.0', 'method': 'note', 'params': [1]}))
+    assert_equal(shed([{'jsonrpc': '2.0', 'id': 2, 'method': 'note'}, {'jsonrpc': '2.0'}, 7]), [
+        {'jsonrpc': '2.0', 'id': 2, 'error': busy}, {'jsonrpc': '2.0', 'id': None, 'error': busy},
+    ])
+    assert_equal(json.loads(service.shed_bytes(b'{')), {
+        'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': 'Parse error'},
+    })
+    assert_equal(calls, [])
+
+def test_draining():
+    '''Test inocybe_jsonrpc.jsonrpc.Service sheds new calls and notifications while draining'''
+    calls = []
+    service = Service()
+    service.methods = dict(service.methods, note=calls.append)
+    service.draining = True
+    assert_is_none(handle({'jsonrpc': '2.0', 'method': 'note', 'params': [1]}, service))
+    assert_equal(calls, [])
+    assert_equal(handle({'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]}, service), {
+        'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32001, 'message': 'Server busy'},
+    })
+    stats = handle({'jsonrpc': '2.0', 'id': 2, 'method': 'rpc.stats'}, service)
+    assert_true('methods' in stats['result'])
+    assert_true(service.drained())
@@ -0,0 +1,89 @@
+'''Test cases for inocybe_jsonrpc.metrics.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+
+from nose.tools import assert_equal
+from nose.tools import assert_less_equal
+from nose.tools import assert_true
+
+from inocybe_jsonrpc.metrics import Histogram
+from inocybe_jsonrpc.math import Service
+
+def handle(service, request):
+    '''Return the decoded Response from `service` for decoded `request`.'''
+    response = service.handle_request(json.dumps(request))
+    return None if response is None else json.loads(response)
+
+def test_histogram():
+    '''Test inocybe_jsonrpc.metrics.Histogram quantiles are accurate to a bucket'''
+    histogram = Histogram()
+    for micros in range(1, 10001):
+        histogram.add(micros / 1e6)
+    stats = histogram.stats()
+    assert_equal(stats['count'], 10000)
+    assert_equal(stats['max'], 10000.0)
+    for (key, expected) in (('p50', 5000), ('p99', 9900), ('p999', 9990)):
+        assert_less_equal(abs(stats[key] - expected), expected / Histogram.SUB)
+    assert_equal(Histogram().stats(), {'count': 0})
+
+def test_stats():
+    '''Test inocybe_jsonrpc.jsonrpc.Service reports per-method metrics through rpc.stats'''
+    service = Service()
+    for _ in range(3):
+        handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]})
+    handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1]})
+    handle(service, [{'jsonrpc': '2.0', 'id': 1, 'method': 'min', 'params': [1, 2]}])
+    service.handle_request('{')
+    stats = handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats'})['result']
+    assert_equal(stats['handles']['live'], 0)
+    methods = stats['methods']
+    assert_equal(sorted(methods), ['add', 'min', 'rpc.batch', 'rpc.invalid'])
+    add = methods['add']
+    assert_equal((add['calls'], add['errors']), (4, 1))
+    assert_true(add['request_bytes'] > 0 and add['response_bytes'] > 0)
+    for stage in ('parse', 'dispatch', 'serialize'):
+        assert_equal(add[stage]['count'], 4)
+        assert_true(add[stage]['p50'] <= add[stage]['p999'] <= add[stage]['max'])
+    assert_equal(sorted(methods['min']), ['calls', 'dispatch', 'errors', 'request_bytes',
+                                          'response_bytes'])
+    assert_equal(methods['rpc.invalid']['errors'], 1)
+    stats = handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats',
+                             'params': {'reset': True}})['result']
+    assert_equal(stats['methods']['rpc.stats']['calls'], 1)
+    stats = handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats'})['result']
+    assert_equal(sorted(stats['methods']), ['rpc.stats'])
+
+def test_disabled():
+    '''Test inocybe_jsonrpc.jsonrpc.Service records nothing when metrics are disabled'''
+    service = Service()
+    service.metrics = None
+    handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]})
+    assert_equal(handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats'})['result'], {
+        'methods': {}, 'handles': {'live': 0, 'created': 0, 'collected': 0, 'evicted': 0},
+    })
+
+def test_unknown():
+    '''Test inocybe_jsonrpc.jsonrpc.Service records calls of unknown methods under one name'''
+    service = Service()
+    for index in range(1000):
+        handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'made.up.{}'.format(index)})
+    handle(service, [{'jsonrpc': '2.0', 'method': 'made.up'}, {'jsonrpc': '2.0', 'method': 'add'}])
+    stats = handle(service, {'jsonrpc': '2.0', 'id': 1, 'method': 'rpc.stats'})['result']
+    methods = stats['methods']
+    assert_equal(sorted(methods), ['add', 'rpc.batch', 'rpc.unknown'])
+    assert_equal((methods['rpc.unknown']['calls'], methods['rpc.unknown']['errors']), (1001, 1000))
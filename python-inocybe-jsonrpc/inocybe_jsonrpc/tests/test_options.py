@@ -0,0 +1,140 @@
+'''Test cases for inocybe_jsonrpc.options.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+import os
+from argparse import ArgumentParser
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from nose.tools import assert_equal
+from nose.tools import assert_in
+from nose.tools import assert_is
+from nose.tools import assert_is_none
+from nose.tools import raises
+
+from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc import echo
+from inocybe_jsonrpc import math
+from inocybe_jsonrpc import options
+from inocybe_jsonrpc.httpd import url_path
+
+class Config(object):
+    '''A context manager for a config file in a temporary directory.'''
+    def __init__(self, content):
+        self.content = content
+        self.directory = None
+    def __enter__(self):
+        '''Write the config file, and return its name.'''
+        self.directory = mkdtemp()
+        filename = os.path.join(self.directory, 'services.json')
+        with open(filename, 'w') as config:
+            config.write(self.content if isinstance(self.content, str) else
+                         json.dumps(self.content))
+        return filename
+    def __exit__(self, *args):
+        rmtree(self.directory)
+
+def parser():
+    '''Return a parser for the options of a tool presenting services at paths.'''
+    aparser = ArgumentParser()
+    aparser.add_argument('-c', '--config')
+    options.add_arguments(aparser)
+    aparser.add_argument('path', nargs='?', type=url_path)
+    aparser.add_argument('service', nargs='?', type=ArgModuleAttribute('Service'))
+    aparser.add_argument('args', nargs='*')
+    return aparser
+
+def create(argv, asyncio=True):
+    '''Return the services created from command line `argv`.'''
+    aparser = parser()
+    args = vars(aparser.parse_args(argv))
+    return options.create_services(aparser, args, 'path', url_path, asyncio)
+
+def test_read_services():
+    '''Test inocybe_jsonrpc.options.read_services() reads a list of services'''
+    with Config([
+            {'path': '/echo', 'service': 'inocybe_jsonrpc.echo'},
+            {'path': '/math', 'service': 'inocybe_jsonrpc.math.Service', 'args': [1, 'a']},
+    ]) as filename:
+        assert_equal(options.read_services(filename, 'path'), [
+            ('/echo', echo.Service, []),
+            ('/math', math.Service, ['1', 'a']),
+        ])
+
+def test_read_services_bad():
+    '''Test inocybe_jsonrpc.options.read_services() rejects a malformed file'''
+    for (content, message) in (
+            ('[', 'failed to read'),
+            ({'path': '/echo'}, 'must hold a non-empty list'),
+            ([], 'must hold a non-empty list'),
+            (['/echo'], 'bad service 0 in'),
+            ([{'service': 'inocybe_jsonrpc.echo'}], "missing 'path'"),
+            ([{'path': '/echo'}], "missing 'service'"),
+            ([{'path': '/echo', 'service': 'inocybe_jsonrpc.echo', 'args': 'a'}],
+             'args must be a list'),
+            ([{'path': '/echo', 'service': 'inocybe_jsonrpc.nope'}], 'does not have'),
+    ):
+        with Config(content) as filename:
+            try:
+                options.read_services(filename, 'path')
+            except ValueError as exc:
+                assert_in(message, str(exc))
+            else:
+                raise AssertionError('accepted {!r}'.format(content))
+    try:
+        options.read_services('/nonexistent/services.json', 'path')
+    except ValueError as exc:
+        assert_in('failed to read', str(exc))
+    else:
+        raise AssertionError('accepted a missing file')
+
+def test_create_services():
+    '''Test inocybe_jsonrpc.options.create_services() creates and configures each service, sharing
+       the worker pools
+    '''
+    with Config([
+            {'path': '/echo/', 'service': 'inocybe_jsonrpc.echo'},
+            {'path': '/math', 'service': 'inocybe_jsonrpc.math'},
+    ]) as filename:
+        services = create([
+            '--config', filename, '-w', '2', '--async-workers', '2', '--wait-max', '5',
+        ])
+    assert_equal([(path, type(service)) for (path, service) in services], [
+        ('/echo/', echo.Service), ('/math', math.Service),
+    ])
+    ((_, first), (_, second)) = services
+    assert_is(first.batch_executor, second.batch_executor)
+    assert_is(first.async_pool, second.async_pool)
+    assert_is_none(first.timeout_executor)
+    assert_equal((first.wait_max, second.wait_max), (5, 5))
+    first.batch_executor.shutdown()
+    first.async_pool.executor.shutdown()
+    [(path, service)] = create(['/echo', 'inocybe_jsonrpc.echo'])
+    assert_equal((path, type(service)), ('/echo', echo.Service))
+
+def test_create_services_bad():
+    '''Test inocybe_jsonrpc.options.create_services() reports a bad command line'''
+    with Config([{'path': '/echo', 'service': 'inocybe_jsonrpc.echo'}]) as filename:
+        raises(SystemExit)(create)(['--config', filename, '/echo', 'inocybe_jsonrpc.echo'])
+    with Config([{'path': 'http://host/echo', 'service': 'inocybe_jsonrpc.echo'}]) as filename:
+        raises(SystemExit)(create)(['--config', filename])
+    raises(SystemExit)(create)([])
+    raises(SystemExit)(create)(['/echo'])
+    raises(SystemExit)(create)(['/echo', 'inocybe_jsonrpc.echo', 'unwanted'])
+    create(['/aio', 'inocybe_jsonrpc.aio'])
+    raises(SystemExit)(create)(['/aio', 'inocybe_jsonrpc.aio'], asyncio=False)
@@ -0,0 +1,204 @@
+'''Test cases for inocybe_jsonrpc.pool.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+from argparse import ArgumentTypeError
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
+from threading import (Event, Lock)
+from time import (monotonic, sleep, time)
+
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_less
+from nose.tools import assert_true
+from nose.tools import raises
+
+from inocybe_jsonrpc.jsonrpc import Service as BaseService
+from inocybe_jsonrpc.pool import Pool
+
+def square(async_, value): ### pylint: disable=unused-argument
+    '''Return the square of `value` (picklable, for a process pool).'''
+    return value * value
+
+class Service(BaseService):
+    '''A service with slow asynchronous methods.'''
+    def __init__(self):
+        BaseService.__init__(self)
+        self.methods_async = {
+            'square': square,
+            'report': self.report,
+            'fail': self.fail,
+            'block': self.block,
+        }
+        self.release = Event()
+        self.lock = Lock()
+        self.running = 0
+        self.most = 0
+    def report(self, async_, value):
+        '''Report `value` through the handle.'''
+        self.result_async(async_, value)
+    @staticmethod
+    def fail(async_): ### pylint: disable=unused-argument
+        '''Fail.'''
+        raise RuntimeError('failed')
+    def block(self, async_):
+        '''Block until released, recording how many calls run at once.'''
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        self.release.wait()
+        with self.lock:
+            self.running -= 1
+        return True
+
+def call(service, method, params=(), async_=True, id_=1):
+    '''Invoke `method` asynchronously on `service` and return the Response.'''
+    return service.invoke_request({
+        'jsonrpc': '2.0', 'id': id_, 'method': method, 'params': list(params),
+        'metadata': {'async': async_},
+    })
+
+def collect(service, async_, timeout=5):
+    '''Poll `service` for handle `async_` until it completes, and return the Response.'''
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        response = call(service, 'nope', async_=async_)
+        if 'metadata' not in response:
+            return response
+        sleep(0.01)
+    raise AssertionError('call did not complete')
+
+def test_thread_pool():
+    '''Test inocybe_jsonrpc.jsonrpc.Service runs asynchronous calls on a thread pool'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(2))
+    for (method, params, expected) in (
+            ('square', [3], {'result': 9}),
+            ('report', ['foo'], {'result': 'foo'}),
+            ('fail', [], {'error': {'code': -32603, 'message': 'Internal error: failed'}}),
+    ):
+        async_ = call(service, method, params, async_=method)['metadata']['async']
+        assert_equal(async_, method)
+        expected.update({'jsonrpc': '2.0', 'id': 1})
+        assert_equal(collect(service, async_), expected)
+    assert_equal(call(service, 'square', [], async_='bad'), {'jsonrpc': '2.0', 'id': 1, 'error': {
+        'code': -32602, 'message': 'Invalid params',
+        'data': "missing a required argument: 'value'",
+    }})
+    assert_false('bad' in service.handles)
+    service.async_pool.executor.shutdown()
+
+def test_process_pool():
+    '''Test inocybe_jsonrpc.jsonrpc.Service runs asynchronous calls on a process pool'''
+    service = Service()
+    service.async_pool = Pool(ProcessPoolExecutor(2))
+    handles = [call(service, 'square', [_])['metadata']['async'] for _ in range(4)]
+    assert_equal([collect(service, _)['result'] for _ in handles], [0, 1, 4, 9])
+    service.async_pool.executor.shutdown()
+
+def test_returns_at_once():
+    '''Test inocybe_jsonrpc.jsonrpc.Service returns a pooled call handle at once'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(2))
+    response = call(service, 'block', async_='foo')
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 1, 'metadata': {'async': 'foo'}})
+    service.release.set()
+    assert_equal(collect(service, 'foo')['result'], True)
+    service.async_pool.executor.shutdown()
+
+def test_limit():
+    '''Test inocybe_jsonrpc.pool.Pool limits the calls of a method which run at once'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(8), {'block': 2})
+    handles = [call(service, 'block')['metadata']['async'] for _ in range(6)]
+    sleep(0.1)
+    assert_equal(service.async_pool.stats(), {'block': {'running': 2, 'pending': 4}})
+    service.release.set()
+    for handle in handles:
+        assert_equal(collect(service, handle)['result'], True)
+    assert_equal(service.most, 2)
+    assert_equal(service.async_pool.stats(), {})
+    service.async_pool.executor.shutdown()
+
+def test_limit_arg():
+    '''Test inocybe_jsonrpc.pool.Pool.limit_arg() parses METHOD=N'''
+    assert_equal(Pool.limit_arg('commit=2'), ('commit', 2))
+    assert_equal(Pool.limit_arg('a=b=3'), ('a=b', 3))
+    for bad in ('commit', 'commit=', '=2', 'commit=0', 'commit=x'):
+        raises(ArgumentTypeError)(lambda b=bad: Pool.limit_arg(b))()
+
+def test_wait():
+    '''Test inocybe_jsonrpc.jsonrpc.Service waits for a pooled call to complete'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(2))
+    service.wait_max = 30.0
+    response = service.invoke_request({
+        'jsonrpc': '2.0', 'id': 1, 'method': 'square', 'params': [3],
+        'metadata': {'async': True, 'wait': 5},
+    })
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 1, 'result': 9})
+    call(service, 'block', async_='foo')
+    start = monotonic()
+    response = service.invoke_request({
+        'jsonrpc': '2.0', 'id': 2, 'method': 'nope', 'metadata': {'async': 'foo', 'wait': 0.1},
+    })
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 2, 'metadata': {'async': 'foo'}})
+    assert_less(monotonic() - start, 1.0)
+    service.release.set()
+    response = service.invoke_request({
+        'jsonrpc': '2.0', 'id': 3, 'method': 'nope', 'metadata': {'async': 'foo', 'wait': 5},
+    })
+    assert_equal(response, {'jsonrpc': '2.0', 'id': 3, 'result': True})
+    service.async_pool.executor.shutdown()
+
+def test_drained():
+    '''Test inocybe_jsonrpc.jsonrpc.Service is drained once no pooled call is running'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(1))
+    call(service, 'block', async_='foo')
+    call(service, 'block', async_='bar')
+    service.draining = True
+    assert_false(service.drained())
+    service.release.set()
+    deadline = monotonic() + 5
+    while not service.drained() and monotonic() < deadline:
+        sleep(0.01)
+    assert_true(service.drained())
+    assert_equal(collect(service, 'foo'), {'jsonrpc': '2.0', 'id': 1, 'result': True})
+    service.async_pool.executor.shutdown()
+
+def test_deadline():
+    '''Test inocybe_jsonrpc.jsonrpc.Service abandons a pooled call at its submission deadline'''
+    service = Service()
+    service.async_pool = Pool(ThreadPoolExecutor(2))
+    service.timeouts = {'block': 0.2, 'nope': 60}
+    call(service, 'block', async_='foo')
+    sleep(0.1)
+    assert_equal(call(service, 'nope', async_='foo', id_=2)['metadata'], {'async': 'foo'})
+    sleep(0.15)
+    assert_equal(call(service, 'nope', async_='foo', id_=3), {
+        'jsonrpc': '2.0', 'id': 3, 'error': {'code': -32000, 'message': 'Timeout'},
+    })
+    assert_equal(service.handles.stats()['evicted'], 1)
+    call(service, 'block', async_='bar')
+    response = service.invoke_request({
+        'jsonrpc': '2.0', 'id': 4, 'method': 'nope',
+        'metadata': {'async': 'bar', 'deadline': time() - 1},
+    })
+    assert_equal(response['error'], {'code': -32000, 'message': 'Timeout'})
+    assert_false('bar' in service.handles)
+    service.release.set()
+    service.async_pool.executor.shutdown()
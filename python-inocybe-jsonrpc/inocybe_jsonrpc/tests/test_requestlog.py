@@ -0,0 +1,71 @@
+'''Test cases for inocybe_jsonrpc.requestlog.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+import logging
+
+from nose.tools import assert_equal
+from nose.tools import assert_true
+
+from inocybe_jsonrpc.math import Service
+from inocybe_jsonrpc.requestlog import RequestLog
+
+class Records(logging.Handler):
+    '''A logging handler which keeps the records it handles.'''
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+    def emit(self, record):
+        self.records.append(record)
+
+def run(level, requests, **kwargs):
+    '''Handle `requests` with a logging math service at `level`, and return the records.'''
+    records = Records()
+    logger = RequestLog.logger
+    logger.addHandler(records)
+    logger.setLevel(level)
+    try:
+        service = Service()
+        service.request_log = RequestLog(**kwargs)
+        for request in requests:
+            service.handle_request(json.dumps(request))
+    finally:
+        logger.removeHandler(records)
+        logger.setLevel(logging.NOTSET)
+    return records.records
+
+def test_info():
+    '''Test inocybe_jsonrpc.requestlog.RequestLog logs a structured record per request'''
+    (record,) = run(logging.INFO, [{'jsonrpc': '2.0', 'id': 7, 'method': 'add', 'params': [1, 2]}])
+    assert_equal((record.method, record.id, record.response_bytes), ('add', 7, 40))
+    assert_true(record.request_bytes > 0 and record.duration_ms >= 0)
+    assert_true(record.getMessage().startswith('add id=7 in='))
+
+def test_debug():
+    '''Test inocybe_jsonrpc.requestlog.RequestLog logs truncated payloads at DEBUG'''
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'max', 'params': list(range(100))}
+    records = run(logging.DEBUG, [request], payload_max=10)
+    assert_equal([_.levelno for _ in records], [logging.INFO, logging.DEBUG, logging.DEBUG])
+    response = '{"jsonrpc": "2.0", "id": 1, "result": 99}'
+    assert_equal(records[1].getMessage(), '> {"jsonrpc"... (%d bytes)' % len(json.dumps(request)))
+    assert_equal(records[2].getMessage(), '< {"jsonrpc"... (%d bytes)' % len(response))
+
+def test_gated():
+    '''Test inocybe_jsonrpc.requestlog.RequestLog logs nothing above INFO, and samples'''
+    request = {'jsonrpc': '2.0', 'id': 1, 'method': 'add', 'params': [1, 2]}
+    assert_equal(run(logging.WARNING, [request] * 3), [])
+    assert_equal(len(run(logging.INFO, [request] * 7, sample=3)), 3)
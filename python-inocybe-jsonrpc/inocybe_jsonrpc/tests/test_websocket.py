@@ -0,0 +1,186 @@
+'''Test cases for inocybe_jsonrpc.websocket.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+
+import asyncio
+import json
+import pickle
+import struct
+from multiprocessing import get_context
+from time import monotonic
+
+from nose.tools import assert_equal
+from nose.tools import assert_is_none
+from nose.tools import assert_less
+from nose.tools import raises
+
+from inocybe_jsonrpc import aio
+from inocybe_jsonrpc.echo import Service as EchoService
+from inocybe_jsonrpc.websocket import (PING, PONG, ProtocolError, Server, accept_key, connect)
+
+class SleepService(aio.Service):
+    '''A service with a coroutine method implementation.'''
+    def __init__(self):
+        aio.Service.__init__(self)
+        self.methods = {'sleep': self.sleep}
+    @staticmethod
+    async def sleep(seconds):
+        '''Sleep for `seconds`, then return them.'''
+        await asyncio.sleep(seconds)
+        return seconds
+
+def request(id_, method, params=None):
+    '''Return an encoded Request.'''
+    req = {'jsonrpc': '2.0', 'method': method}
+    if id_ is not None:
+        req['id'] = id_
+    if params is not None:
+        req['params'] = params
+    return json.dumps(req).encode()
+
+def run(client, services=(('/echo', EchoService()), ('/sleep/', SleepService()))):
+    '''Run coroutine function `client` with a :class:`Server` presenting `services` and the
+       (host, port) at which it is serving, and return its result.
+    '''
+    server = Server(services)
+    async def main():
+        '''Serve on an ephemeral port while the client runs.'''
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        server.start()
+        try:
+            return await client(server, listener.sockets[0].getsockname()[:2])
+        finally:
+            server.stop()
+            listener.close()
+    return asyncio.run(main())
+
+def test_accept_key():
+    '''Test inocybe_jsonrpc.websocket.accept_key() with the example from RFC 6455'''
+    assert_equal(accept_key(b'dGhlIHNhbXBsZSBub25jZQ=='), b's3pPLMBiTxaQ9kYGzzhZRbK+xOo=')
+
+def test_round_trip():
+    '''Test inocybe_jsonrpc.websocket.Server answers Requests, but not notifications'''
+    async def client(_, address):
+        '''Call echo, send a notification, then call echo with a large message.'''
+        conn = await connect(*address, path='/echo/')
+        await conn.send(request(1, 'echo', ['foo']))
+        first = json.loads((await conn.recv()).decode())
+        await conn.send(request(None, 'echo', ['bar']))
+        big = 'x' * 100000
+        await conn.send(request(2, 'echo', [big]))
+        second = json.loads((await conn.recv()).decode())
+        await conn.close()
+        closed = await conn.recv()
+        return (first, second, closed)
+    (first, second, closed) = run(client)
+    assert_equal(first, {'jsonrpc': '2.0', 'id': 1, 'result': ['foo']})
+    assert_equal(second['id'], 2)
+    assert_equal(len(second['result'][0]), 100000)
+    assert_is_none(closed)
+
+def test_concurrent():
+    '''Test inocybe_jsonrpc.websocket.Server handles Requests on one connection concurrently'''
+    async def client(_, address):
+        '''Make many calls of decreasing duration at once.'''
+        conn = await connect(*address, path='/sleep')
+        start = monotonic()
+        for id_ in range(10):
+            await conn.send(request(id_, 'sleep', [0.5 - id_ * 0.04]))
+        ids = [json.loads((await conn.recv()).decode())['id'] for _ in range(10)]
+        elapsed = monotonic() - start
+        await conn.close()
+        return (ids, elapsed)
+    (ids, elapsed) = run(client)
+    assert_equal(ids, list(reversed(range(10))))
+    assert_less(elapsed, 1.0)
+
+def test_notify():
+    '''Test inocybe_jsonrpc.websocket.Server pushes notifications to clients at a path'''
+    async def client(server, address):
+        '''Connect two clients, at different paths, and push a notification to one path.'''
+        (echo, sleep) = (await connect(*address, path='/echo'), await connect(*address, '/sleep'))
+        ### make sure both connections are established
+        for conn in (echo, sleep):
+            await conn.send(request(0, 'echo' if conn is echo else 'sleep', [0]))
+            await conn.recv()
+        server.notifier('/sleep')('changed', {'path': 'if/interfaces'})
+        pushed = json.loads((await sleep.recv()).decode())
+        await echo.send(request(1, 'echo', []))
+        answered = json.loads((await echo.recv()).decode())
+        for conn in (echo, sleep):
+            await conn.close()
+        return (pushed, answered)
+    (pushed, answered) = run(client)
+    assert_equal(pushed, {'jsonrpc': '2.0', 'method': 'changed', 'params': {'path': 'if/interfaces'}})
+    assert_equal(answered['id'], 1)
+
+def test_notify_forked():
+    '''Test inocybe_jsonrpc.websocket.Notifier pushes notifications from forked processes'''
+    async def client(server, address):
+        '''Connect a client, then push notifications from a forked process and a pickled notifier.'''
+        conn = await connect(*address, path='/echo')
+        await conn.send(request(0, 'echo', [0]))
+        await conn.recv()
+        notifier = server.notifier('/echo/')
+        context = get_context('fork')
+        for (target, args) in ((notifier, ('forked', [1])),
+                               (pickle.loads(pickle.dumps(notifier)), ('pickled', [2]))):
+            process = context.Process(target=target, args=args)
+            process.start()
+            process.join(5)
+        pushed = [json.loads((await conn.recv()).decode()) for _ in range(2)]
+        await conn.close()
+        return pushed
+    assert_equal(run(client), [
+        {'jsonrpc': '2.0', 'method': 'forked', 'params': [1]},
+        {'jsonrpc': '2.0', 'method': 'pickled', 'params': [2]},
+    ])
+
+def test_notify_dropped():
+    '''Test inocybe_jsonrpc.websocket.Notifier drops a notification while the server is stopped'''
+    notifier = pickle.loads(pickle.dumps(Server([('/echo', EchoService())]).notifier('/echo')))
+    assert_equal(notifier('changed'), False)
+    assert_equal(notifier.dropped, 1)
+
+def test_ping():
+    '''Test inocybe_jsonrpc.websocket.Server answers a ping with a pong'''
+    async def client(_, address):
+        '''Send a ping and read the pong.'''
+        conn = await connect(*address, path='/echo')
+        conn.writer.writelines(conn.frame(b'hello', PING))
+        frame = await conn.read_frame()
+        await conn.close()
+        return frame
+    assert_equal(run(client), (True, PONG, b'hello'))
+
+@raises(ProtocolError)
+def test_not_found():
+    '''Test inocybe_jsonrpc.websocket.connect() fails for a path with no service'''
+    async def client(_, address):
+        '''Connect to a bad path.'''
+        await connect(*address, path='/bad')
+    run(client)
+
+def test_unmasked():
+    '''Test inocybe_jsonrpc.websocket.Server closes a connection sending unmasked frames'''
+    async def client(_, address):
+        '''Send an unmasked frame, and read the close frame.'''
+        conn = await connect(*address, path='/echo')
+        conn.writer.write(struct.pack('!BB', 0x81, 2) + b'{}')
+        return await conn.read_frame()
+    (_, opcode, payload) = run(client)
+    assert_equal((opcode, struct.unpack('!H', payload)[0]), (0x8, 1002))
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A minimal `WebSocket`_ transport for `JSON-RPC 2.0`_ services, under :mod:`asyncio`.
+
+   A :class:`Server` presents services at URL paths. Each connection is full duplex: Requests are
+   handled concurrently, up to a cap per connection, and each Response is sent as soon as it is
+   ready, so Responses may be sent out of order. The server may also push notifications to the
+   clients connected at a path, on the same connection (see :meth:`Server.notify`), including
+   notifications sent from other threads or from processes forked from the server's (see
+   :class:`Notifier`).
+
+   Each text or binary message is one encoded Request (or Batch), and each Response is sent as a
+   text message. No message is sent where there is no Response (for a notification).
+
+   Only the parts of the WebSocket protocol needed to carry JSON-RPC 2.0 are implemented: no
+   extensions or subprotocols. A :class:`Connection` may be opened as a client with
+   :func:`connect`, for testing.
+
+   .. _WebSocket: https://tools.ietf.org/html/rfc6455
+   .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
+'''
+
+import asyncio
+import logging
+import os
+import socket
+import struct
+
+from base64 import b64encode
+from hashlib import sha1
+from itertools import count
+from tempfile import gettempdir
+
+from inocybe_jsonrpc.aio import Service as AsyncService
+from inocybe_jsonrpc.codec import Codec
+
+### the GUID with which a server accepts the key of an opening handshake
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+(CONTINUATION, TEXT, BINARY, CLOSE, PING, PONG) = (0x0, 0x1, 0x2, 0x8, 0x9, 0xa)
+
+### close status codes
+(NORMAL, GOING_AWAY, PROTOCOL_ERROR, TOO_BIG) = (1000, 1001, 1002, 1009)
+
+### the largest datagram read from the notification inbox of a server (see :class:`Notifier`)
+INBOX_DATAGRAM_MAX = 1 << 20
+
+def accept_key(key):
+    '''Return the Sec-WebSocket-Accept value for Sec-WebSocket-Key value `key` (bytes).'''
+    return b64encode(sha1(key.strip() + GUID).digest())
+
+def mask(data, key):
+    '''Return bytes `data` masked (or unmasked) with 4 byte masking key `key`.'''
+    length = len(data)
+    if not length:
+        return data
+    key = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+class ProtocolError(Exception):
+    '''A violation of the WebSocket protocol, to be closed with status `code`.'''
+    def __init__(self, message, code=PROTOCOL_ERROR):
+        Exception.__init__(self, message)
+        self.code = code
+
+class Connection(object):
+    '''A WebSocket connection over :mod:`asyncio` streams `reader` and `writer`.
+
+       A client connection masks the frames it sends and a server connection requires the frames
+       it receives to be masked. A message of more than `message_max` bytes is refused.
+
+       Once the peer closes the connection, :meth:`recv` returns None; the owner of the connection
+       should then send any messages it owes the peer and :meth:`close` the connection.
+    '''
+    def __init__(self, reader, writer, client=False, message_max=64 << 20):
+        self.reader = reader
+        self.writer = writer
+        self.client = client
+        self.message_max = message_max
+        ### whether a close frame has been sent
+        self.closed = False
+    async def recv(self):
+        '''Return the payload of the next text or binary message, answering any ping, or None once
+           the peer closes the connection. Raise :exc:`ProtocolError` if the peer violates the
+           protocol.
+        '''
+        (message, size) = ([], 0)
+        while True:
+            try:
+                (fin, opcode, payload) = await self.read_frame()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if opcode >= CLOSE:
+                if not fin:
+                    raise ProtocolError('fragmented control frame')
+                if opcode == PING and not self.closed:
+                    ### written straight away, without waiting on any message being sent
+                    self.writer.writelines(self.frame(payload, PONG))
+                elif opcode == CLOSE:
+                    return None
+                continue
+            if (opcode == CONTINUATION) != bool(message):
+                raise ProtocolError('unexpected continuation' if message else 'missing continuation')
+            if opcode not in (CONTINUATION, TEXT, BINARY):
+                raise ProtocolError('unknown opcode {}'.format(opcode))
+            size += len(payload)
+            if size > self.message_max:
+                raise ProtocolError('message exceeds {} bytes'.format(self.message_max), TOO_BIG)
+            message.append(payload)
+            if fin:
+                return message[0] if len(message) == 1 else b''.join(message)
+    async def read_frame(self):
+        '''Return the next frame as a 3-tuple of FIN bit, opcode and unmasked payload.'''
+        reader = self.reader
+        (first, second) = await reader.readexactly(2)
+        if first & 0x70:
+            raise ProtocolError('reserved bits set')
+        length = second & 0x7f
+        if length == 126:
+            (length,) = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack('!Q', await reader.readexactly(8))
+        if length > self.message_max:
+            raise ProtocolError('message exceeds {} bytes'.format(self.message_max), TOO_BIG)
+        if bool(second & 0x80) == self.client:
+            raise ProtocolError('frame is masked' if self.client else 'frame is not masked')
+        key = None if self.client else await reader.readexactly(4)
+        payload = await reader.readexactly(length)
+        return (bool(first & 0x80), first & 0x0f, payload if key is None else mask(payload, key))
+    async def send(self, payload, opcode=TEXT):
+        '''Send bytes `payload` as one message (or control frame) of `opcode`. Raise
+           :exc:`ConnectionError` if the connection is closed.
+        '''
+        if self.closed:
+            raise ConnectionResetError('connection closed')
+        self.writer.writelines(self.frame(payload, opcode))
+        await self.writer.drain()
+    def frame(self, payload, opcode):
+        '''Return bytes `payload` framed as one message of `opcode`, as a (header, payload) pair.'''
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        if self.client:
+            key = os.urandom(4)
+            return (header[:1] + bytes((header[1] | 0x80,)) + header[2:] + key, mask(payload, key))
+        return (header, payload)
+    async def close(self, code=NORMAL):
+        '''Send a close frame with status `code`, if one has not already been sent.'''
+        if self.closed:
+            return
+        try:
+            await self.send(struct.pack('!H', code), CLOSE)
+        except ConnectionError:
+            pass
+        self.closed = True
+
+async def connect(host, port, path='/'):
+    '''Open a client :class:`Connection` to the WebSocket server at `host`, `port` and `path`.
+       Raise :exc:`ProtocolError` if the server refuses the opening handshake.
+    '''
+    (reader, writer) = await asyncio.open_connection(host, port)
+    key = b64encode(os.urandom(16))
+    writer.write(b''.join((
+        'GET {} HTTP/1.1\r\nHost: {}:{}\r\n'.format(path, host, port).encode('utf-8'),
+        b'Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Version: 13\r\n',
+        b'Sec-WebSocket-Key: ' + key + b'\r\n\r\n',
+    )))
+    (status, headers) = await read_head(reader)
+    if status.split()[1:2] != [b'101'] or headers.get(b'sec-websocket-accept') != accept_key(key):
+        writer.close()
+        raise ProtocolError('handshake refused: {}'.format(status.decode('latin-1')))
+    return Connection(reader, writer, client=True)
+
+async def read_head(reader, limit=100):
+    '''Return the first line and a dict of the headers (with lower case names) of an HTTP message
+       head read from `reader`.
+    '''
+    first = (await reader.readline()).rstrip()
+    headers = {}
+    for _ in range(limit):
+        line = (await reader.readline()).rstrip()
+        if not line:
+            return (first, headers)
+        (name, _, value) = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+    raise ProtocolError('too many headers')
+
+class Server(object):
+    '''Present services at URL paths over WebSocket, from the list of (path, service) pairs
+       `services`, handling up to `in_flight` Requests at once on each connection.
+
+       A service derived from :class:`inocybe_jsonrpc.aio.Service` is driven on the event loop, so
+       its coroutine methods run concurrently. Any other service is driven on the event loop's
+       default executor, so must then be thread safe.
+
+       Each connection has an outbox of up to `outbox_max` messages, sent in turn. A Response waits
+       for room in the outbox, so a client which does not read its Responses is sent no more
+       Requests' worth of work than its cap, but a notification is dropped for a client whose
+       outbox is full, so a slow client cannot hold up others.
+
+       While started (see :meth:`start`), the server reads notifications sent by a
+       :class:`Notifier` from another process on an inbox, a Unix datagram socket bound at
+       :attr:`address`.
+    '''
+    codec = Codec
+    _inboxes = count()
+    def __init__(self, services, in_flight=64, outbox_max=256):
+        self.services = dict((k.rstrip('/'), v) for (k, v) in services)
+        self.in_flight = in_flight
+        self.outbox_max = outbox_max
+        ### path -> set of outboxes of the connections at that path
+        self.clients = dict((path, set()) for path in self.services)
+        self.loop = None
+        self.address = os.path.join(gettempdir(), 'inocybe-jsonrpc-ws-{}-{}'.format(
+            os.getpid(), next(self._inboxes)
+        ))
+        self._inbox = None
+    def start(self):
+        '''Start the server on the running event loop: bind the inbox at :attr:`address` and read
+           notifications from it. Call :meth:`stop` once done.
+        '''
+        self.loop = asyncio.get_running_loop()
+        inbox = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+        inbox.bind(self.address)
+        inbox.setblocking(False)
+        self._inbox = inbox
+        self.loop.add_reader(inbox.fileno(), self._received)
+    def stop(self):
+        '''Stop reading notifications from the inbox, and remove it.'''
+        if self._inbox is None:
+            return
+        self.loop.remove_reader(self._inbox.fileno())
+        self._inbox.close()
+        self._inbox = None
+        try:
+            os.unlink(self.address)
+        except FileNotFoundError:
+            pass
+    def _received(self):
+        '''Push each notification waiting in the inbox, each datagram being the path, a space and
+           the encoded notification.
+        '''
+        while True:
+            try:
+                datagram = self._inbox.recv(INBOX_DATAGRAM_MAX)
+            except (BlockingIOError, InterruptedError):
+                return
+            (path, _, message) = datagram.partition(b' ')
+            path = path.decode('utf-8')
+            if path in self.clients:
+                self.push(path, message)
+    async def handle(self, reader, writer):
+        '''Handle a client connected on :mod:`asyncio` streams `reader` and `writer`.'''
+        try:
+            path = await self.handshake(reader, writer)
+        except (ProtocolError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            writer.close()
+            return
+        if path is None:
+            writer.close()
+            return
+        conn = Connection(reader, writer)
+        outbox = asyncio.Queue(self.outbox_max)
+        sender = asyncio.ensure_future(self.send_all(conn, outbox))
+        self.clients[path].add(outbox)
+        try:
+            try:
+                await self.receive_all(conn, self.services[path], outbox)
+                code = NORMAL
+            except ProtocolError as exc:
+                logging.warning('closing connection: %s', exc)
+                code = exc.code
+            ### close once the Responses to all the Requests received have been sent
+            await outbox.put((code, CLOSE))
+            await sender
+        finally:
+            self.clients[path].discard(outbox)
+            sender.cancel()
+            writer.close()
+    async def handshake(self, reader, writer):
+        '''Read the opening handshake of a client from `reader`, and reply on `writer`. Return the
+           service path, or None if the handshake was refused.
+        '''
+        (request, headers) = await read_head(reader)
+        try:
+            (method, target, _) = request.decode('latin-1').split()
+        except ValueError:
+            return self.refuse(writer, 400, 'Bad Request')
+        path = target.partition('?')[0].rstrip('/')
+        if method != 'GET':
+            return self.refuse(writer, 405, 'Method Not Allowed')
+        if path not in self.services:
+            return self.refuse(writer, 404, 'Not Found')
+        key = headers.get(b'sec-websocket-key')
+        if (headers.get(b'upgrade', b'').lower() != b'websocket' or
+                b'upgrade' not in headers.get(b'connection', b'').lower() or
+                headers.get(b'sec-websocket-version') != b'13' or not key):
+            return self.refuse(writer, 400, 'Bad Request')
+        writer.write(b''.join((
+            b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n',
+            b'Sec-WebSocket-Accept: ' + accept_key(key) + b'\r\n\r\n',
+        )))
+        await writer.drain()
+        return path
+    @staticmethod
+    def refuse(writer, status, reason):
+        '''Refuse an opening handshake on `writer` with HTTP `status` and `reason`.'''
+        writer.write('HTTP/1.1 {} {}\r\nContent-Length: 0\r\n\r\n'.format(status, reason).encode())
+        return None
+    async def receive_all(self, conn, service, outbox):
+        '''Handle each Request received on `conn` with `service`, putting each Response in
+           `outbox`, with up to :attr:`in_flight` Requests at once, until the connection closes.
+        '''
+        slots = asyncio.Semaphore(self.in_flight)
+        tasks = set()
+        def done(task):
+            '''Free the slot of a completed Request, logging any failure.'''
+            tasks.discard(task)
+            slots.release()
+            if not task.cancelled() and task.exception() is not None:
+                logging.error('failed to handle request', exc_info=task.exception())
+        try:
+            while True:
+                await slots.acquire()
+                message = await conn.recv()
+                if message is None:
+                    slots.release()
+                    break
+                task = asyncio.ensure_future(self.respond(service, message, outbox))
+                tasks.add(task)
+                task.add_done_callback(done)
+            if tasks:
+                await asyncio.wait(tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+    async def respond(self, service, message, outbox):
+        '''Handle Request `message` with `service`, putting the Response, if any, in `outbox`.'''
+        if isinstance(service, AsyncService):
+            output = await service.handle_bytes_async(message)
+        else:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(None, service.handle_bytes, message)
+        if output is not None:
+            await outbox.put((output, TEXT))
+    @staticmethod
+    async def send_all(conn, outbox):
+        '''Send each message put in `outbox` on `conn`, until a close frame is sent.'''
+        while True:
+            (payload, opcode) = await outbox.get()
+            try:
+                if opcode == CLOSE:
+                    await conn.close(payload)
+                    return
+                await conn.send(payload, opcode)
+            except ConnectionError:
+                conn.closed = True
+    def notify(self, path, method, params=None):
+        '''Push a notification of `method` with `params` to every client connected at `path`.
+           Drop the notification for a client whose outbox is full. Call this from the event loop;
+           from another thread, use :meth:`notify_threadsafe`, and from another process, a
+           :class:`Notifier`.
+        '''
+        request = {'jsonrpc': '2.0', 'method': method}
+        if params is not None:
+            request['params'] = params
+        self.push(path.rstrip('/'), self.codec.encode(request))
+    def push(self, path, message):
+        '''Push encoded notification `message` to every client connected at `path` (without a
+           trailing slash), dropping it for a client whose outbox is full.
+        '''
+        for outbox in self.clients[path]:
+            try:
+                outbox.put_nowait((message, TEXT))
+            except asyncio.QueueFull:
+                logging.warning('dropped a notification for a slow client')
+    def notify_threadsafe(self, path, method, params=None):
+        '''As :meth:`notify`, for use from another thread of this process once the server is
+           serving.
+        '''
+        self.loop.call_soon_threadsafe(self.notify, path, method, params)
+    def notifier(self, path):
+        '''Return a :class:`Notifier` which pushes notifications to every client connected at
+           `path`, from any thread or forked process, as a notify callback (for example for
+           :class:`inocybe_openswitch.event_listener.Listener`).
+        '''
+        return Notifier(self, path)
+    async def serve(self, host, port):
+        '''Serve WebSocket connections at `host` and `port` until cancelled.'''
+        self.start()
+        try:
+            server = await asyncio.start_server(self.handle, host, port)
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop()
+
+class Notifier(object):
+    '''Push notifications to every client connected at `path` of :class:`Server` `server`, from
+       any thread of the process running the server, or from any process forked from it (such as
+       the handler processes of an :class:`inocybe_openswitch.event_listener.Listener`), or to
+       which the notifier is pickled. A notifier may be called as a function of (`method`,
+       `params`), so may be passed as a notify callback.
+
+       In the server's process, a notification is handed to the event loop. In another process,
+       it is sent as a datagram to the server's inbox (see :meth:`Server.start`), without
+       blocking: a notification is dropped (and counted in :attr:`dropped`, per process) if the
+       server is not serving, if its inbox is full because it has fallen behind, or if it is
+       too large for a datagram (about 200KB, with the default socket buffer size on Linux).
+    '''
+    def __init__(self, server, path):
+        self.path = path.rstrip('/')
+        self.address = server.address
+        self.codec = server.codec
+        self.dropped = 0
+        self._server = server
+        self._pid = os.getpid()
+        self._sock = None
+        self._sock_pid = None
+    def __getstate__(self):
+        '''Return the state with which to recreate the notifier in another process, as a client
+           of the server's inbox.
+        '''
+        return {
+            'path': self.path,
+            'address': self.address,
+            'codec': self.codec,
+            'dropped': 0,
+            '_server': None,
+            '_pid': None,
+            '_sock': None,
+            '_sock_pid': None,
+        }
+    def __call__(self, method, params=None):
+        return self.notify(method, params)
+    def notify(self, method, params=None):
+        '''Push a notification of `method` with `params`, without blocking. Return True if the
+           notification was queued, or False if it was dropped.
+        '''
+        if os.getpid() == self._pid:
+            if self._server.loop is None:
+                self.dropped += 1
+                return False
+            self._server.notify_threadsafe(self.path, method, params)
+            return True
+        request = {'jsonrpc': '2.0', 'method': method}
+        if params is not None:
+            request['params'] = params
+        datagram = self.path.encode('utf-8') + b' ' + self.codec.encode(request)
+        try:
+            self._socket().sendto(datagram, self.address)
+        except OSError:
+            self.dropped += 1
+            return False
+        return True
+    def _socket(self):
+        '''Return the socket of the calling process on which to send datagrams to the inbox,
+           creating it if need be.
+        '''
+        pid = os.getpid()
+        if self._sock_pid != pid:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+            self._sock_pid = pid
+        return self._sock
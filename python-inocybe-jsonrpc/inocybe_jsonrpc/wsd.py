@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A command line tool for running JSON-RPC 2.0 services over WebSocket.
+
+   Each service is presented at a URL path, and each connection is full duplex: many Requests may
+   be in flight at once on one connection, and Responses are sent as they are ready. A service
+   derived from :class:`inocybe_jsonrpc.aio.Service` is driven on the event loop; any other service
+   is driven on a pool of as many threads as the cap on Requests in flight per connection, so must
+   then be thread safe. See :mod:`inocybe_jsonrpc.websocket`.
+
+   Many services may be presented at once, each at its own URL path, listed in a JSON file given
+   with the --config option (see :func:`inocybe_jsonrpc.options.read_services`).
+
+   A source of notifications may be attached to a path with the --notify PATH=SOURCE option (which
+   may be repeated), SOURCE naming a Python callable as module.attribute. Once the server has
+   started, SOURCE is called from the event loop with a :class:`inocybe_jsonrpc.websocket.Notifier`
+   for PATH, which it may call from any thread or forked process to push a notification to the
+   clients connected at PATH. SOURCE must return promptly, starting any threads or processes of its
+   own; for example, a function which starts an
+   :class:`inocybe_openswitch.event_listener.Listener` with the notifier as its notify callback.
+'''
+
+import asyncio
+import logging
+import signal
+import sys
+
+from argparse import (ArgumentParser, ArgumentTypeError)
+from concurrent.futures import ThreadPoolExecutor
+
+from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc import options
+from inocybe_jsonrpc.aio import Service as AsyncService
+from inocybe_jsonrpc.httpd import url_path
+from inocybe_jsonrpc.websocket import Server
+
+def notify_arg(string):
+    '''Return a 2-tuple (path, source) from command line arg `string` of the form PATH=SOURCE,
+       SOURCE naming a callable. If `string` is not of this form, raise :class:`ArgumentTypeError`.
+    '''
+    (path, _, source) = string.partition('=')
+    if not path or not source:
+        raise ArgumentTypeError('bad notification source (expected PATH=SOURCE): ' + string)
+    source = ArgModuleAttribute()(source)
+    if not callable(source):
+        raise ArgumentTypeError('notification source is not callable: ' + string)
+    return (url_path(path).rstrip('/'), source)
+
+async def run(server, host, port, threads, sources=()):
+    '''Serve WebSocket connections to `server` at `host` and `port`, driving services which are not
+       :mod:`asyncio` services on a pool of `threads` threads. Once the server has started, call
+       each notification source in the list of (path, source) pairs `sources` with a notifier for
+       its path.
+    '''
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(threads))
+    serving = asyncio.ensure_future(server.serve(host, port))
+    for (path, source) in sources:
+        ### scheduled after the first step of serving, which starts the server
+        loop.call_soon(source, server.notifier(path))
+    await serving
+
+def main():
+    '''Run JSON-RPC 2.0 services over WebSocket.'''
+    logging.basicConfig(level=logging.INFO)
+    aparser = ArgumentParser(description=main.__doc__)
+    aparser.add_argument('-b', '--bind', default='')
+    aparser.add_argument('-p', '--port', default=8080, type=int)
+    aparser.add_argument('--in-flight', default=64, type=int, help=' '.join((
+        'the maximum number of Requests to handle at once on each connection',
+    )))
+    aparser.add_argument('-c', '--config', help=' '.join((
+        'a JSON file listing the services to present, each with a "path", a "service" and',
+        'optional "args", instead of `path`, `service` and `args`',
+    )))
+    aparser.add_argument('--notify', action='append', default=[], type=notify_arg,
+                         metavar='PATH=SOURCE', help=' '.join((
+                             'a callable, as module.attribute, to call with a notifier for PATH',
+                             'once the server has started, so that it may push notifications to',
+                             'the clients connected at PATH (may be repeated)',
+                         )))
+    options.add_arguments(aparser)
+    aparser.add_argument('path', nargs='?', type=url_path, help=' '.join((
+        'the URL path at which to present `service`',
+    )))
+    aparser.add_argument('service', nargs='?', type=ArgModuleAttribute('Service'), help=', '.join((
+        'the service to invoke for any message on a connection to `path`',
+        'specified as a Python class implementing inocybe_jsonrpc.jsonrpc.Service',
+        'or a Python module with a Service attribute',
+    )))
+    aparser.add_argument('args', nargs='*', help='string args to create `service` instance with')
+    args = vars(aparser.parse_args())
+    if args['in_flight'] < 1:
+        aparser.error('--in-flight must be at least 1')
+    services = options.create_services(aparser, args, 'path', url_path)
+    server = Server(services, args['in_flight'])
+    for (path, _) in args['notify']:
+        if path not in server.services:
+            aparser.error('no service at notification path {}'.format(path))
+    threads = args['in_flight']
+    if all(isinstance(service, AsyncService) for (_, service) in services):
+        threads = 1
+    ### exit on SIGTERM, cancelling the server so that it stops cleanly; unlike a handler added to
+    ### the event loop, this also stops any process forked by a notification source
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    try:
+        asyncio.run(run(server, args['bind'] or None, args['port'], threads, args['notify']))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
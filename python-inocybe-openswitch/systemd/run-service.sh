@@ -5,9 +5,28 @@ PYTHONPATH=/usr/lib/opx:/usr/lib/x86_64-linux-gnu/opx:/opt/pycnoporus/python3-in
 export LD_LIBRARY_PATH
 export PYTHONPATH
 
-setsid python -minocybe_zmq.jsonrpc zmq://0.0.0.0:4569/ inocybe_openswitch.openswitch_data.Service >/dev/null 2>&1 &
-setsid python -minocybe_zmq.jsonrpc zmq://0.0.0.0:4570/ inocybe_openswitch.openswitch_rpc.Service >/dev/null 2>&1 &
+PIDFILE=/run/inocybe-cpsjsonrpc.pid
 
-cd /opt/pycnoporus/python3-inocybe-openswitch/models/
+# If a gateway is already running, this is a restart: hand its endpoints over to the new one.
+OLD=$(cat $PIDFILE 2>/dev/null)
+if [ -n "$OLD" ] && ! kill -0 "$OLD" 2>/dev/null; then
+    OLD=
+fi
 
-setsid python -minocybe_zmq.jsonrpc zmq://0.0.0.0:4568/ inocybe_yang.library.Service >/dev/null 2>&1 &
+setsid python -minocybe_zmq.jsonrpc --reuse-port --pid-file $PIDFILE --config /opt/pycnoporus/python3-inocybe-openswitch/systemd/services.json >/dev/null 2>&1 &
+
+if [ -n "$OLD" ]; then
+    # the new gateway writes the pid file once bound: until then, leave the old one serving
+    TRIES=0
+    while [ "$(cat $PIDFILE 2>/dev/null)" = "$OLD" ] && [ $TRIES -lt 120 ]; do
+        sleep 0.5
+        TRIES=$((TRIES + 1))
+    done
+    # the old gateway drains, then exits: but only once a new gateway has taken over
+    NEW=$(cat $PIDFILE 2>/dev/null)
+    if [ -z "$NEW" ] || [ "$NEW" = "$OLD" ] || ! kill -0 "$NEW" 2>/dev/null; then
+        echo "$0: new gateway did not start, leaving gateway $OLD serving" >&2
+        exit 1
+    fi
+    kill -TERM "$OLD"
+fi
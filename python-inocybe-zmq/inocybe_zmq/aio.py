@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A command line tool for running a JSON-RPC 2.0 service on a ZMQ ROUTER socket under
+   :mod:`asyncio`.
+
+   Many Requests are handled at once, and each Response is sent as soon as it is ready, using the
+   routing envelope of its Request, so Responses may be sent out of order. The number of Requests
+   in flight at once is capped; beyond the cap, no more Requests are received until one completes.
+
+   A service derived from :class:`inocybe_jsonrpc.aio.Service` is driven on the event loop, so its
+   coroutine methods run concurrently. Any other service is driven on a pool of as many threads as
+   the cap on Requests in flight, so must then be thread safe.
+
+   No reply is sent where there is no Response (for a notification), so a REQ client must not send
+   notifications; a DEALER client may.
+'''
+
+import asyncio
+import logging
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+import zmq
+import zmq.asyncio
+from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc import options
+from inocybe_jsonrpc.aio import Service as AsyncService
+
+from inocybe_zmq.jsonrpc import zmq_uri
+
+async def respond(sock, service, frames):
+    '''Handle the multipart message `frames` received on ROUTER socket `sock` with `service`, and
+       send the reply, if any.
+    '''
+    (envelope, input_) = (frames[:-1], frames[-1])
+    if isinstance(service, AsyncService):
+        output = await service.handle_bytes_async(input_)
+    else:
+        loop = asyncio.get_running_loop()
+        output = await loop.run_in_executor(None, service.handle_bytes, input_)
+    if output is not None:
+        await sock.send_multipart(envelope + [output])
+
+async def serve(sock, service, in_flight):
+    '''Handle Requests received on ROUTER socket `sock` with `service`, with up to `in_flight`
+       Requests in flight at once.
+    '''
+    slots = asyncio.Semaphore(in_flight)
+    tasks = set()
+    def done(task):
+        '''Free the slot of a completed Request, logging any failure.'''
+        tasks.discard(task)
+        slots.release()
+        if not task.cancelled() and task.exception() is not None:
+            logging.error('failed to handle request', exc_info=task.exception())
+    while True:
+        await slots.acquire()
+        frames = await sock.recv_multipart()
+        task = asyncio.ensure_future(respond(sock, service, frames))
+        tasks.add(task)
+        task.add_done_callback(done)
+
+async def run(uri, service, in_flight):
+    '''Bind a ROUTER socket at `uri` and serve Requests on it with `service`.'''
+    if not isinstance(service, AsyncService):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(in_flight))
+    context = zmq.asyncio.Context()
+    sock = context.socket(zmq.ROUTER) # pylint: disable=no-member
+    sock.bind(uri)
+    try:
+        await serve(sock, service, in_flight)
+    finally:
+        sock.close(linger=0)
+
+def main():
+    '''Run a JSON-RPC 2.0 service on a ZMQ ROUTER socket, handling many Requests at once.'''
+    logging.basicConfig(level=logging.INFO)
+    aparser = ArgumentParser(description=main.__doc__)
+    options.add_arguments(aparser)
+    aparser.add_argument('--in-flight', default=64, type=int, help=' '.join((
+        'the maximum number of Requests to handle at once',
+    )))
+    aparser.add_argument('uri', type=zmq_uri, help='the URI at which to bind a ZMQ ROUTER socket')
+    aparser.add_argument('service', type=ArgModuleAttribute('Service'), help=', '.join((
+        'the service to run on the socket',
+        'specified as a Python class implementing inocybe_jsonrpc.jsonrpc.Service',
+        'or a Python module with a Service attribute',
+    )))
+    aparser.add_argument('args', nargs='*', help='string args to create `service` instance with')
+    args = vars(aparser.parse_args())
+    if args['in_flight'] < 1:
+        aparser.error('--in-flight must be at least 1')
+    try:
+        service = args['service'](*args['args'])
+    except TypeError as exc:
+        aparser.error('failed to create service instance, ' + str(exc))
+    options.configure(service, args)
+    try:
+        asyncio.run(run(args['uri'], service, args['in_flight']))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -14,16 +14,80 @@
 # permissions and limitations under the License.
 
 
-'''A command line tool for running a JSON-RPC 2.0 service on a ZMQ REP socket.'''
+'''A command line tool for running a JSON-RPC 2.0 service on a ZMQ socket.
+
+   The service may be run on one of several types of socket, chosen with the --mode option:
+
+   * 'rep', a REP socket, for REQ clients. A REP socket must reply to every message, so an empty
+     message is sent where there is no Response (for a notification).
+   * 'router', a ROUTER socket, for REQ or DEALER clients. No reply is sent where there is no
+     Response, so a DEALER client may send notifications without waiting.
+   * 'pull', a PULL socket, for PUSH clients. No reply is ever sent, so this suits high rate
+     notifications.
+
+   By default Requests are handled one at a time. With the --workers option, the 'rep' or 'router'
+   socket is instead run as a broker, handing each Request to the least recently used of a number
+   of workers, each handling one Request at a time. Workers are threads sharing one service
+   instance, which must then be thread safe, or (with --worker-processes) processes each with
+   their own service instance. Note that asynchronous call handles are not shared between worker
+   processes, so a client may only collect an asynchronous call if it is routed to the same
+   worker; use worker threads for services with asynchronous methods.
+
+   With the --queue-max option, the 'rep' or 'router' socket is run as a broker (with one worker
+   thread, if --workers is not given), which queues at most that many Requests while no worker is
+   idle. Beyond that, a Request is shed: it is answered at once with a server busy Error, without
+   being invoked. The queue depth and the number shed are reported by 'rpc.stats', unless the
+   workers are processes.
+
+   Many services may be run in one process, each on its own socket of the same mode, listed in a
+   JSON file given with the --config option (see :func:`inocybe_jsonrpc.options.read_services`).
+   The sockets are polled together and Requests handled one at a time.
+
+   As Requests are handled one at a time (or one per worker), a client's 'wait' for an
+   asynchronous call blocks the socket (or a worker) for its duration, so is not honoured unless
+   --wait-max is given (see :attr:`inocybe_jsonrpc.jsonrpc.Service.wait_max`).
+
+   On SIGTERM, the server drains (see :class:`Drain`): each new call is answered with a server busy
+   Error, without being invoked, while the calls in progress (including asynchronous calls on a
+   pool) complete, for up to --drain-timeout seconds; then the server exits. Clients may collect
+   their asynchronous calls meanwhile, but the server does not wait for them to. With the
+   --reuse-port option, TCP ports are bound with SO_REUSEPORT, so that a new server may bind them
+   while the old one is still running (a new server binding an 'ipc' endpoint always takes it
+   over). To hand over to a new server, start it, wait for it to bind (see --pid-file), then send
+   SIGTERM to the old one: clients connected to the old server get busy Errors until it exits, then
+   reconnect to the new one.
+'''
 
 import logging
+import os
+import signal
+import socket
 
 from argparse import (ArgumentParser, ArgumentTypeError)
+from collections import deque
+from functools import partial
+from multiprocessing import Process
+from tempfile import gettempdir
+from threading import Thread
+from time import monotonic
+from urllib.parse import urlsplit
+
 import zmq
 from inocybe.pattern import ArgModuleAttribute
+from inocybe_jsonrpc import options
+from inocybe_jsonrpc.admission import Admission
+from inocybe_jsonrpc.aio import Service as AsyncService
+from inocybe_jsonrpc.codec import codec
+from inocybe_jsonrpc.jsonrpc import Service
 
 from inocybe_zmq.uri import Uri
 
+MODES = {
+    'rep': zmq.REP, # pylint: disable=no-member
+    'router': zmq.ROUTER, # pylint: disable=no-member
+    'pull': zmq.PULL, # pylint: disable=no-member
+}
+
 def zmq_uri(string):
     '''Return a normalized ZMQ URI from command line arg `string`.'''
     try:
@@ -31,37 +95,359 @@ def zmq_uri(string):
     except ValueError as exc:
         raise ArgumentTypeError(str(exc))
 
+def bind(sock, uri, reuse_port=False):
+    '''Bind ZMQ socket `sock` at normalized ZMQ `uri`. If `reuse_port` is True and `uri` is a TCP
+       endpoint, then bind the port with SO_REUSEPORT, so that another process may bind it too.
+    '''
+    if reuse_port and uri.startswith('tcp://'):
+        parts = urlsplit(uri)
+        host = '' if parts.hostname in (None, '*') else parts.hostname
+        listener = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener.bind((host, parts.port))
+        listener.listen(sock.getsockopt(zmq.BACKLOG)) # pylint: disable=no-member
+        listener.setblocking(False)
+        ### ZMQ takes ownership of the listening socket, and closes it with `sock`
+        sock.setsockopt(zmq.USE_FD, listener.detach()) # pylint: disable=no-member
+    sock.bind(uri)
+
+class Drain(object):
+    '''Drain a server on a signal: mark each of `services` as draining, so that new calls are shed
+       (see :attr:`inocybe_jsonrpc.jsonrpc.Service.draining`), and keep serving until every call in
+       progress is complete (see :meth:`inocybe_jsonrpc.jsonrpc.Service.drained`), or for up to
+       `timeout` seconds.
+    '''
+    def __init__(self, services, timeout):
+        self.services = services
+        self.timeout = timeout
+        self.deadline = None
+    def start(self, signum=None, frame=None): ### pylint: disable=unused-argument
+        '''Start draining, if not already. This may be installed as a signal handler.'''
+        if self.deadline is not None:
+            return
+        logging.info('draining for up to %.1fs', self.timeout)
+        self.deadline = monotonic() + self.timeout
+        for service in self.services:
+            service.draining = True
+    def done(self, idle=True):
+        '''Return True once draining is complete: either no call is in progress (as given by
+           `idle`) and every service is drained, or the time is up.
+        '''
+        if self.deadline is None:
+            return False
+        if idle and all(service.drained() for service in self.services):
+            return True
+        if monotonic() >= self.deadline:
+            logging.warning('drain timed out after %.1fs', self.timeout)
+            return True
+        return False
+
+def sweep(sock, reply):
+    '''Answer each message already received on `sock` with `reply`, a function of the multipart
+       message returning the reply to send, or None.
+    '''
+    while True:
+        try:
+            frames = sock.recv_multipart(zmq.NOBLOCK) # pylint: disable=no-member
+        except zmq.Again:
+            return
+        output = reply(frames)
+        if output is not None:
+            sock.send_multipart(output)
+
+def respond(service, frames, mode, shed=False):
+    '''Handle the multipart message `frames` received on a socket of `mode` with `service`. The
+       last frame is the Request; any frames before it are the envelope identifying the client.
+       Return the multipart reply to send, or None if nothing is to be sent. If `shed` is True,
+       then reply with a server busy Error without invoking the Request.
+    '''
+    (envelope, input_) = (frames[:-1], frames[-1])
+    if shed:
+        output = service.shed_bytes(input_)
+    else:
+        output = service.handle_bytes(input_)
+    if mode == 'pull':
+        return None
+    if output is None:
+        ### a REP socket must always reply, even if there is no Response
+        return envelope + [b''] if mode == 'rep' else None
+    return envelope + [output]
+
+### sent by a worker to the broker when it is ready for a Request
+READY = b'\x01'
+
+### the longest time for which to poll before checking for signals
+POLL_MS = 500
+
+def broker(frontend, backend, admission=None, shed=None, drain=None, workers=0):
+    '''Forward each Request received on ROUTER socket `frontend` to the least recently used worker
+       connected to ROUTER socket `backend`, and each reply from a worker to the client from which
+       the Request came, until interrupted.
+
+       If `admission`, an :class:`inocybe_jsonrpc.admission.Admission`, is given, then a Request
+       received while no worker is idle is queued, if admitted, or else shed: `shed` is called
+       with the multipart message, returning the reply to send at once, or None (`shed` is also
+       used when draining). Otherwise no
+       Request is received while no worker is idle, leaving Requests queued by ZMQ.
+
+       If `drain`, a :class:`Drain`, is given, then return once it is done, with nothing queued and
+       all `workers` idle, first shedding any Requests received but not yet handled.
+    '''
+    idle = deque()
+    queue = deque()
+    poller = zmq.Poller()
+    poller.register(backend, zmq.POLLIN) # pylint: disable=no-member
+    polling = False
+    while True:
+        if drain is not None and drain.done(not queue and len(idle) >= workers):
+            ### answer Requests which arrived too late to be handled, rather than drop them
+            sweep(frontend, shed)
+            return
+        receiving = bool(idle) or admission is not None
+        if receiving and not polling:
+            poller.register(frontend, zmq.POLLIN) # pylint: disable=no-member
+            polling = True
+        elif polling and not receiving:
+            poller.unregister(frontend)
+            polling = False
+        try:
+            ### time out now and then, as a signal may be taken by a ZMQ I/O thread, not this one
+            events = dict(poller.poll(POLL_MS))
+        except KeyboardInterrupt:
+            return
+        if backend in events:
+            ### [worker, b'', READY] or [worker, b'', client envelope..., reply]
+            frames = backend.recv_multipart()
+            if frames[2:] != [READY]:
+                frontend.send_multipart(frames[2:])
+            if queue:
+                admission.start()
+                backend.send_multipart([frames[0], b''] + queue.popleft())
+            else:
+                idle.append(frames[0])
+        if frontend in events:
+            frames = frontend.recv_multipart()
+            if idle:
+                backend.send_multipart([idle.popleft(), b''] + frames)
+            elif admission.admit():
+                queue.append(frames)
+            else:
+                reply = shed(frames)
+                if reply is not None:
+                    frontend.send_multipart(reply)
+
+def work(sock, service, mode):
+    '''Handle each Request forwarded by the broker to worker DEALER socket `sock` with `service`,
+       as if received on a socket of `mode`.
+    '''
+    sock.send_multipart([b'', READY])
+    while True:
+        frames = sock.recv_multipart()
+        reply = respond(service, frames[1:], mode)
+        sock.send_multipart([b''] + (reply if reply is not None else [READY]))
+
+def work_thread(context, uri, service, mode):
+    '''Run a worker thread, connected to the broker at `uri`.'''
+    sock = context.socket(zmq.DEALER) # pylint: disable=no-member
+    sock.connect(uri)
+    work(sock, service, mode)
+
+def work_process(uri, args):
+    '''Run a worker process, connected to the broker at `uri`, with a service created from the dict
+       of parsed command line `args`. On SIGTERM, the service drains, until the broker exits.
+    '''
+    service = args['service'](*args['args'])
+    options.configure(service, args)
+    signal.signal(signal.SIGTERM, lambda signum, frame: setattr(service, 'draining', True))
+    context = zmq.Context()
+    sock = context.socket(zmq.DEALER) # pylint: disable=no-member
+    sock.connect(uri)
+    try:
+        work(sock, service, args['mode'])
+    except KeyboardInterrupt:
+        pass
+    sock.close()
+
+def serve(sock, service, mode, drain=None):
+    '''Handle each Request received on `sock`, a socket of `mode`, with `service`, one at a time,
+       until interrupted or `drain`, a :class:`Drain`, is done.
+    '''
+    serve_many([(sock, service)], mode, drain)
+
+def serve_many(services, mode, drain=None):
+    '''Handle each Request received on any socket of `mode` in the list of (socket, service) pairs
+       `services`, with the service of that socket, one at a time, until interrupted or `drain`, a
+       :class:`Drain`, is done.
+    '''
+    poller = zmq.Poller()
+    for (sock, _) in services:
+        poller.register(sock, zmq.POLLIN) # pylint: disable=no-member
+    by_socket = dict(services)
+    while True:
+        if drain is not None and drain.done():
+            ### answer Requests which arrived too late to be handled, rather than drop them
+            for (sock, service) in services:
+                sweep(sock, partial(respond, service, mode=mode))
+            return
+        try:
+            ### time out now and then, as a signal may be taken by a ZMQ I/O thread, not this one
+            events = poller.poll(POLL_MS)
+        except KeyboardInterrupt:
+            return
+        for (sock, _) in events:
+            reply = respond(by_socket[sock], sock.recv_multipart(), mode)
+            if reply is not None:
+                sock.send_multipart(reply)
+
+def remove_pid_file(filename):
+    '''Remove pid file `filename`, unless it has been taken over by another process.'''
+    try:
+        with open(filename) as pid_file:
+            if pid_file.read().strip() != str(os.getpid()):
+                return
+        os.remove(filename)
+    except (IOError, OSError):
+        pass
+
 def main():
-    '''Run a JSON-RPC 2.0 service on a ZMQ REP socket.'''
+    '''Run a JSON-RPC 2.0 service on a ZMQ socket.'''
     logging.basicConfig(level=logging.INFO)
     aparser = ArgumentParser(description=main.__doc__)
-    aparser.add_argument('uri', type=zmq_uri, help='the URI at which to bind a ZMQ REP socket')
-    aparser.add_argument('service', type=ArgModuleAttribute('Service'), help=', '.join((
+    options.add_arguments(aparser)
+    aparser.add_argument('-m', '--mode', default='rep', choices=sorted(MODES), help=' '.join((
+        'the type of socket to bind: rep (for REQ clients), router (for REQ or DEALER clients,',
+        'sending no reply to a notification) or pull (for PUSH clients, never replying)',
+    )))
+    aparser.add_argument('--workers', default=0, type=int, help=' '.join((
+        'the number of workers to which to hand Requests, each handling one at a time',
+        '(by default Requests are handled one at a time, with no broker)',
+    )))
+    aparser.add_argument('--worker-processes', action='store_true', help=' '.join((
+        'run the workers as processes, each with its own service instance, rather than threads',
+    )))
+    aparser.add_argument('--queue-max', type=int, help=' '.join((
+        'the maximum number of Requests to queue while no worker is idle, beyond which each',
+        'Request is answered at once with a server busy error',
+    )))
+    aparser.add_argument('--drain-timeout', default=5.0, type=float, help=' '.join((
+        'the most seconds for which to drain on SIGTERM, before exiting',
+    )))
+    aparser.add_argument('--reuse-port', action='store_true', help=' '.join((
+        'bind TCP ports with SO_REUSEPORT, so that a new server may take them over',
+    )))
+    aparser.add_argument('--pid-file', help=' '.join((
+        'a file to which to write the process id once the sockets are bound',
+        '(and from which to remove it on exit)',
+    )))
+    aparser.add_argument('-c', '--config', help=' '.join((
+        'a JSON file listing the services to run, each with a "uri", a "service" and optional',
+        '"args", instead of `uri`, `service` and `args`',
+    )))
+    aparser.add_argument('uri', nargs='?', type=zmq_uri, help=' '.join((
+        'the URI at which to bind a ZMQ socket',
+    )))
+    aparser.add_argument('service', nargs='?', type=ArgModuleAttribute('Service'), help=', '.join((
         'the service to run on the socket',
         'specified as a Python class implementing inocybe_jsonrpc.jsonrpc.Service',
         'or a Python module with a Service attribute',
     )))
     aparser.add_argument('args', nargs='*', help='string args to create `service` instance with')
     args = vars(aparser.parse_args())
+    if args['workers'] > 0 and args['mode'] == 'pull':
+        aparser.error('--workers requires --mode rep or router')
+    if args['workers'] > 0 and args['config'] is not None:
+        aparser.error('--workers cannot be used with --config')
+    if args['queue_max'] is not None:
+        if args['mode'] == 'pull':
+            aparser.error('--queue-max requires --mode rep or router')
+        if args['config'] is not None:
+            aparser.error('--queue-max cannot be used with --config')
+        if args['queue_max'] < 0:
+            aparser.error('--queue-max must not be negative')
+        ### the queue is kept by the broker, so run one if need be
+        args['workers'] = max(args['workers'], 1)
+    if args['workers'] > 0 and args['worker_processes']:
+        if args['uri'] is None or args['service'] is None:
+            aparser.error('specify uri and service')
+        if isinstance(args['service'], type) and issubclass(args['service'], AsyncService):
+            aparser.error('{} is an asyncio service, which this transport cannot run'.format(
+                args['service'].__name__
+            ))
+        services = [(args['uri'], None)]
+    else:
+        services = options.create_services(aparser, args, 'uri', zmq_uri, asyncio=False)
+    workers = []
+    if args['workers'] > 0 and args['worker_processes']:
+        ### fork before creating the context: a child must not inherit its threads or sockets
+        workers_uri = 'ipc://{}/inocybe-zmq-workers-{}'.format(gettempdir(), os.getpid())
+        workers = [Process(target=work_process, args=(workers_uri, args))
+                   for _ in range(args['workers'])]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
     context = zmq.Context()
-    rep = context.socket(zmq.REP) # pylint: disable=no-member
-    rep.bind(args['uri'])
+    socks = []
     try:
-        service = args['service'](*args['args'])
-    except TypeError as exc:
-        aparser.error('failed to create service instance, ' + str(exc))
-    loop = True
-    while loop:
-        try:
-            input_ = rep.recv_string()
-        except KeyboardInterrupt:
-            loop = False
+        for (uri, service) in services:
+            if args['workers'] > 0:
+                sock = context.socket(zmq.ROUTER) # pylint: disable=no-member
+            else:
+                sock = context.socket(MODES[args['mode']])
+            bind(sock, uri, args['reuse_port'])
+            socks.append((sock, service))
+    except zmq.ZMQError:
+        ### a worker process drains on SIGTERM, so would not stop when terminated on exit
+        for worker in workers:
+            worker.kill()
+        raise
+    if args['pid_file'] is not None:
+        with open(args['pid_file'], 'w') as pid_file:
+            pid_file.write('{}\n'.format(os.getpid()))
+    drain = Drain([service for (_, service) in socks if service is not None], args['drain_timeout'])
+    signal.signal(signal.SIGTERM, drain.start)
+    (sock, service) = socks[0]
+    if args['workers'] > 0:
+        backend = context.socket(zmq.ROUTER) # pylint: disable=no-member
+        if args['worker_processes']:
+            ### the workers, already running, connect once the backend is bound
+            uri = workers_uri
+            backend.bind(uri)
+            def stop(signum, frame):
+                '''Drain, passing the signal on to the worker processes.'''
+                drain.start(signum, frame)
+                for worker in workers:
+                    os.kill(worker.pid, signum)
+            signal.signal(signal.SIGTERM, stop)
         else:
-            logging.info('> %s', input_)
-            output = service.handle_request(input_)
-            rep.send_string(output)
-            logging.info('< %s', output)
-    rep.close()
+            uri = 'inproc://workers'
+            backend.bind(uri)
+            workers = [Thread(target=work_thread, args=(context, uri, service, args['mode']))
+                       for _ in range(args['workers'])]
+            for worker in workers:
+                worker.daemon = True
+                worker.start()
+        if service is None:
+            ### the workers are processes: shed with a service of this process
+            service = Service()
+            service.codec = codec(args['codec'])
+        admission = None
+        if args['queue_max'] is not None:
+            admission = service.admission = Admission(args['queue_max'])
+        shed = partial(respond, service, mode=args['mode'], shed=True)
+        broker(sock, backend, admission, shed, drain, args['workers'])
+        backend.close(linger=0)
+        if args['worker_processes']:
+            ### a worker process drains on SIGTERM, so would not stop when terminated on exit
+            for worker in workers:
+                worker.kill()
+            os.remove(uri[len('ipc://'):])
+    else:
+        serve_many(socks, args['mode'], drain)
+    for (sock, _) in socks:
+        sock.close()
+    if args['pid_file'] is not None:
+        remove_pid_file(args['pid_file'])
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''A command line tool for measuring the throughput and latency of a JSON-RPC 2.0 service.
+
+   Requests are made from a template, or taken in turn from a corpus (a file of one Request per
+   line), each given a unique id, and sent to the target service at a fixed rate or as fast as
+   possible, with up to a given number in flight at once. The target is one of:
+
+   * 'zmq://host:port/' (or 'tcp://'), on a DEALER socket, so Requests are pipelined to a service
+     run with :mod:`inocybe_zmq.jsonrpc` in any mode but 'pull', or with :mod:`inocybe_zmq.aio`;
+   * 'http://host:port/path', on as many persistent connections as Requests in flight, to a
+     service run with :mod:`inocybe_jsonrpc.httpd` (with at least as many --threads, as each
+     persistent connection occupies a thread);
+   * 'ws://host:port/path', on one connection, to a service run with :mod:`inocybe_jsonrpc.wsd`.
+
+   The throughput, the error rate and the latency percentiles (in microseconds) are reported as
+   a JSON object on stdout. At a fixed rate, each latency is measured from the time at which the
+   Request was due to be sent, so a stalled service is charged for the Requests it held up.
+'''
+
+import asyncio
+import json
+
+from argparse import (ArgumentParser, ArgumentTypeError)
+from itertools import (count, cycle)
+from urllib.parse import urlsplit
+
+import zmq
+import zmq.asyncio
+from inocybe_jsonrpc.codec import (CODECS, codec)
+from inocybe_jsonrpc.jsonrpc import (JsonRpcError, TypeRequestObject)
+from inocybe_jsonrpc.metrics import Histogram
+from inocybe_jsonrpc.websocket import connect as ws_connect
+
+from inocybe_zmq.uri import Uri
+
+TEMPLATE = '{"jsonrpc": "2.0", "id": 0, "method": "echo", "params": ["hello"]}'
+
+class Client(object):
+    '''A client matching each Response received to its Request by id.'''
+    def __init__(self, codec_):
+        self.codec = codec_
+        self.pending = {}
+        ### the ids of the Requests sent, never reused, so a late Response cannot match a later call
+        self.ids = count(1)
+        ### the number of replies received which could not be decoded
+        self.errors = 0
+    def expect(self, ids):
+        '''Return a future for the Response to the Request (or Batch) with list of `ids`.'''
+        future = asyncio.get_running_loop().create_future()
+        for id_ in ids:
+            self.pending[id_] = future
+        return future
+    def received(self, data):
+        '''Complete the future for encoded Response `data`, matched by the id of any element of a
+           Batch, as the Response to a notification is omitted. Ignore an empty reply (as sent by a
+           REP socket where there is no Response), and count one which cannot be decoded in
+           :attr:`errors`.
+        '''
+        if not data:
+            return
+        try:
+            response = self.codec.decode(data)
+        except (TypeError, ValueError):
+            self.errors += 1
+            return
+        for element in response if isinstance(response, list) else [response]:
+            if not isinstance(element, dict):
+                continue
+            future = self.pending.pop(element.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(response)
+    def forget(self, ids):
+        '''Stop waiting for the Response to the Request (or Batch) with list of `ids`.'''
+        for id_ in ids:
+            self.pending.pop(id_, None)
+
+class ZmqClient(Client):
+    '''A client of a ZMQ service, on a DEALER socket.'''
+    def __init__(self, codec_, uri):
+        Client.__init__(self, codec_)
+        self.context = zmq.asyncio.Context()
+        self.sock = self.context.socket(zmq.DEALER) # pylint: disable=no-member
+        self.sock.setsockopt(zmq.LINGER, 0) # pylint: disable=no-member
+        self.sock.connect(uri)
+        self.reader = asyncio.ensure_future(self.read())
+    async def read(self):
+        '''Receive Responses until cancelled.'''
+        while True:
+            frames = await self.sock.recv_multipart()
+            self.received(frames[-1])
+    async def call(self, ids, data):
+        '''Send encoded Request `data` with list of `ids`, and return the decoded Response (None if
+           `ids` is empty, as there is then no Response).
+        '''
+        future = self.expect(ids) if ids else None
+        await self.sock.send_multipart([b'', data])
+        return None if future is None else await future
+    def close(self):
+        '''Close the socket.'''
+        self.reader.cancel()
+        self.sock.close()
+        self.context.term()
+
+class WsClient(Client):
+    '''A client of a WebSocket service, on one connection.'''
+    def __init__(self, codec_, conn):
+        Client.__init__(self, codec_)
+        self.conn = conn
+        self.reader = asyncio.ensure_future(self.read())
+    async def read(self):
+        '''Receive Responses until the connection closes.'''
+        while True:
+            message = await self.conn.recv()
+            if message is None:
+                return
+            self.received(message)
+    async def call(self, ids, data):
+        '''Send encoded Request `data` with list of `ids`, and return the decoded Response (None if
+           `ids` is empty, as there is then no Response).
+        '''
+        future = self.expect(ids) if ids else None
+        await self.conn.send(data)
+        return None if future is None else await future
+    def close(self):
+        '''Close the connection.'''
+        self.reader.cancel()
+        self.conn.writer.close()
+
+class HttpClient(Client):
+    '''A client of an HTTP service, at `path` on `host` and `port`, on a pool of persistent
+       connections, opened as needed.
+    '''
+    def __init__(self, codec_, host, port, path):
+        Client.__init__(self, codec_)
+        self.address = (host, port)
+        self.head = 'POST {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Type: application/json\r\n'.format(
+            path or '/', host, port
+        ).encode('utf-8')
+        self.idle = []
+    async def call(self, ids, data): ### pylint: disable=unused-argument
+        '''Send encoded Request `data` and return the decoded Response (None if there is none).'''
+        if self.idle:
+            (reader, writer) = self.idle.pop()
+        else:
+            (reader, writer) = await asyncio.open_connection(*self.address)
+        try:
+            writer.write(b'%sContent-Length: %d\r\n\r\n%s' % (self.head, len(data), data))
+            body = await self.read_response(reader)
+        except BaseException:
+            ### including cancellation on timeout, which leaves the connection mid-Response
+            writer.close()
+            raise
+        self.idle.append((reader, writer))
+        return self.codec.decode(body) if body else None
+    @staticmethod
+    async def read_response(reader):
+        '''Return the body of the HTTP Response read from `reader`.'''
+        status = await reader.readline()
+        if not status:
+            raise ConnectionResetError('connection closed')
+        (length, chunked) = (0, False)
+        while True:
+            line = (await reader.readline()).strip()
+            if not line:
+                break
+            (name, _, value) = line.partition(b':')
+            name = name.strip().lower()
+            if name == b'content-length':
+                length = int(value)
+            elif name == b'transfer-encoding':
+                chunked = value.strip().lower() == b'chunked'
+        if status.split()[1:2] not in ([b'200'], [b'204']):
+            await reader.readexactly(length)
+            raise ConnectionError(status.decode('latin-1').strip())
+        if not chunked:
+            return await reader.readexactly(length)
+        chunks = []
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            chunks.append(await reader.readexactly(size + 2))
+            if not size:
+                return b''.join(_[:-2] for _ in chunks)
+    def close(self):
+        '''Close the connections.'''
+        for (_, writer) in self.idle:
+            writer.close()
+
+async def open_client(target, codec_):
+    '''Return a client of the service at URL `target`.'''
+    parts = urlsplit(target)
+    if parts.scheme == 'http':
+        return HttpClient(codec_, parts.hostname, parts.port or 80, parts.path)
+    if parts.scheme == 'ws':
+        conn = await ws_connect(parts.hostname, parts.port or 80, parts.path or '/')
+        return WsClient(codec_, conn)
+    return ZmqClient(codec_, str(Uri(target)))
+
+def target_arg(string):
+    '''Return the target URL `string`, checked as a command line arg.'''
+    scheme = urlsplit(string).scheme
+    if scheme in ('http', 'ws'):
+        if not urlsplit(string).hostname:
+            raise ArgumentTypeError('bad target: ' + string)
+        return string
+    return Uri.arg(string)
+
+def request_check(request):
+    '''Return decoded `request`, raising :exc:`ValueError` unless it is a valid Request object or a
+       non-empty Batch array of them. A service answers an invalid Request with an Error which has
+       no id, so could not be matched to the call.
+    '''
+    if not isinstance(request, (dict, list)) or request == []:
+        raise ValueError('a Request must be an object or a non-empty array')
+    for element in request if isinstance(request, list) else [request]:
+        try:
+            TypeRequestObject.validate(element)
+        except JsonRpcError as exc:
+            raise ValueError('{}: {}'.format(exc.error['message'], json.dumps(element)))
+    return request
+
+def requests(template, corpus, codec_):
+    '''Return an iterator over decoded Requests: each line of file `corpus` in turn, if given,
+       otherwise JSON-encoded Request `template`. Raise :exc:`ValueError` if a Request is bad.
+    '''
+    if corpus is None:
+        return cycle([request_check(codec_.decode(template))])
+    decoded = []
+    with open(corpus) as lines:
+        for (number, line) in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                decoded.append(request_check(codec_.decode(line)))
+            except ValueError as exc:
+                raise ValueError('line {} of {}: {}'.format(number, corpus, exc))
+    if not decoded:
+        raise ValueError('{} holds no Requests'.format(corpus))
+    return cycle(decoded)
+
+class Run(object): ### pylint: disable=too-few-public-methods
+    '''The outcome of a run of Requests.'''
+    def __init__(self):
+        self.latency = Histogram()
+        self.sent = 0
+        self.errors = 0
+        self.failures = 0
+        self.elapsed = 0.0
+    def report(self):
+        '''Return a dict of the throughput, error rate and latency statistics.'''
+        done = self.latency.count
+        return {
+            'requests': self.sent,
+            'responses': done,
+            'errors': self.errors,
+            'failures': self.failures,
+            'error_rate': round((self.errors + self.failures) / float(self.sent or 1), 6),
+            'seconds': round(self.elapsed, 3),
+            'throughput': round(done / self.elapsed, 1) if self.elapsed else 0.0,
+            'latency_us': self.latency.stats(),
+        }
+
+async def drive(client, source, args):
+    '''Send Requests from iterator `source` with `client` as given by the dict of parsed command
+       line `args`, and return the :class:`Run`.
+    '''
+    (run, loop, undecodable) = (Run(), asyncio.get_running_loop(), client.errors)
+    (rate, number, duration, timeout) = (args['rate'], args['number'], args['duration'],
+                                         args['timeout'])
+    slots = asyncio.Semaphore(args['concurrency'])
+    tasks = set()
+    async def call(ids, data, due):
+        '''Make one call, due at loop time `due`, and record its outcome.'''
+        try:
+            response = await asyncio.wait_for(client.call(ids, data), timeout)
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError, OSError):
+            client.forget(ids)
+            run.failures += 1
+        except (TypeError, ValueError):
+            ### an HTTP Response body which could not be decoded
+            run.errors += 1
+        else:
+            if not ids:
+                ### nothing was awaited, so there is no latency to record
+                return
+            run.latency.add(loop.time() - due)
+            if any(isinstance(_, dict) and 'error' in _
+                   for _ in (response if isinstance(response, list) else [response])):
+                run.errors += 1
+        finally:
+            slots.release()
+    start = loop.time()
+    for (index, request) in enumerate(source):
+        if number and index >= number:
+            break
+        offset = index / rate if rate else loop.time() - start
+        if duration and offset >= duration:
+            break
+        due = start + offset
+        if rate and due > loop.time():
+            await asyncio.sleep(due - loop.time())
+        await slots.acquire()
+        if not rate:
+            due = loop.time()
+        if isinstance(request, list):
+            request = [dict(element, id=next(client.ids)) if 'id' in element else element
+                       for element in request]
+            ids = [element['id'] for element in request if 'id' in element]
+        else:
+            request = dict(request, id=next(client.ids))
+            ids = [request['id']]
+        task = asyncio.ensure_future(call(ids, client.codec.encode(request), due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        run.sent += 1
+    if tasks:
+        await asyncio.wait(tasks)
+    run.elapsed = loop.time() - start
+    run.errors += client.errors - undecodable
+    return run
+
+async def main_async(args, source):
+    '''Run the benchmark given by the dict of parsed command line `args`, sending Requests from
+       iterator `source`, and return the report.
+    '''
+    codec_ = codec(args['codec'])
+    client = await open_client(args['target'], codec_)
+    try:
+        if args['warmup']:
+            await drive(client, source, dict(args, number=args['warmup'], duration=0, rate=0))
+        run = await drive(client, source, args)
+    finally:
+        client.close()
+    report = {
+        'target': args['target'],
+        'concurrency': args['concurrency'],
+        'rate': args['rate'] or None,
+    }
+    report.update(run.report())
+    return report
+
+def main():
+    '''Measure the throughput and latency of a JSON-RPC 2.0 service.'''
+    aparser = ArgumentParser(description=main.__doc__)
+    aparser.add_argument('-t', '--template', default=TEMPLATE, help=' '.join((
+        'the JSON-RPC 2.0 Request from which to make each Request (its id is replaced)',
+    )))
+    aparser.add_argument('--corpus', help=' '.join((
+        'a file of JSON-RPC 2.0 Requests, one per line, to send in turn instead of --template',
+    )))
+    aparser.add_argument('-c', '--concurrency', default=16, type=int, help=' '.join((
+        'the maximum number of Requests in flight at once',
+    )))
+    aparser.add_argument('-r', '--rate', default=0.0, type=float, help=' '.join((
+        'the number of Requests to send per second (by default, as fast as possible)',
+    )))
+    aparser.add_argument('-n', '--number', default=0, type=int, help=' '.join((
+        'the number of Requests to send (by default, until --duration elapses)',
+    )))
+    aparser.add_argument('-d', '--duration', default=10.0, type=float, help=' '.join((
+        'the number of seconds for which to send Requests, if --number is not given',
+    )))
+    aparser.add_argument('--warmup', default=0, type=int, help=' '.join((
+        'the number of Requests to send, as fast as possible, before measuring',
+    )))
+    aparser.add_argument('--timeout', default=10.0, type=float, help=' '.join((
+        'the number of seconds after which a Request with no Response has failed',
+    )))
+    aparser.add_argument('-j', '--codec', default='json', choices=sorted(CODECS), help=' '.join((
+        'the JSON codec with which to encode Requests and decode Responses',
+    )))
+    aparser.add_argument('target', type=target_arg, help=' '.join((
+        'the URL of the service: zmq://host:port/, http://host:port/path or ws://host:port/path',
+    )))
+    args = vars(aparser.parse_args())
+    if args['concurrency'] < 1:
+        aparser.error('--concurrency must be at least 1')
+    if args['number']:
+        args['duration'] = 0
+    try:
+        source = requests(args['template'], args['corpus'], codec(args['codec']))
+    except (IOError, ValueError) as exc:
+        aparser.error('bad {}, {}'.format('--corpus' if args['corpus'] else '--template', exc))
+    try:
+        report = asyncio.run(main_async(args, source))
+    except KeyboardInterrupt:
+        return
+    print(json.dumps(report, indent=2, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+'''Publish and subscribe to `JSON-RPC 2.0`_ notifications over ZMQ PUB/SUB sockets.
+
+   A :class:`Publisher` binds a PUB socket and publishes each notification as a multipart message
+   of the topic (the notification method, such as the topic of an
+   :class:`inocybe_openswitch.event_listener.Handler`), the encoded notification and a sequence
+   number, counting the notifications published on the topic, from which a subscriber may tell
+   how many it has missed (see :class:`Gaps`). Its
+   :meth:`Publisher.notify` method never blocks, and may be called from any thread or from any
+   process forked from the one which created the publisher, so it may be passed as the notify
+   callback of an :class:`inocybe_openswitch.event_listener.Listener`, whose handlers run in
+   processes of their own::
+
+       listener = Listener(Publisher('zmq://0.0.0.0:4571/').notify)
+
+   A :class:`Subscriber` connects a SUB socket to a publisher and receives the notifications on
+   the topics to which it subscribes.
+
+   .. _JSON-RPC 2.0: http://www.jsonrpc.org/specification
+'''
+
+import os
+
+from itertools import count
+from tempfile import gettempdir
+from threading import (Thread, local)
+
+import zmq
+from inocybe_jsonrpc.codec import Codec
+
+from inocybe_zmq.uri import Uri
+
+### the longest time for which the bridge polls before checking whether it is closed
+POLL_MS = 500
+
+### the size in bytes of the (big-endian, unsigned) sequence number frame of a notification
+SEQUENCE_BYTES = 8
+
+class Publisher(object):
+    '''Publish notifications on a PUB socket bound at `uri`.
+
+       Notifications are sent from the calling thread on a PUSH socket of its own (created on
+       first use, in each process and thread) to a bridge thread in the process which created the
+       publisher, which publishes them. Each PUSH socket queues up to `hwm` notifications, beyond
+       which further notifications are dropped (and counted in :attr:`dropped`, per process),
+       rather than block the caller. Likewise the PUB socket queues up to `hwm` notifications for
+       each subscriber, beyond which they are dropped for that subscriber.
+
+       If `conflate` is True, then each PUSH socket queues only the latest notification, so a
+       caller which publishes the state of one thing (as each event listener handler does, for
+       one path) publishes only its latest state when the bridge falls behind.
+    '''
+    _bridges = count()
+    def __init__(self, uri, hwm=1000, conflate=False, codec=Codec):
+        self.hwm = hwm
+        self.conflate = conflate
+        self.codec = codec
+        self.dropped = 0
+        self._context = zmq.Context()
+        self._pub = self._context.socket(zmq.PUB) # pylint: disable=no-member
+        self._pub.setsockopt(zmq.SNDHWM, hwm) # pylint: disable=no-member
+        self._pub.bind(str(Uri(uri)))
+        self._bridge = 'ipc://{}/inocybe-zmq-notify-{}-{}'.format(
+            gettempdir(), os.getpid(), next(self._bridges)
+        )
+        self._pull = self._context.socket(zmq.PULL) # pylint: disable=no-member
+        self._pull.bind(self._bridge)
+        self._closed = False
+        self._local = local()
+        self._thread = Thread(target=self._forward)
+        self._thread.daemon = True
+        self._thread.start()
+    def __getstate__(self):
+        '''Return the state with which to recreate the publisher in another process, as a
+           client of the bridge in this process.
+        '''
+        return {
+            'hwm': self.hwm,
+            'conflate': self.conflate,
+            'codec': self.codec,
+            'dropped': 0,
+            '_bridge': self._bridge,
+            '_local': None,
+        }
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = local()
+    def _forward(self):
+        '''Publish each notification received by the bridge, until closed.'''
+        (pull, pub) = (self._pull, self._pub)
+        sequences = {}
+        while not self._closed:
+            if not pull.poll(POLL_MS):
+                continue
+            while True:
+                try:
+                    message = pull.recv(zmq.NOBLOCK) # pylint: disable=no-member
+                except zmq.Again:
+                    break
+                (topic, _, notification) = message.partition(b' ')
+                sequence = sequences[topic] = sequences.get(topic, 0) + 1
+                pub.send_multipart((topic, notification, sequence.to_bytes(SEQUENCE_BYTES, 'big')))
+        pull.close(linger=0)
+        pub.close(linger=0)
+    def _push(self):
+        '''Return the PUSH socket of the calling process and thread, creating it if need be.'''
+        push = getattr(self._local, 'push', None)
+        pid = os.getpid()
+        if push is None or self._local.pid != pid:
+            ### a ZMQ context must not be shared with a forked process, so create one per process
+            if getattr(self._local, 'pid', None) != pid:
+                self._local.context = zmq.Context()
+                self._local.pid = pid
+            push = self._local.context.socket(zmq.PUSH) # pylint: disable=no-member
+            push.setsockopt(zmq.SNDHWM, self.hwm) # pylint: disable=no-member
+            push.setsockopt(zmq.LINGER, 0) # pylint: disable=no-member
+            if self.conflate:
+                push.setsockopt(zmq.CONFLATE, 1) # pylint: disable=no-member
+            push.connect(self._bridge)
+            self._local.push = push
+        return push
+    def notify(self, method, params=None):
+        '''Publish a notification of `method` with `params`, on topic `method`, without blocking.
+           Return True if the notification was queued, or False if it was dropped.
+
+           The notification is sent to the bridge in the background, so one queued just before
+           the calling process exits may be lost.
+        '''
+        notification = {'jsonrpc': '2.0', 'method': method}
+        if params is not None:
+            notification['params'] = params
+        message = method.encode('utf-8') + b' ' + self.codec.encode(notification)
+        try:
+            self._push().send(message, zmq.NOBLOCK) # pylint: disable=no-member
+        except zmq.Again:
+            self.dropped += 1
+            return False
+        return True
+    def close(self):
+        '''Stop publishing, in the process which created the publisher.'''
+        self._closed = True
+        self._thread.join()
+        os.remove(self._bridge[len('ipc://'):])
+
+class Subscriber(object):
+    '''Receive the notifications published on `topics` (a list of strings, or all if empty) by the
+       :class:`Publisher` at `uri`, queueing up to `hwm` notifications before dropping them.
+    '''
+    def __init__(self, uri, topics=(), hwm=1000, codec=Codec, context=None):
+        self.codec = codec
+        self._sub = (context or zmq.Context.instance()).socket(zmq.SUB) # pylint: disable=no-member
+        self._sub.setsockopt(zmq.RCVHWM, hwm) # pylint: disable=no-member
+        self._sub.connect(str(Uri(uri)))
+        for topic in topics or ('',):
+            self.subscribe(topic)
+    def subscribe(self, topic):
+        '''Receive notifications published on `topic` (or on any topic, if empty).'''
+        self._sub.setsockopt(zmq.SUBSCRIBE, topic.encode('utf-8')) # pylint: disable=no-member
+    def unsubscribe(self, topic):
+        '''Stop receiving notifications published on `topic`.'''
+        self._sub.setsockopt(zmq.UNSUBSCRIBE, topic.encode('utf-8')) # pylint: disable=no-member
+    def recv(self, timeout=None):
+        '''Return the next notification received, as a 2-tuple of topic and decoded notification,
+           waiting for up to `timeout` seconds (or indefinitely if None). Return None on timeout.
+        '''
+        if timeout is not None and not self._sub.poll(timeout * 1e3):
+            return None
+        (topic, notification) = self._sub.recv_multipart()[:2]
+        return (topic.decode('utf-8'), self.codec.decode(notification))
+    def __iter__(self):
+        '''Generate each notification received, as :meth:`recv`.'''
+        while True:
+            yield self.recv()
+    def close(self):
+        '''Stop receiving notifications.'''
+        self._sub.close(linger=0)
+
+class Gaps(object):
+    '''Count the notifications missed by a subscriber, from the gaps in the sequence numbers of
+       those it received on each topic.
+
+       A sequence number lower than the last on its topic means that the publisher restarted, so
+       counting starts over. Messages without a sequence number frame are ignored.
+    '''
+    def __init__(self):
+        self._last = {}
+        self.gaps = 0
+        self.missed = 0
+    def check(self, frames):
+        '''Check the multipart message `frames`, returning the number of notifications missed on
+           its topic since the last one received.
+        '''
+        if len(frames) < 3 or len(frames[-1]) != SEQUENCE_BYTES:
+            return 0
+        (topic, sequence) = (frames[0], int.from_bytes(frames[-1], 'big'))
+        last = self._last.get(topic)
+        self._last[topic] = sequence
+        if last is None or sequence <= last + 1:
+            return 0
+        self.gaps += 1
+        self.missed += sequence - last - 1
+        return sequence - last - 1
@@ -18,27 +18,86 @@
 
    Publish each line of text from stdin as a multipart message on the specified topic to connected
    ZMQ SUB sockets.
+
+   With --replay, instead publish each multipart message in a recording made by
+   :mod:`inocybe_zmq.subscriber`, as recorded, at the rate at which they were recorded times
+   --speed (or as fast as possible if 0), after waiting --wait seconds for subscribers to connect.
 '''
 
 from __future__ import print_function
 
+import logging
+
 from argparse import ArgumentParser
 from sys import stdin
+from time import (monotonic, sleep)
 
 import zmq
+from inocybe_zmq.recording import read
 from inocybe_zmq.uri import Uri
 
+def replay(pub, filename, speed):
+    '''Publish each multipart message in the recording at `filename` on PUB socket `pub`, at
+       `speed` times the rate at which they were recorded (or as fast as possible if 0). Return
+       the number of messages published.
+    '''
+    (published, start, first) = (0, None, None)
+    for (stamp, frames) in read(filename):
+        if start is None:
+            (start, first) = (monotonic(), stamp)
+        elif speed:
+            delay = start + (stamp - first) / 1e9 / speed - monotonic()
+            if delay > 0:
+                sleep(delay)
+        pub.send_multipart(frames)
+        published += 1
+    return published
+
 def main():
     '''Publish each line of text from stdin as a multipart message to connected ZMQ SUB sockets.'''
+    logging.basicConfig(level=logging.INFO)
     aparser = ArgumentParser(description=main.__doc__)
     aparser.add_argument('-t', '--topic', default='')
+    aparser.add_argument('-r', '--replay', metavar='FILE', help=' '.join((
+        'publish each message in the recording FILE rather than lines of text from stdin',
+    )))
+    aparser.add_argument('--speed', default=1.0, type=float, help=' '.join((
+        'the multiple of the recorded rate at which to replay messages,',
+        'or 0 to replay them as fast as possible',
+    )))
+    aparser.add_argument('--wait', default=1.0, type=float, help=' '.join((
+        'the time in seconds to wait for subscribers to connect before replaying messages',
+    )))
+    aparser.add_argument('--hwm', default=1000, type=int, help=' '.join((
+        'the most messages to queue for each subscriber before dropping them',
+    )))
     aparser.add_argument('uri', type=Uri.arg)
     args = vars(aparser.parse_args())
-    topic = args['topic']
-    prefix = '>({})'.format(topic) if topic else '>'
+    if args['speed'] < 0:
+        aparser.error('--speed must not be negative')
+    topic = args['topic'].encode('utf-8')
+    prefix = '>({})'.format(args['topic']) if topic else '>'
     context = zmq.Context()
     pub = context.socket(zmq.PUB) # pylint: disable=no-member
+    pub.setsockopt(zmq.SNDHWM, args['hwm']) # pylint: disable=no-member
     pub.bind(args['uri'])
+    if args['replay']:
+        try:
+            sleep(args['wait'])
+            start = monotonic()
+            published = replay(pub, args['replay'], args['speed'])
+        except KeyboardInterrupt:
+            pass
+        except (OSError, ValueError) as exc:
+            logging.error('failed to replay recording, %s', exc)
+        else:
+            elapsed = monotonic() - start
+            logging.info(
+                '%d messages replayed in %.3fs (%.0f msg/s)',
+                published, elapsed, published / elapsed if elapsed else 0,
+            )
+        pub.close()
+        return
     loop = True
     while loop:
         try:
@@ -50,7 +109,7 @@ def main():
                 loop = False
             else:
                 print(prefix, line)
-                pub.send_multipart((topic, line))
+                pub.send_multipart((topic, line.encode('utf-8')))
     pub.close()
 
 if __name__ == '__main__':
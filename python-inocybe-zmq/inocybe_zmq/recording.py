@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+'''A compact, append-only recording of ZMQ multipart messages.
+
+   A recording is a file starting with :data:`MAGIC`, followed by one record per message: a
+   header of the time at which the message was received (in nanoseconds since the epoch), the
+   size in bytes of the body and the number of frames, then the body, of each frame prefixed with
+   its size in bytes. All integers are little-endian.
+
+   A :class:`Writer` only ever appends whole records, in one write per batch, so a recording cut
+   short (by a crash or a full disk) ends with at most one partial record, which :func:`read`
+   ignores, and which a :class:`Writer` appending to the recording truncates.
+'''
+
+import os
+import struct
+
+MAGIC = b'IZMQREC1'
+
+### the header of each record: receive time in nanoseconds, body size and number of frames
+HEADER = struct.Struct('<qIH')
+
+### the size prefix of each frame in the body of a record
+LENGTH = struct.Struct('<I')
+
+def encode(stamp, frames):
+    '''Return the record of multipart message `frames` received at `stamp` nanoseconds.'''
+    body = b''.join(LENGTH.pack(len(frame)) + frame for frame in frames)
+    return HEADER.pack(stamp, len(body), len(frames)) + body
+
+def _end(recording):
+    '''Return the offset of the end of the last whole record in open file `recording`, read
+       from the current offset (the end of :data:`MAGIC`).
+    '''
+    total = os.fstat(recording.fileno()).st_size
+    end = recording.tell()
+    while True:
+        header = recording.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return end
+        (_, size, _) = HEADER.unpack(header)
+        if end + HEADER.size + size > total:
+            return end
+        end += HEADER.size + size
+        recording.seek(end)
+
+class Writer(object):
+    '''Append records of multipart messages to the recording at `filename`, creating it if need
+       be. Raise ValueError if `filename` exists but is not a recording.
+    '''
+    def __init__(self, filename, buffering=1 << 20):
+        try:
+            self._file = open(filename, 'r+b', buffering)
+        except FileNotFoundError:
+            self._file = open(filename, 'w+b', buffering)
+        magic = self._file.read(len(MAGIC))
+        if not magic:
+            self._file.write(MAGIC)
+        elif magic != MAGIC:
+            self._file.close()
+            raise ValueError('not a recording: ' + filename)
+        else:
+            self._file.truncate(_end(self._file))
+        self._file.seek(0, os.SEEK_END)
+        self.messages = 0
+        self.bytes = 0
+    def write(self, batch):
+        '''Append a record of each multipart message in `batch`, a list of 2-tuples of receive
+           time in nanoseconds and frames, and flush them to the file in one write.
+        '''
+        data = b''.join(encode(stamp, frames) for (stamp, frames) in batch)
+        self._file.write(data)
+        self._file.flush()
+        self.messages += len(batch)
+        self.bytes += len(data)
+    def close(self):
+        '''Close the recording.'''
+        self._file.close()
+
+def read(filename):
+    '''Generate each multipart message in the recording at `filename`, as a 2-tuple of receive
+       time in nanoseconds and list of frames, ignoring any partial record at the end. Raise
+       ValueError if `filename` is not a recording.
+    '''
+    with open(filename, 'rb') as recording:
+        if recording.read(len(MAGIC)) != MAGIC:
+            raise ValueError('not a recording: ' + filename)
+        while True:
+            header = recording.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            (stamp, size, count) = HEADER.unpack(header)
+            body = recording.read(size)
+            if len(body) < size:
+                return
+            (frames, offset) = ([], 0)
+            for _ in range(count):
+                (length,) = LENGTH.unpack_from(body, offset)
+                offset += LENGTH.size
+                frames.append(body[offset:offset + length])
+                offset += length
+            yield (stamp, frames)
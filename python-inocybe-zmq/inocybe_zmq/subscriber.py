@@ -18,30 +18,108 @@
 
    Print each multipart message published on the specified topic by the single connected ZMQ PUB
    socket to stdout.
+
+   With --record, instead append each message to a recording (see :mod:`inocybe_zmq.recording`),
+   receiving messages in batches of up to --batch and writing each batch at once, so as to keep up
+   with a storm of messages, and log the rate of messages received every --interval seconds,
+   along with any messages missed, by the gaps in the sequence numbers of those published by an
+   :class:`inocybe_zmq.notify.Publisher`. The recording may be replayed by
+   :mod:`inocybe_zmq.publisher`.
 '''
 
 from __future__ import print_function
 
+import logging
+
 from argparse import ArgumentParser
+from time import (monotonic, time_ns)
 
 import zmq
+from inocybe_zmq.notify import Gaps
+from inocybe_zmq.recording import Writer
 from inocybe_zmq.uri import Uri
 
+### the longest time for which to poll before checking whether to log the rate of messages
+POLL_MS = 500
+
+def record(sub, writer, batch, interval):
+    '''Append each multipart message received on SUB socket `sub` to recording `writer`, in
+       batches of up to `batch` messages, logging the rate of messages every `interval` seconds,
+       until interrupted.
+    '''
+    gaps = Gaps()
+    (messages, size, missed) = (writer.messages, writer.bytes, gaps.missed)
+    (start, report) = (monotonic(), monotonic() + interval)
+    while True:
+        if sub.poll(POLL_MS):
+            received = []
+            while len(received) < batch:
+                try:
+                    frames = sub.recv_multipart(zmq.NOBLOCK) # pylint: disable=no-member
+                except zmq.Again:
+                    break
+                received.append((time_ns(), frames))
+                gaps.check(frames)
+            writer.write(received)
+        now = monotonic()
+        if now >= report:
+            elapsed = now - start
+            logging.info(
+                '%.0f msg/s %.0f bytes/s, %d missed (%d in %d gaps in all), %d recorded',
+                (writer.messages - messages) / elapsed, (writer.bytes - size) / elapsed,
+                gaps.missed - missed, gaps.missed, gaps.gaps, writer.messages,
+            )
+            (messages, size, missed) = (writer.messages, writer.bytes, gaps.missed)
+            (start, report) = (now, now + interval)
+
 def main():
     '''Print each multipart message received from a single connected ZMQ PUB socket to stdout.'''
+    logging.basicConfig(level=logging.INFO)
     aparser = ArgumentParser(description=main.__doc__)
     aparser.add_argument('-t', '--topic', default='')
+    aparser.add_argument('-o', '--record', metavar='FILE', help=' '.join((
+        'append each message to the recording FILE rather than print it',
+    )))
+    aparser.add_argument('--batch', default=1000, type=int, help=' '.join((
+        'the most messages to receive and record at once',
+    )))
+    aparser.add_argument('--interval', default=5.0, type=float, help=' '.join((
+        'the interval in seconds at which to log the rate of messages recorded',
+    )))
+    aparser.add_argument('--hwm', default=1000, type=int, help=' '.join((
+        'the most messages to queue before dropping them',
+    )))
     aparser.add_argument('uri', type=Uri.arg)
     args = vars(aparser.parse_args())
-    topic = args['topic']
+    if args['batch'] < 1:
+        aparser.error('--batch must be at least 1')
+    if args['interval'] <= 0:
+        aparser.error('--interval must be positive')
+    writer = None
+    if args['record']:
+        try:
+            writer = Writer(args['record'])
+        except (OSError, ValueError) as exc:
+            aparser.error('failed to open recording, ' + str(exc))
     context = zmq.Context()
     sub = context.socket(zmq.SUB) # pylint: disable=no-member
+    sub.setsockopt(zmq.RCVHWM, args['hwm']) # pylint: disable=no-member
     sub.connect(args['uri'])
-    sub.setsockopt(zmq.SUBSCRIBE, topic) # pylint: disable=no-member
+    sub.setsockopt(zmq.SUBSCRIBE, args['topic'].encode('utf-8')) # pylint: disable=no-member
+    if writer is not None:
+        try:
+            record(sub, writer, args['batch'], args['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
+            logging.info('%d messages recorded to %s', writer.messages, args['record'])
+        sub.close()
+        return
     loop = True
     while loop:
         try:
-            (topic, message) = sub.recv_multipart()
+            (topic, message) = sub.recv_multipart()[:2]
         except KeyboardInterrupt:
             loop = False
         else:
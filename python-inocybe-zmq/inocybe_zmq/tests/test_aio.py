@@ -0,0 +1,140 @@
+'''Test cases for inocybe_zmq.aio.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import asyncio
+import json
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Lock
+from time import (monotonic, sleep)
+
+import zmq
+import zmq.asyncio
+from nose.tools import assert_equal
+from nose.tools import assert_greater_equal
+from nose.tools import assert_less
+
+from inocybe_jsonrpc import aio
+from inocybe_jsonrpc.jsonrpc import Service
+
+from inocybe_zmq.aio import (run, serve)
+
+class SleepService(aio.Service):
+    '''A service with a coroutine method which records how many calls run at once.'''
+    def __init__(self):
+        aio.Service.__init__(self)
+        self.methods = {'sleep': self.sleep}
+        self.running = 0
+        self.most = 0
+    async def sleep(self, seconds):
+        '''Sleep for `seconds`, then return them.'''
+        self.running += 1
+        self.most = max(self.most, self.running)
+        await asyncio.sleep(seconds)
+        self.running -= 1
+        return seconds
+
+class ThreadService(Service):
+    '''A service with a blocking method which records how many calls run at once.'''
+    def __init__(self):
+        Service.__init__(self)
+        self.methods = {'sleep': self.sleep}
+        self.lock = Lock()
+        self.running = 0
+        self.most = 0
+    def sleep(self, seconds):
+        '''Sleep for `seconds`, then return them.'''
+        with self.lock:
+            self.running += 1
+            self.most = max(self.most, self.running)
+        sleep(seconds)
+        with self.lock:
+            self.running -= 1
+        return seconds
+
+def request(id_, method, params=None):
+    '''Return an encoded Request, or a notification if `id_` is None.'''
+    req = {'jsonrpc': '2.0', 'method': method}
+    if id_ is not None:
+        req['id'] = id_
+    if params is not None:
+        req['params'] = params
+    return json.dumps(req).encode()
+
+async def call_all(sock, requests, number):
+    '''Send each of `requests` on DEALER socket `sock`, and return the ids of the first `number`
+       Responses, in the order received.
+    '''
+    for req in requests:
+        await sock.send_multipart([req])
+    ids = []
+    for _ in range(number):
+        frames = await asyncio.wait_for(sock.recv_multipart(), 5)
+        ids.append(json.loads(frames[-1].decode())['id'])
+    return ids
+
+def test_serve_cap():
+    '''Test inocybe_zmq.aio.serve() handles coroutine calls at once, up to the cap'''
+    service = SleepService()
+    async def main():
+        '''Serve on a ROUTER socket, and make calls from a DEALER socket.'''
+        context = zmq.asyncio.Context()
+        (server, client) = (context.socket(zmq.ROUTER), context.socket(zmq.DEALER))
+        server.bind('inproc://serve')
+        client.connect('inproc://serve')
+        serving = asyncio.ensure_future(serve(server, service, 2))
+        try:
+            start = monotonic()
+            ### the notification is handled, but there is no reply
+            ids = await call_all(client, [request(None, 'sleep', [0.2])] + [
+                request(_, 'sleep', [0.2]) for _ in range(3)
+            ], 3)
+            return (ids, monotonic() - start)
+        finally:
+            serving.cancel()
+            server.close(linger=0)
+            client.close(linger=0)
+    (ids, elapsed) = asyncio.run(main())
+    assert_equal(sorted(ids), [0, 1, 2])
+    assert_equal(service.most, 2)
+    assert_greater_equal(elapsed, 0.4)
+    assert_less(elapsed, 1.0)
+
+def test_run_threads():
+    '''Test inocybe_zmq.aio.run() drives a synchronous service on a thread per call in flight,
+       replying out of order
+    '''
+    (service, directory) = (ThreadService(), mkdtemp())
+    uri = 'ipc://{}/serve'.format(directory)
+    async def main():
+        '''Run the server, and make calls from a DEALER socket.'''
+        serving = asyncio.ensure_future(run(uri, service, 2))
+        context = zmq.asyncio.Context()
+        client = context.socket(zmq.DEALER)
+        client.connect(uri)
+        try:
+            return await call_all(client, [
+                request(1, 'sleep', [0.3]), request(2, 'sleep', [0]), request(3, 'sleep', [0.1]),
+            ], 3)
+        finally:
+            serving.cancel()
+            client.close(linger=0)
+    try:
+        assert_equal(asyncio.run(main()), [2, 3, 1])
+    finally:
+        rmtree(directory)
+    assert_equal(service.most, 2)
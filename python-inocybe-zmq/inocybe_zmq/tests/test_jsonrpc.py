@@ -0,0 +1,248 @@
+'''Test cases for inocybe_zmq.jsonrpc.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import json
+import os
+import signal
+import socket
+
+from argparse import ArgumentParser
+from functools import partial
+from multiprocessing import Process
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import (Event, Thread)
+from time import (monotonic, sleep)
+
+import zmq
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_less
+from nose.tools import assert_not_in
+from nose.tools import raises
+
+from inocybe_jsonrpc import options
+from inocybe_jsonrpc.admission import Admission
+from inocybe_jsonrpc.jsonrpc import Service as BaseService
+from inocybe_jsonrpc.math import Service as MathService
+
+from inocybe_zmq.jsonrpc import (Drain, bind, broker, respond, serve, serve_many, work_process,
+                                work_thread)
+
+class Service(BaseService):
+    '''A service with calls which take time.'''
+    def __init__(self):
+        BaseService.__init__(self)
+        self.methods = {'pid': self.pid, 'block': self.block}
+        self.release = Event()
+    @staticmethod
+    def pid(seconds):
+        '''Sleep for `seconds`, then return the id of the process handling the call.'''
+        sleep(seconds)
+        return os.getpid()
+    def block(self):
+        '''Block until released.'''
+        return self.release.wait(5)
+
+def request(id_, method, params=None):
+    '''Return an encoded Request.'''
+    req = {'jsonrpc': '2.0', 'id': id_, 'method': method}
+    if params is not None:
+        req['params'] = params
+    return json.dumps(req).encode()
+
+def receive(sock, number):
+    '''Return the next `number` decoded Responses received on client socket `sock`.'''
+    responses = []
+    while len(responses) < number:
+        if not sock.poll(5000):
+            raise AssertionError('no response')
+        responses.append(json.loads(sock.recv_multipart()[-1].decode()))
+    return responses
+
+def start_broker(context, front_uri, back_uri, workers, admission=None):
+    '''Start a broker thread on `context`, bound to `front_uri` for clients and `back_uri` for
+       `workers` workers. Return the DEALER socket of a client, the :class:`Drain` which stops the
+       broker and the broker thread.
+    '''
+    (frontend, backend) = (context.socket(zmq.ROUTER), context.socket(zmq.ROUTER))
+    frontend.bind(front_uri)
+    backend.bind(back_uri)
+    service = Service()
+    drain = Drain([service], 5)
+    shed = partial(respond, service, mode='router', shed=True)
+    thread = Thread(target=broker, args=(frontend, backend, admission, shed, drain, workers))
+    thread.daemon = True
+    thread.start()
+    client = context.socket(zmq.DEALER)
+    client.connect(front_uri)
+    return (client, drain, thread)
+
+def start_threads(context, uri, service, workers):
+    '''Start `workers` worker threads on `context`, connected to the broker at `uri`.'''
+    for _ in range(workers):
+        thread = Thread(target=work_thread, args=(context, uri, service, 'router'))
+        thread.daemon = True
+        thread.start()
+
+def stop(drain, thread):
+    '''Drain the server or broker running in `thread`, and check that it stops.'''
+    drain.start()
+    thread.join(5)
+    assert_false(thread.is_alive())
+
+def test_broker_threads():
+    '''Test inocybe_zmq.jsonrpc.broker() hands Requests to many worker threads at once'''
+    context = zmq.Context()
+    (client, drain, thread) = start_broker(context, 'inproc://front', 'inproc://back', 2)
+    start_threads(context, 'inproc://back', Service(), 2)
+    start = monotonic()
+    for id_ in range(4):
+        client.send_multipart([b'', request(id_, 'pid', [0.3])])
+    responses = receive(client, 4)
+    assert_less(monotonic() - start, 1.0)
+    assert_equal(sorted(_['id'] for _ in responses), list(range(4)))
+    assert_equal(set(_['result'] for _ in responses), set([os.getpid()]))
+    stop(drain, thread)
+    client.close(linger=0)
+
+def test_broker_shed():
+    '''Test inocybe_zmq.jsonrpc.broker() sheds a Request while no worker is idle and the queue is
+       full
+    '''
+    (context, service) = (zmq.Context(), Service())
+    (client, drain, thread) = start_broker(
+        context, 'inproc://front', 'inproc://back', 1, Admission(0),
+    )
+    start_threads(context, 'inproc://back', service, 1)
+    ### once answered, the worker is known to be connected
+    client.send_multipart([b'', request(0, 'pid', [0])])
+    assert_equal(receive(client, 1)[0]['id'], 0)
+    client.send_multipart([b'', request(1, 'block')])
+    sleep(0.1)
+    client.send_multipart([b'', request(2, 'pid', [0])])
+    assert_equal(receive(client, 1), [{
+        'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32001, 'message': 'Server busy'},
+    }])
+    service.release.set()
+    assert_equal(receive(client, 1), [{'jsonrpc': '2.0', 'id': 1, 'result': True}])
+    stop(drain, thread)
+    client.close(linger=0)
+
+def test_broker_processes():
+    '''Test inocybe_zmq.jsonrpc.broker() hands Requests to worker processes'''
+    aparser = ArgumentParser()
+    options.add_arguments(aparser)
+    args = vars(aparser.parse_args([]))
+    args.update(service=Service, args=[], mode='router')
+    directory = mkdtemp()
+    ### a worker process has a context of its own, so connects over ipc
+    back_uri = 'ipc://{}/back'.format(directory)
+    ### fork the workers before creating a context, as the server does
+    workers = [Process(target=work_process, args=(back_uri, args)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    context = zmq.Context()
+    (client, drain, thread) = start_broker(context, 'inproc://front', back_uri, 2)
+    try:
+        ### the workers start in turn, so call until both have answered
+        (pids, deadline) = (set(), monotonic() + 5)
+        while len(pids) < 2 and monotonic() < deadline:
+            for id_ in range(2):
+                client.send_multipart([b'', request(id_, 'pid', [0.1])])
+            pids.update(_['result'] for _ in receive(client, 2))
+        assert_equal(len(pids), 2)
+        assert_not_in(os.getpid(), pids)
+        stop(drain, thread)
+    finally:
+        for worker in workers:
+            worker.kill()
+            worker.join()
+        client.close(linger=0)
+        rmtree(directory)
+
+def test_serve_many():
+    '''Test inocybe_zmq.jsonrpc.serve_many() handles Requests on each socket with its own service'''
+    context = zmq.Context()
+    services = [(context.socket(zmq.REP), Service()), (context.socket(zmq.REP), MathService())]
+    clients = []
+    for (index, (sock, _)) in enumerate(services):
+        sock.bind('inproc://serve-{}'.format(index))
+        clients.append(context.socket(zmq.REQ))
+        clients[-1].connect('inproc://serve-{}'.format(index))
+    drain = Drain([service for (_, service) in services], 5)
+    thread = Thread(target=serve_many, args=(services, 'rep', drain))
+    thread.daemon = True
+    thread.start()
+    for _ in range(2):
+        clients[1].send(request(1, 'add', [1, 2]))
+        clients[0].send(request(2, 'pid', [0]))
+        assert_equal(receive(clients[0], 1), [{'jsonrpc': '2.0', 'id': 2, 'result': os.getpid()}])
+        assert_equal(receive(clients[1], 1), [{'jsonrpc': '2.0', 'id': 1, 'result': 3}])
+    clients[0].send(request(3, 'add', [1, 2]))
+    assert_equal(receive(clients[0], 1)[0]['error']['code'], -32601)
+    stop(drain, thread)
+    for client in clients:
+        client.close(linger=0)
+
+def test_drain():
+    '''Test inocybe_zmq.jsonrpc.serve() completes the call in progress on SIGTERM, and sheds the
+       Requests received after
+    '''
+    (context, service) = (zmq.Context(), Service())
+    sock = context.socket(zmq.ROUTER)
+    sock.bind('inproc://drain')
+    drain = Drain([service], 5)
+    thread = Thread(target=serve, args=(sock, service, 'router', drain))
+    thread.daemon = True
+    thread.start()
+    client = context.socket(zmq.DEALER)
+    client.connect('inproc://drain')
+    handler = signal.signal(signal.SIGTERM, drain.start)
+    try:
+        client.send_multipart([b'', request(1, 'block')])
+        sleep(0.1)
+        os.kill(os.getpid(), signal.SIGTERM)
+        client.send_multipart([b'', request(2, 'pid', [0])])
+        sleep(0.1)
+        service.release.set()
+        assert_equal(receive(client, 2), [
+            {'jsonrpc': '2.0', 'id': 1, 'result': True},
+            {'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32001, 'message': 'Server busy'}},
+        ])
+        thread.join(5)
+        assert_false(thread.is_alive())
+    finally:
+        signal.signal(signal.SIGTERM, handler)
+        client.close(linger=0)
+        sock.close(linger=0)
+
+def test_bind_reuse_port():
+    '''Test inocybe_zmq.jsonrpc.bind() binds a TCP port with SO_REUSEPORT if asked'''
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    uri = 'tcp://127.0.0.1:{}'.format(listener.getsockname()[1])
+    listener.close()
+    context = zmq.Context()
+    socks = [context.socket(zmq.ROUTER) for _ in range(3)]
+    try:
+        bind(socks[0], uri, reuse_port=True)
+        bind(socks[1], uri, reuse_port=True)
+        raises(zmq.ZMQError)(bind)(socks[2], uri)
+    finally:
+        for sock in socks:
+            sock.close(linger=0)
@@ -0,0 +1,229 @@
+'''Test cases for inocybe_zmq.loadgen.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import asyncio
+import os
+from argparse import ArgumentTypeError
+from itertools import (cycle, islice)
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread
+
+import zmq
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_greater_equal
+from nose.tools import assert_in
+from nose.tools import raises
+
+from inocybe_jsonrpc.codec import Codec
+from inocybe_jsonrpc.echo import Service as EchoService
+
+from inocybe_zmq.aio import run as serve
+from inocybe_zmq.jsonrpc import (Drain, serve as serve_sync)
+from inocybe_zmq.loadgen import (TEMPLATE, Client, drive, main_async, requests, target_arg)
+
+class FakeClient(Client):
+    '''A client answering each Request itself: a call of method 'fail' with an Error, a call of
+       'hang' never, and any other with its params, after `delay` seconds.
+    '''
+    def __init__(self, delay=0.01):
+        Client.__init__(self, Codec)
+        self.delay = delay
+        self.sent = []
+        self.forgotten = []
+        self.running = 0
+        self.most = 0
+    async def call(self, ids, data):
+        '''Answer encoded Request `data`.'''
+        request = self.codec.decode(data)
+        self.sent.append((ids, request))
+        self.running += 1
+        self.most = max(self.most, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+            if not ids:
+                return None
+            responses = [self.respond(_) for _ in (request if isinstance(request, list) else
+                                                   [request]) if 'id' in _]
+            if any(_ is None for _ in responses):
+                await asyncio.sleep(60)
+            return responses if isinstance(request, list) else responses[0]
+        finally:
+            self.running -= 1
+    @staticmethod
+    def respond(request):
+        '''Return the Response to Request `request`, or None if there is none.'''
+        if request['method'] == 'hang':
+            return None
+        if request['method'] == 'fail':
+            return {'jsonrpc': '2.0', 'id': request['id'],
+                    'error': {'code': -32603, 'message': 'Internal error'}}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': request.get('params')}
+    def forget(self, ids):
+        self.forgotten.append(ids)
+        Client.forget(self, ids)
+
+def args(**kwargs):
+    '''Return the parsed command line args to drive a run.'''
+    parsed = {'rate': 0.0, 'number': 0, 'duration': 0, 'timeout': 1.0, 'concurrency': 4}
+    parsed.update(kwargs)
+    return parsed
+
+def test_requests():
+    '''Test inocybe_zmq.loadgen.requests() takes Requests from a template or a corpus'''
+    template = '{"jsonrpc": "2.0", "id": 0, "method": "foo"}'
+    assert_equal(list(islice(requests(template, None, Codec), 2)), [
+        {'jsonrpc': '2.0', 'id': 0, 'method': 'foo'},
+    ] * 2)
+    directory = mkdtemp()
+    try:
+        corpus = os.path.join(directory, 'corpus')
+        with open(corpus, 'w') as lines:
+            lines.write('\n'.join((
+                '{"jsonrpc": "2.0", "method": "a"}', '', '[{"jsonrpc": "2.0", "method": "b"}]', '',
+            )))
+        assert_equal(list(islice(requests(None, corpus, Codec), 3)), [
+            {'jsonrpc': '2.0', 'method': 'a'}, [{'jsonrpc': '2.0', 'method': 'b'}],
+            {'jsonrpc': '2.0', 'method': 'a'},
+        ])
+        for (content, message) in (
+                ('{"jsonrpc": "2.0", "method": "a"}\n{\n', 'line 2 of'),
+                ('[]\n', 'line 1 of'),
+                ('{"method": "a"}\n', 'Invalid Request'),
+                ('[{"jsonrpc": "2.0", "method": "a"}, {"jsonrpc": "2.0"}]\n', 'Invalid Request'),
+                ('3\n', 'a Request must be'),
+                ('\n', 'holds no Requests'),
+        ):
+            with open(corpus, 'w') as lines:
+                lines.write(content)
+            try:
+                requests(None, corpus, Codec)
+            except ValueError as exc:
+                assert_in(message, str(exc))
+            else:
+                raise AssertionError('accepted {!r}'.format(content))
+    finally:
+        rmtree(directory)
+    for template in ('', '"foo"', '[]', '{', '{"method": "echo"}', '[1]'):
+        raises(ValueError)(requests)(template, None, Codec)
+
+def test_target_arg():
+    '''Test inocybe_zmq.loadgen.target_arg() checks a target URL'''
+    assert_equal(target_arg('zmq://127.0.0.1:4567/'), 'tcp://127.0.0.1:4567')
+    assert_equal(target_arg('http://127.0.0.1:8080/rpc'), 'http://127.0.0.1:8080/rpc')
+    assert_equal(target_arg('ws://127.0.0.1:8080/'), 'ws://127.0.0.1:8080/')
+    for bad in ('http:///rpc', 'ws:/rpc', 'ftp://127.0.0.1/'):
+        raises(ArgumentTypeError)(target_arg)(bad)
+
+def test_received():
+    '''Test inocybe_zmq.loadgen.Client matches a Response to its Request by the id of any element'''
+    async def run():
+        '''Expect Responses, and receive them.'''
+        client = Client(Codec)
+        single = client.expect([1])
+        ### the first element of the Batch is a notification, with no Response
+        batch = client.expect([2001, 2002])
+        client.received(b'[{"jsonrpc": "2.0", "id": 2002, "result": 2}]')
+        client.received(b'{"jsonrpc": "2.0", "id": 1, "result": 1}')
+        client.received(b'{"jsonrpc": "2.0", "id": 99, "result": 99}')
+        client.received(b'{"jsonrpc": "2.0", "id": null, "error": {"code": -32700}}')
+        assert_equal(await single, {'jsonrpc': '2.0', 'id': 1, 'result': 1})
+        assert_equal(await batch, [{'jsonrpc': '2.0', 'id': 2002, 'result': 2}])
+        client.forget([2001])
+        assert_equal(client.pending, {})
+        ### a REP socket replies with an empty frame where there is no Response
+        client.received(b'')
+        client.received(b'{')
+        assert_equal(client.errors, 1)
+    asyncio.run(run())
+
+def test_drive():
+    '''Test inocybe_zmq.loadgen.drive() sends Requests with up to the concurrency in flight'''
+    client = FakeClient()
+    source = iter([
+        {'jsonrpc': '2.0', 'id': 0, 'method': 'echo', 'params': [1]},
+        {'jsonrpc': '2.0', 'id': 0, 'method': 'fail'},
+        [{'jsonrpc': '2.0', 'method': 'note'}, {'jsonrpc': '2.0', 'id': 0, 'method': 'echo'}],
+        [{'jsonrpc': '2.0', 'method': 'note'}],
+        {'jsonrpc': '2.0', 'id': 0, 'method': 'hang'},
+    ] + [{'jsonrpc': '2.0', 'id': 0, 'method': 'echo'}] * 10)
+    run = asyncio.run(drive(client, source, args(number=14, concurrency=3, timeout=0.2)))
+    assert_equal([_[0] for _ in client.sent[:6]], [[1], [2], [3], [], [4], [5]])
+    assert_equal(client.sent[2][1][0], {'jsonrpc': '2.0', 'method': 'note'})
+    assert_equal(client.most, 3)
+    assert_equal(client.forgotten, [[4]])
+    report = run.report()
+    assert_equal((report['requests'], report['responses']), (14, 12))
+    assert_equal((report['errors'], report['failures']), (1, 1))
+
+def test_drive_rate():
+    '''Test inocybe_zmq.loadgen.drive() sends Requests at a fixed rate, for a duration'''
+    client = FakeClient(delay=0)
+    source = iter(lambda: {'jsonrpc': '2.0', 'id': 0, 'method': 'echo'}, None)
+    run = asyncio.run(drive(client, source, args(rate=50.0, duration=0.2)))
+    assert_equal(run.sent, 10)
+    assert_greater_equal(run.elapsed, 0.18)
+    assert_false(client.forgotten)
+
+def test_main_async():
+    '''Test inocybe_zmq.loadgen.main_async() reports a run against a ZMQ service'''
+    directory = mkdtemp()
+    target = 'ipc://{}/service'.format(directory)
+    async def run():
+        '''Serve, and run the benchmark against the service.'''
+        serving = asyncio.ensure_future(serve(target, EchoService(), 4))
+        try:
+            return await main_async(
+                dict(args(number=20), target=target, codec='json', warmup=5),
+                requests(TEMPLATE, None, Codec),
+            )
+        finally:
+            serving.cancel()
+    try:
+        report = asyncio.run(run())
+    finally:
+        rmtree(directory)
+    assert_equal((report['target'], report['concurrency'], report['rate']), (target, 4, None))
+    assert_equal((report['requests'], report['responses']), (20, 20))
+    assert_equal((report['errors'], report['failures']), (0, 0))
+
+def test_main_async_rep():
+    '''Test inocybe_zmq.loadgen.main_async() carries on past the empty reply of a REP socket'''
+    directory = mkdtemp()
+    target = 'ipc://{}/service'.format(directory)
+    context = zmq.Context()
+    sock = context.socket(zmq.REP)
+    sock.bind(target)
+    drain = Drain([], 5)
+    thread = Thread(target=serve_sync, args=(sock, EchoService(), 'rep', drain))
+    thread.start()
+    source = cycle([
+        [{'jsonrpc': '2.0', 'method': 'echo'}],
+        {'jsonrpc': '2.0', 'id': 0, 'method': 'echo', 'params': [1]},
+    ])
+    try:
+        report = asyncio.run(main_async(
+            dict(args(number=6, concurrency=1), target=target, codec='json', warmup=0), source,
+        ))
+    finally:
+        drain.start()
+        thread.join()
+        sock.close(linger=0)
+        rmtree(directory)
+    assert_equal((report['requests'], report['responses']), (6, 3))
+    assert_equal((report['errors'], report['failures']), (0, 0))
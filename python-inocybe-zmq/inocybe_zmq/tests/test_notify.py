@@ -0,0 +1,148 @@
+'''Test cases for inocybe_zmq.notify.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+import os
+import pickle
+from multiprocessing import get_context
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import monotonic
+
+import zmq
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_is_none
+from nose.tools import assert_true
+
+from inocybe_zmq.notify import (SEQUENCE_BYTES, Gaps, Publisher, Subscriber)
+
+class Published(object):
+    '''A context manager for a :class:`Publisher` bound in a temporary directory, with a
+       :class:`Subscriber` to `topics`.
+    '''
+    def __init__(self, topics=()):
+        self.topics = topics
+        self.directory = None
+        self.publisher = None
+        self.subscriber = None
+    def __enter__(self):
+        '''Return the publisher and the subscriber, once connected.'''
+        self.directory = mkdtemp()
+        uri = 'ipc://{}/notify'.format(self.directory)
+        self.publisher = Publisher(uri)
+        self.subscriber = Subscriber(uri, self.topics, context=zmq.Context())
+        ### a subscriber only receives what is published once it has connected
+        deadline = monotonic() + 5
+        while self.subscriber.recv(0.05) is None:
+            if monotonic() >= deadline:
+                raise AssertionError('subscriber did not connect')
+            self.publisher.notify(self.topics[0] if self.topics else 'connect')
+        while self.subscriber.recv(0.1) is not None:
+            pass
+        return (self.publisher, self.subscriber)
+    def __exit__(self, *args):
+        self.subscriber.close()
+        self.publisher.close()
+        rmtree(self.directory)
+
+def test_publish():
+    '''Test inocybe_zmq.notify.Publisher publishes notifications to a subscriber to their topic'''
+    with Published(['foo']) as (publisher, subscriber):
+        assert_equal(publisher.notify('bar', [0]), True)
+        assert_equal(publisher.notify('foo', {'a': 1}), True)
+        assert_equal(publisher.notify('foobar'), True)
+        assert_equal(subscriber.recv(5), (
+            'foo', {'jsonrpc': '2.0', 'method': 'foo', 'params': {'a': 1}},
+        ))
+        ### topics are matched by prefix
+        assert_equal(subscriber.recv(5), ('foobar', {'jsonrpc': '2.0', 'method': 'foobar'}))
+        assert_is_none(subscriber.recv(0.1))
+        subscriber.unsubscribe('foo')
+        subscriber.subscribe('bar')
+        deadline = monotonic() + 5
+        while subscriber.recv(0.05) is None and monotonic() < deadline:
+            publisher.notify('bar', [1])
+        publisher.notify('foo')
+        publisher.notify('bar', [2])
+        assert_equal(subscriber.recv(5)[1]['params'], [2])
+
+def test_sequence():
+    '''Test inocybe_zmq.notify.Publisher numbers the notifications on each topic'''
+    with Published() as (publisher, subscriber):
+        for topic in ('foo', 'bar', 'foo', 'foo', 'bar'):
+            publisher.notify(topic)
+        sequences = []
+        for _ in range(5):
+            assert_equal(subscriber._sub.poll(5000), zmq.POLLIN) # pylint: disable=protected-access
+            frames = subscriber._sub.recv_multipart() # pylint: disable=protected-access
+            assert_equal(len(frames[2]), SEQUENCE_BYTES)
+            sequences.append((frames[0], int.from_bytes(frames[2], 'big')))
+        assert_equal(sequences, [(b'foo', 1), (b'bar', 1), (b'foo', 2), (b'foo', 3), (b'bar', 2)])
+
+def notify_child(notify, received):
+    '''Notify on topic 'child' with `notify`, then wait for Event `received`.'''
+    notify('child', [os.getpid()])
+    received.wait(5)
+
+def test_forked():
+    '''Test inocybe_zmq.notify.Publisher publishes from a forked process, and once unpickled'''
+    with Published(['child']) as (publisher, subscriber):
+        context = get_context('fork')
+        for notify in (publisher.notify, pickle.loads(pickle.dumps(publisher)).notify):
+            received = context.Event()
+            child = context.Process(target=notify_child, args=(notify, received))
+            child.start()
+            try:
+                assert_equal(subscriber.recv(5), ('child', {
+                    'jsonrpc': '2.0', 'method': 'child', 'params': [child.pid],
+                }))
+            finally:
+                received.set()
+                child.join(5)
+            assert_equal(child.exitcode, 0)
+
+def test_dropped():
+    '''Test inocybe_zmq.notify.Publisher drops a notification rather than block'''
+    directory = mkdtemp()
+    try:
+        publisher = Publisher('ipc://{}/notify'.format(directory), hwm=1)
+        publisher.close()
+        ### with the bridge closed, notifications queue up to the high water mark
+        queued = [publisher.notify('foo') for _ in range(10)]
+        assert_true(queued[0])
+        assert_false(queued[-1])
+        assert_equal(publisher.dropped, queued.count(False))
+    finally:
+        rmtree(directory)
+
+def test_gaps():
+    '''Test inocybe_zmq.notify.Gaps counts the notifications missed on each topic'''
+    def frames(topic, sequence):
+        '''Return a multipart notification message.'''
+        return [topic, b'{}', sequence.to_bytes(SEQUENCE_BYTES, 'big')]
+    gaps = Gaps()
+    assert_equal(gaps.check(frames(b'foo', 5)), 0)
+    assert_equal(gaps.check(frames(b'foo', 6)), 0)
+    assert_equal(gaps.check(frames(b'bar', 1)), 0)
+    assert_equal(gaps.check(frames(b'foo', 9)), 2)
+    assert_equal(gaps.check(frames(b'bar', 3)), 1)
+    ### the publisher restarted
+    assert_equal(gaps.check(frames(b'foo', 1)), 0)
+    assert_equal(gaps.check(frames(b'foo', 2)), 0)
+    assert_equal(gaps.check([b'foo', b'{}']), 0)
+    assert_equal(gaps.check([b'foo', b'{}', b'1']), 0)
+    assert_equal((gaps.gaps, gaps.missed), (2, 3))
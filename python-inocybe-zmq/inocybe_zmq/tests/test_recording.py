@@ -0,0 +1,90 @@
+'''Test cases for inocybe_zmq.recording.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+
+import os
+
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from nose.tools import assert_equal
+from nose.tools import raises
+
+from inocybe_zmq.recording import (MAGIC, Writer, read)
+
+MESSAGES = [
+    (1, [b'topic', b'{"jsonrpc": "2.0", "method": "topic"}', b'\0' * 7 + b'\1']),
+    (2, [b'']),
+    (3, [b'', b'x' * 70000, b'']),
+]
+
+def check_recording(check):
+    '''Call `check` with the path of a recording in a temporary directory.'''
+    directory = mkdtemp()
+    try:
+        check(os.path.join(directory, 'recording'))
+    finally:
+        rmtree(directory)
+
+def test_round_trip():
+    '''Test inocybe_zmq.recording reads back each message written, in batches'''
+    def check(filename):
+        writer = Writer(filename)
+        writer.write(MESSAGES[:2])
+        writer.write(MESSAGES[2:])
+        writer.close()
+        assert_equal(writer.messages, len(MESSAGES))
+        assert_equal(writer.bytes, os.path.getsize(filename) - len(MAGIC))
+        assert_equal(list(read(filename)), MESSAGES)
+    check_recording(check)
+
+def test_append():
+    '''Test inocybe_zmq.recording.Writer appends to an existing recording'''
+    def check(filename):
+        for message in MESSAGES:
+            writer = Writer(filename)
+            writer.write([message])
+            writer.close()
+        assert_equal(list(read(filename)), MESSAGES)
+    check_recording(check)
+
+def test_partial():
+    '''Test inocybe_zmq.recording ignores, and appends over, a partial record at the end'''
+    def check(filename):
+        writer = Writer(filename)
+        writer.write(MESSAGES)
+        writer.close()
+        size = os.path.getsize(filename)
+        for cut in (1, 10, 1000):
+            with open(filename, 'r+b') as recording:
+                recording.truncate(size - cut)
+            assert_equal(list(read(filename)), MESSAGES[:2])
+        writer = Writer(filename)
+        writer.write(MESSAGES[2:])
+        writer.close()
+        assert_equal(list(read(filename)), MESSAGES)
+    check_recording(check)
+
+def test_not_recording():
+    '''Test inocybe_zmq.recording rejects a file which is not a recording'''
+    def check(filename):
+        with open(filename, 'wb') as other:
+            other.write(b'not a recording\n')
+        raises(ValueError)(lambda: list(read(filename)))()
+        raises(ValueError)(lambda: Writer(filename))()
+        assert_equal(os.path.getsize(filename), 16)
+    check_recording(check)
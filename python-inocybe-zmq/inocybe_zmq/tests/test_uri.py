@@ -0,0 +1,90 @@
+'''Test cases for inocybe_zmq.uri.'''
+# Copyright (c) 2018 Inocybe Technologies.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# THIS CODE IS PROVIDED ON AN *AS IS* BASIS, WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, EITHER EXPRESS OR IMPLIED, INCLUDING WITHOUT
+# LIMITATION ANY IMPLIED WARRANTIES OR CONDITIONS OF TITLE, FITNESS
+# FOR A PARTICULAR PURPOSE, MERCHANTABLITY OR NON-INFRINGEMENT.
+#
+# See the Apache Version 2.0 License for specific language governing
+# permissions and limitations under the License.
+
+
+
+
+import os
+
+from argparse import ArgumentTypeError
+from tempfile import mkdtemp
+
+import zmq
+from nose.tools import assert_equal
+from nose.tools import raises
+
+from inocybe_zmq.uri import Uri
+
+def test_tcp():
+    '''Test inocybe_zmq.uri.Uri normalizes zmq and tcp URIs'''
+    for (string, normalized) in (
+            ('zmq://127.0.0.1:4569/', 'tcp://127.0.0.1:4569'),
+            ('zmq://0.0.0.0:4569', 'tcp://0.0.0.0:4569'),
+            ('tcp://localhost:4569/', 'tcp://localhost:4569'),
+    ):
+        uri = Uri(string)
+        assert_equal(str(uri), normalized)
+        assert_equal(uri.normalized, normalized)
+        assert_equal(uri.original, string)
+
+def test_ipc():
+    '''Test inocybe_zmq.uri.Uri keeps the path of ipc URIs'''
+    for string in ('ipc:///tmp/inocybe.sock', 'ipc://relative/inocybe.sock', 'ipc://@inocybe'):
+        assert_equal(str(Uri(string)), string)
+
+def test_inproc():
+    '''Test inocybe_zmq.uri.Uri keeps the name of inproc URIs'''
+    for string in ('inproc://workers', 'inproc://test/workers'):
+        assert_equal(str(Uri(string)), string)
+
+def test_bad():
+    '''Test inocybe_zmq.uri.Uri rejects unsupported URIs'''
+    for string in (
+            'udp://127.0.0.1:4569', 'zmq://', 'zmq://127.0.0.1:4569/path', 'zmq://h:1/?q',
+            'zmq://h:1/#f', 'ipc://', 'ipc:///', 'inproc://', 'ipc:///tmp/x?q', 'inproc://a#f',
+    ):
+        raises(ValueError)(lambda s=string: Uri(s))()
+
+@raises(ArgumentTypeError)
+def test_arg():
+    '''Test inocybe_zmq.uri.Uri.arg() raises ArgumentTypeError for a bad URI'''
+    Uri.arg('ipc://')
+
+def check_socket(uri):
+    '''Check normalized `uri` can be bound and connected.'''
+    context = zmq.Context()
+    (rep, req) = (context.socket(zmq.REP), context.socket(zmq.REQ)) # pylint: disable=no-member
+    try:
+        rep.bind(uri)
+        req.connect(uri)
+        req.send(b'ping')
+        assert_equal(rep.recv(), b'ping')
+    finally:
+        rep.close(linger=0)
+        req.close(linger=0)
+        context.term()
+
+def test_inproc_socket():
+    '''Test a normalized inproc URI can be bound and connected'''
+    check_socket(str(Uri('inproc://test-uri')))
+
+def test_ipc_socket():
+    '''Test a normalized absolute ipc URI can be bound and connected'''
+    path = os.path.join(mkdtemp(), 'test-uri.sock')
+    try:
+        check_socket(str(Uri('ipc://' + path)))
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
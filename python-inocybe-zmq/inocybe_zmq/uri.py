@@ -29,29 +29,41 @@ except ImportError:
 class Uri(object):
     '''A ZMQ URI, stored as an original specification and normalized value.
 
-       When working with :mod:`zmq`, use the normalized value.
+       A URI names a TCP endpoint ('zmq://host:port/' or 'tcp://host:port', normalized to the
+       latter), a Unix domain socket endpoint ('ipc:///absolute/path', 'ipc://relative/path' or
+       'ipc://@abstract-name') or an in-process endpoint ('inproc://name'). When working with
+       :mod:`zmq`, use the normalized value.
     '''
     def __init__(self, string):
         (protocol, authority, path, query, fragment) = urlsplit(string)
         parts = self._normalize(protocol, authority, path, query, fragment)
         self._original = string
-        self._normalized = urlunsplit(parts)
+        if parts[0] in ('ipc', 'inproc'):
+            ### keep the '//' which urlunsplit() drops from an absolute ipc path
+            self._normalized = '{}://{}{}'.format(*parts[:3])
+        else:
+            self._normalized = urlunsplit(parts)
     @staticmethod
     def _normalize(protocol, authority, path, query, fragment):
         '''Normalize and return URI elements. Raise :class:`ValueError` if any element is not
            supported.
         '''
         errors = []
-        if protocol in ('zmq', 'tcp'):
-            protocol = 'tcp'
-        else:
-            errors.append(('protocol', protocol))
-        if not authority:
-            errors.append(('authority', authority))
-        if path in ('', '/'):
-            path = ''
+        if protocol in ('ipc', 'inproc'):
+            ### the endpoint is the authority and path together, which must not both be empty
+            if not authority and path in ('', '/'):
+                errors.append(('path', path))
         else:
-            errors.append(('path', path))
+            if protocol in ('zmq', 'tcp'):
+                protocol = 'tcp'
+            else:
+                errors.append(('protocol', protocol))
+            if not authority:
+                errors.append(('authority', authority))
+            if path in ('', '/'):
+                path = ''
+            else:
+                errors.append(('path', path))
         if query:
             errors.append(('query', query))
         if fragment: